@@ -48,7 +48,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'expenses.middleware.MetricsMiddleware',
+    'expenses.middleware.FxRateMiddleware',
+    'expenses.db_router.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'expenses.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +96,12 @@ DATABASES = {
     }
 }
 
+# Read replicas: aliases in DATABASES (e.g. {'ENGINE': ..., 'HOST': 'replica1', 'TEST': {'MIRROR': 'default'}})
+# serving safe API requests; see expenses.db_router
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['expenses.db_router.ReplicaRouter']
+DATABASE_REPLICA_STICKINESS = 10  # seconds a client reads from the primary after its own write
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -111,6 +121,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+AUTHENTICATION_BACKENDS = [
+    # ModelBackend, jen hesla ověřuje v omezeném poolu vláken (expenses.hashing)
+    "expenses.hashing.BoundedHashingBackend",
+]
+
+# Password hashing pool: at most WORKERS hashes run at once, QUEUE more may wait up to TIMEOUT seconds, the rest get 503
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE = 8
+PASSWORD_HASHING_TIMEOUT = 2.0
+
+# Token-bucket throttling of login/signup (expenses.throttling); "N/period" = burst of N, refilled N per period
+AUTH_THROTTLE_STORE = "expenses.throttling.InMemoryBucketStore"
+AUTH_THROTTLE_RATES = {
+    "auth_ip": "30/min",
+    "auth_username": "10/min",
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -164,6 +191,7 @@ CSRF_COOKIE_SECURE = False
 CORS_ALLOW_HEADERS = list(default_headers) + [
     'X-CSRFToken',
     'x-csrftoken',
+    'Idempotency-Key',
 ]
 
 # Make sure frontend JS can read the cookie value
@@ -178,4 +206,69 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "expenses.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # Throttles identify clients by REMOTE_ADDR; X-Forwarded-For is client-controlled and ignored. Behind reverse
+    # proxies set this to their number, so the address appended by the outermost trusted proxy is used.
+    "NUM_PROXIES": 0,
 }
+
+# Optional MessagePack output (pip install msgpack), selected with "Accept: application/msgpack"
+try:
+    import msgpack  # noqa: F401
+except ImportError:
+    pass
+else:
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"].insert(1, "expenses.renderers.MessagePackRenderer")
+
+# Background jobs (expenses.jobs, `manage.py run_workers`)
+JOB_WORKER_PROCESSES = 1
+JOB_WORKER_THREADS = 4
+JOB_POLL_INTERVAL = 1.0  # seconds between queue polls when idle
+JOB_LEASE_SECONDS = 300  # a running job without a progress report within this time is handed to another worker
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF = 5  # seconds, doubled after every failed attempt
+JOB_RETENTION_DAYS = 7  # finished jobs older than this are deleted by `manage.py purge_jobs`
+
+# Idempotency-Key handling for create endpoints (expenses.idempotency)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # seconds a stored response can be replayed
+IDEMPOTENCY_LOCK_SECONDS = 30  # how long a concurrent duplicate is answered with 409 before taking over
+
+NETTING_MAX_EVENTS = 500  # events accepted by one /api/events/net/ request
+EXPENSE_BULK_UPDATE_MAX = 1000  # expenses changed by one /api/expenses/bulk-update/ request
+
+# In-memory cache of participant share-link tokens (expenses.tokens); also bounds how long another worker
+# process keeps honouring the link of a deleted participant
+PARTICIPANT_TOKEN_CACHE_TTL = 60
+
+# Archival tier (expenses.archive, manage.py archive_events): events with nothing created for this long
+# are moved out of the hot tables, ARCHIVE_BATCH_SIZE events per transaction
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 100
+
+# Currencies (expenses.fx): events default to DEFAULT_CURRENCY; FxRate rows loaded by `manage.py load_fx_rates`
+# are quoted per one unit of FX_BASE_CURRENCY
+DEFAULT_CURRENCY = "CZK"
+FX_BASE_CURRENCY = "EUR"
+
+# Prometheus metrics at /metrics (expenses.metrics). With several worker processes point METRICS_DIR at a
+# directory shared by them (files of exited workers are folded into dead.json); None keeps metrics per process.
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5  # seconds between a process's snapshot writes
+METRICS_TOKEN = None  # when set, scrapes must send "Authorization: Bearer <token>"
+
+# Cold start budget: seconds from interpreter start until a fresh worker answered its first request
+# (checked by `manage.py startup_profile --budget` and, with EXPENSES_STARTUP_BUDGET=1 set, the test suite)
+STARTUP_BUDGET_SECONDS = 2.0
+# Modules imported by then; unlike time this is deterministic (`startup_profile --max-modules`, always tested)
+STARTUP_MAX_MODULES = 800
+
+# Response compression (expenses.middleware.CompressionMiddleware); brotli is used when installed
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_CONTENT_TYPES = [
+    "application/json",
+    "application/x-ndjson",
+    "application/msgpack",
+]
@@ -0,0 +1,43 @@
+"""
+Lean production settings for API-only workers.
+Loads only what the JSON API needs; the admin, HTML forms/messages, static files, the browsable API and debug
+tooling stay in config.settings (use that for manage.py, migrations and the admin site).
+
+    DJANGO_SETTINGS_MODULE=config.settings_api gunicorn config.wsgi
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK, TEMPLATES
+
+DEBUG = False
+
+# Aplikace potřebné jen pro admin, HTML stránky a vývoj
+DEFERRED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'django_extensions',
+    'rest_framework.authtoken',
+]
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEFERRED_APPS]
+
+MIDDLEWARE = [m for m in MIDDLEWARE if m != 'django.contrib.messages.middleware.MessageMiddleware']
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'OPTIONS': {
+            'context_processors': [
+                processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                if processor != 'django.contrib.messages.context_processors.messages'
+            ],
+        },
+    },
+]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': [
+        renderer for renderer in REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+        if renderer != 'rest_framework.renderers.BrowsableAPIRenderer'
+    ],
+}
@@ -2,7 +2,7 @@
 URL configuration for ExpenseApp.
 Defines API endpoints and routes for admin, DRF viewsets, and authentication helpers.
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from expenses import views as expense_views
@@ -13,10 +13,10 @@ router.register(r'events', expense_views.EventViewSet, basename='event')
 router.register(r'participants', expense_views.ParticipantViewSet, basename='participant')
 router.register(r'expenses', expense_views.ExpenseViewSet, basename='expense')
 router.register(r'categories', expense_views.CategoryViewSet, basename='category')
+router.register(r'jobs', expense_views.JobViewSet, basename='job')
 
 # Explicit URL patterns for admin and custom API actions
 urlpatterns = [
-    path('admin/', admin.site.urls),  # Django admin site
     path('api/', include(router.urls)),  # DRF router-generated endpoints
     path('api/participants/<int:pk>/delete/', expense_views.delete_participant, name="delete_participant"),  # Delete participant
     path('api/events/<int:event_id>/delete/', expense_views.delete_event, name='delete_event'),  # Delete event
@@ -25,4 +25,15 @@ urlpatterns = [
     path("api/logout/", expense_views.api_logout, name="api_logout"),  # User logout
     path("api/me/", expense_views.api_me, name="api_me"),  # Current session info
     path("api/csrf/", expense_views.api_csrf, name="api_csrf"),  # CSRF bootstrap endpoint
-]
\ No newline at end of file
+    path("api/search/", expense_views.api_search, name="api_search"),  # Full-text search
+    path("api/p/<uuid:token>/", expense_views.token_event, name="token_event"),  # Participant share link
+    path("api/p/<uuid:token>/balance/", expense_views.token_balance, name="token_balance"),
+    path("api/p/<uuid:token>/settlement/", expense_views.token_settlement, name="token_settlement"),
+    path("api/p/<uuid:token>/expenses/", expense_views.token_add_expense, name="token_add_expense"),
+    path("metrics", expense_views.metrics_view, name="metrics"),  # Prometheus metrics
+]
+
+# Admin jen tam, kde je nainstalovaný (lehký profil config.settings_api ho vynechává)
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+    urlpatterns.insert(0, path('admin/', admin.site.urls))  # Django admin site
@@ -1,13 +1,140 @@
+from functools import partial
+from urllib.parse import parse_qs, urlparse
+
 from django.contrib import admin
-from .models import Event, Participant, Expense, Settlement, Category
+from django.contrib.admin.utils import unquote
+from django.core.paginator import Paginator
+from django.forms import ModelForm
+from django.forms.models import BaseInlineFormSet
+from django.http import QueryDict
+from django.urls import Resolver404, resolve
+from .models import Event, Participant, Expense, Settlement, Category, Job
+from . import ledger, search
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset editing one page of related objects at a time (page chosen by a GET parameter)."""
+    per_page = 50
+    page = 1
+    page_param = "page"
+    # GET parametry požadavku; odkazy stránkování je zachovávají (stránky ostatních inline, filtry changelistu)
+    query = None
+
+    def get_queryset(self):
+        if not hasattr(self, "_page_queryset"):
+            queryset = super().get_queryset()
+            self.total_count = queryset.count()
+            start = (self.page - 1) * self.per_page
+            self._page_queryset = queryset[start:start + self.per_page]
+        return self._page_queryset
+
+    @property
+    def page_count(self):
+        self.get_queryset()
+        return max(1, -(-self.total_count // self.per_page))
+
+    @property
+    def page_range(self):
+        """Page numbers for the pager, elided like the admin changelist's ("1 2 … 40 41 42 … 199 200")."""
+        self.get_queryset()
+        return Paginator(range(self.total_count), self.per_page).get_elided_page_range(self.page)
+
+    @property
+    def page_links(self):
+        """(page number, query string) pairs for the pager, with only this inline's page parameter replaced."""
+        links = []
+        for number in self.page_range:
+            if number == Paginator.ELLIPSIS:
+                links.append((number, None))
+                continue
+            query = self.query.copy() if self.query is not None else QueryDict(mutable=True)
+            query[self.page_param] = number
+            links.append((number, query.urlencode()))
+        return links
+
+
+class PaginatedInline(admin.TabularInline):
+    """Tabular inline that renders at most `per_page` existing rows plus pager links."""
+    formset = PaginatedInlineFormSet
+    template = "admin/expenses/paginated_tabular.html"
+    per_page = 50
+    page_param = "page"
+
+    def get_queryset(self, request):
+        # __str__ řádků (zobrazený v inline tabulce) sahá na event.title
+        return super().get_queryset(request).select_related("event")
+
+    def get_formset(self, request, obj=None, **kwargs):
+        kwargs.setdefault("formfield_callback", partial(self.formfield_for_dbfield, request=request, event=obj))
+        formset = super().get_formset(request, obj, **kwargs)
+        try:
+            formset.page = max(1, int(request.GET.get(self.page_param, 1)))
+        except ValueError:
+            formset.page = 1
+        formset.per_page = self.per_page
+        formset.page_param = self.page_param
+        formset.query = request.GET
+        return formset
+
+    def formfield_for_dbfield(self, db_field, request, event=None, **kwargs):
+        """Scope participant choices to the edited event and evaluate every choice list only once per formset."""
+        if db_field.name in ("payer", "split_between"):
+            kwargs["queryset"] = Participant.objects.filter(event=event).select_related("event")
+        field = super().formfield_for_dbfield(db_field, request, **kwargs)
+        if field is not None and hasattr(field, "queryset"):
+            # Jinak by každý řádek inline formuláře znovu dotazoval databázi kvůli <option> seznamu
+            field.choices = list(field.choices)
+        return field
+
 
-class ParticipantInline(admin.TabularInline):
+class ParticipantInline(PaginatedInline):
     model = Participant
     extra = 1
+    per_page = 100
+    page_param = "participant_page"
+    fields = ("name", "email")
 
-class ExpenseInline(admin.TabularInline):
+
+class ExpenseForm(ModelForm):
+    """Expense form whose split is saved with ledger.set_split (one balance change, not remove-then-add)."""
+
+    def _save_m2m(self):
+        split = self.cleaned_data.pop("split_between", None)
+        super()._save_m2m()
+        if split is not None:
+            ledger.set_split(self.instance, split)
+
+
+class ExpenseInline(PaginatedInline):
     model = Expense
+    form = ExpenseForm
     extra = 1
+    page_param = "expense_page"
+    fields = ("description", "amount", "payer", "split_between", "category")
+    show_change_link = True
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("split_between")
+
+
+def referring_event_id(request):
+    """Return the id of the event whose admin page issued this (autocomplete) request, if any."""
+    referer = urlparse(request.META.get("HTTP_REFERER", ""))
+    try:
+        match = resolve(referer.path)
+    except Resolver404:
+        return None
+    object_id = match.kwargs.get("object_id")
+    if match.url_name == "expenses_event_change" and object_id:
+        return unquote(object_id)
+    if match.url_name in ("expenses_expense_change", "expenses_settlement_change") and object_id:
+        model = Expense if match.url_name == "expenses_expense_change" else Settlement
+        return model.objects.filter(pk=unquote(object_id)).values_list("event_id", flat=True).first()
+    if match.url_name in ("expenses_expense_add", "expenses_settlement_add"):
+        # Formulář pro přidání lze předvyplnit ?event=<id>
+        return parse_qs(referer.query).get("event", [None])[0]
+    return None
+
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
@@ -15,22 +142,61 @@ class EventAdmin(admin.ModelAdmin):
     search_fields = ("title",)
     date_hierarchy = "created_at"
     inlines = [ParticipantInline, ExpenseInline]
+    show_full_result_count = False
 
 @admin.register(Participant)
 class ParticipantAdmin(admin.ModelAdmin):
     list_display = ("name", "email", "event", "created_at")
     list_filter = ("event",)
+    list_select_related = ("event",)
+    search_fields = ("name", "email")
+    autocomplete_fields = ("event",)
+    ordering = ("-id",)
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("event")
+
+    def get_search_results(self, request, queryset, search_term):
+        """Limit autocomplete results for expense/settlement participant fields to the referring event."""
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if request.GET.get("model_name") in ("expense", "settlement"):
+            event_id = referring_event_id(request)
+            if event_id is not None:
+                queryset = queryset.filter(event_id=event_id)
+        return queryset, may_have_duplicates
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
+    form = ExpenseForm
     list_display = ("description", "amount", "payer", "event", "category", "created_at")
     list_filter = ("event", "category")
+    list_select_related = ("payer__event", "event", "category")
     search_fields = ("description",)
+    autocomplete_fields = ("event", "payer", "split_between", "category")
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """Use the full-text index instead of icontains scans over all descriptions."""
+        if not search_term:
+            return queryset, False
+        return search.matching(queryset, search_term), False
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ("name", "created_at")
+    search_fields = ("name",)
 
 @admin.register(Settlement)
 class SettlementAdmin(admin.ModelAdmin):
-    list_display = ("event", "from_participant", "to_participant", "amount", "created_at")
\ No newline at end of file
+    list_display = ("event", "from_participant", "to_participant", "amount", "created_at")
+    list_select_related = ("event", "from_participant__event", "to_participant__event")
+    autocomplete_fields = ("event", "from_participant", "to_participant")
+    show_full_result_count = False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("kind", "status", "progress", "attempts", "run_after", "updated_at")
+    list_filter = ("status", "kind")
+    show_full_result_count = False
@@ -1,6 +1,27 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
 
 
 class ExpensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expenses'
+
+    def ready(self):
+        from . import tasks  # noqa: F401 (registers background job tasks)
+        from .search import ensure_search_triggers
+        post_migrate.connect(ensure_search_triggers, sender=self)
+
+        from . import ledger
+        from .models import Event, Expense, Participant
+        pre_save.connect(ledger.expense_pre_save, sender=Expense)
+        post_save.connect(ledger.expense_post_save, sender=Expense)
+        pre_delete.connect(ledger.expense_pre_delete, sender=Expense)
+        m2m_changed.connect(ledger.split_changed, sender=Expense.split_between.through)
+        post_save.connect(ledger.participant_created, sender=Participant)
+        post_delete.connect(ledger.participant_deleted, sender=Participant)
+        pre_save.connect(ledger.event_pre_save, sender=Event)
+        post_save.connect(ledger.event_post_save, sender=Event)
+
+        from . import tokens
+        post_save.connect(tokens.invalidate_on_change, sender=Participant)
+        post_delete.connect(tokens.invalidate_on_change, sender=Participant)
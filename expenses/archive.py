@@ -0,0 +1,186 @@
+"""
+Archival tier for ExpenseApp.
+Events with no activity for ``ARCHIVE_AFTER_DAYS`` are moved out of the hot tables in batches: the raw rows of
+their participants, expenses, splits and settlements go into one compressed EventArchive blob per event, and an
+EventSnapshot with the read payload lets the usual /api/events/{id}/ endpoints keep serving them read-only.
+The first write to an archived event (snapshots.ensure_open) puts the rows back with their original ids.
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import ledger, snapshots, tokens
+from .deletion import delete_ids
+from .models import Category, Event, EventArchive, EventSnapshot, Expense, Participant, Settlement
+
+SplitRow = Expense.split_between.through
+
+# (název v blobu, model, cesta k události) v pořadí vkládání; maže se obráceně
+TABLES = (
+    ("participants", Participant, "event_id"),
+    ("expenses", Expense, "event_id"),
+    ("splits", SplitRow, "expense__event_id"),
+    ("settlements", Settlement, "event_id"),
+)
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder that keeps full microsecond precision, so restored timestamps are unchanged."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def inactive_events(cutoff):
+    """Return visible, not yet archived events with nothing created since `cutoff`."""
+    return Event.objects.filter(deleted_at__isnull=True, archived_at__isnull=True, created_at__lt=cutoff).exclude(
+        Exists(Expense.objects.filter(event=OuterRef("pk"), created_at__gte=cutoff))
+    ).exclude(
+        Exists(Participant.objects.filter(event=OuterRef("pk"), created_at__gte=cutoff))
+    )
+
+
+def dump_rows(event_ids):
+    """Return {event_id: {table: [row, ...]}} with the raw column values of the events' rows, one query per table."""
+    dumps = {event_id: {table: [] for table, _, _ in TABLES} for event_id in event_ids}
+    for table, model, event_field in TABLES:
+        rows = model.objects.filter(**{f"{event_field}__in": event_ids}).order_by("pk")
+        for event_id, *row in rows.values_list(event_field, *columns(model)):
+            dumps[event_id][table].append(row)
+    return dumps
+
+
+def encode(rows):
+    data = {"columns": {table: columns(model) for table, model, _ in TABLES}, "rows": rows}
+    return zlib.compress(json.dumps(data, cls=ArchiveEncoder).encode())
+
+
+def decode(data):
+    return json.loads(zlib.decompress(data))
+
+
+def records(data, table):
+    """Yield the archived rows of one table as {column: JSON value} dicts."""
+    names = data["columns"][table]
+    for row in data["rows"][table]:
+        yield dict(zip(names, row))
+
+
+def archive_batch(event_ids):
+    """Archive the given events (those still eligible) in one transaction; return how many were archived."""
+    with transaction.atomic():
+        ids = list(
+            Event.objects.select_for_update()
+            .filter(pk__in=event_ids, deleted_at__isnull=True, archived_at__isnull=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        if not ids:
+            return 0
+        dumps = dump_rows(ids)
+        payloads = snapshots.build_payloads(ids)
+        EventArchive.objects.bulk_create(
+            [EventArchive(event_id=event_id, data=encode(dumps[event_id])) for event_id in ids]
+        )
+        # Uzavřené události už snapshot mají, ten zůstává
+        EventSnapshot.objects.bulk_create(
+            [EventSnapshot(event_id=event_id, data=snapshots.encode(payloads[event_id])) for event_id in ids],
+            ignore_conflicts=True,
+        )
+        Event.objects.filter(pk__in=ids).update(archived_at=timezone.now())
+        for table, model, _ in reversed(TABLES):
+            position = columns(model).index(model._meta.pk.attname)
+            delete_ids(model, [row[position] for event_id in ids for row in dumps[event_id][table]])
+    # Sdílené odkazy archivovaných událostí nefungují, dokud je zápis neobnoví
+    tokens.invalidate(event_ids=ids)
+    return len(ids)
+
+
+def archive_events(days=None, batch_size=None, progress=None):
+    """Archive every inactive event in batches of `batch_size`; progress(archived) is called after each batch."""
+    days = settings.ARCHIVE_AFTER_DAYS if days is None else days
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    candidates = inactive_events(timezone.now() - timedelta(days=days)).order_by("pk")
+    archived, last = 0, 0
+    while True:
+        ids = list(candidates.filter(pk__gt=last).values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return archived
+        archived += archive_batch(ids)
+        last = ids[-1]
+        if progress is not None:
+            progress(archived)
+
+
+def restore_event(event_id):
+    """Move an archived event's rows back into the hot tables; return False if it is not archived."""
+    with transaction.atomic():
+        event = Event.objects.select_for_update().filter(pk=event_id, archived_at__isnull=False).first()
+        if event is None:
+            return False
+        data = decode(EventArchive.objects.filter(event_id=event_id).values_list("data", flat=True).get())
+        for table, model, _ in TABLES:
+            fields = {field.attname: field for field in model._meta.concrete_fields}
+            objs = [
+                model(**{name: fields[name].to_python(value) for name, value in row.items() if name in fields})
+                for row in records(data, table)
+            ]
+            if model is Expense:
+                # Kategorie mohla být mezitím smazána (SET_NULL)
+                existing = set(
+                    Category.objects.filter(pk__in={obj.category_id for obj in objs}).values_list("pk", flat=True)
+                )
+                for obj in objs:
+                    if obj.category_id not in existing:
+                        obj.category_id = None
+            # raw=True vloží hodnoty tak, jak jsou, včetně původních created_at (auto_now_add by je přepsal)
+            for start in range(0, len(objs), 500):
+                model._base_manager._insert(objs[start:start + 500], fields=list(fields.values()), raw=True)
+        EventArchive.objects.filter(event_id=event_id).delete()
+        if event.closed_at is None:
+            EventSnapshot.objects.filter(event_id=event_id).delete()
+        Event.objects.filter(pk=event_id).update(archived_at=None)
+        # Bloby starší než ledger nemají sloupec zůstatku
+        ledger.rebuild([event_id])
+    return True
+
+
+def archived_participants(event_ids):
+    """Return the participants of archived events as the rows balances.compute_balances reads.
+
+    Blobs written before the ledger existed have no balance column; their balances are replayed from the expenses.
+    """
+    rows = []
+    for event_id, data in EventArchive.objects.filter(event_id__in=event_ids).values_list("event_id", "data"):
+        data = decode(data)
+        participants = list(records(data, "participants"))
+        if participants and "balance_micros" not in participants[0]:
+            members = [row["id"] for row in participants]
+            splits = {}
+            for row in records(data, "splits"):
+                splits.setdefault(row["expense_id"], []).append(row["participant_id"])
+            balances = dict.fromkeys(members, 0)
+            for row in records(data, "expenses"):
+                for participant_id, micros in ledger.effect(
+                    row["payer_id"], row["amount"], splits.get(row["id"], ()), members
+                ).items():
+                    balances[participant_id] += micros
+            for row in participants:
+                row["balance_micros"] = balances[row["id"]]
+        rows += [
+            (row["id"], event_id, row["name"], row["email"], row["token"], row["balance_micros"])
+            for row in participants
+        ]
+    return rows
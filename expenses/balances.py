@@ -0,0 +1,117 @@
+"""
+Balance vectors for ExpenseApp.
+compute_balances() reads the per-participant ledger (expenses.ledger) of any number of events in one query;
+archived events are read from their archive blobs. settle() is the pure settlement algorithm and apply_expense()
+adds or removes one expense as a delta with the ledger's rounding, which is all a what-if preview needs;
+net_balances() merges vectors of several events by participant identity, converted into one currency.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from . import fx, metrics
+from .ledger import effect, from_micros, to_micros
+from .models import Participant
+
+
+def apply_expense(balances, payer_id, amount, split_ids, sign=1):
+    """Add (sign=1) or remove (sign=-1) one expense's effect on `balances` in place.
+
+    An expense without split participants is shared by everyone in `balances`.
+    """
+    for participant_id, micros in effect(payer_id, amount, split_ids, list(balances)).items():
+        balances[participant_id] = balances.get(participant_id, 0) + sign * from_micros(micros)
+    return balances
+
+
+def identity(email, token):
+    """Key identifying the same person across events: the normalized e-mail, else the participant's own token."""
+    email = email.strip().lower()
+    return f"email:{email}" if email else f"token:{token}"
+
+
+def compute_balances(event_ids):
+    """Return {event_id: {"names", "identities", "balances"}} keyed by participant id, in one query.
+
+    Balances are exact Decimals (positive = to receive, negative = owes). Events without participant rows
+    cost one more query, reading archived events from their archive blobs.
+    """
+    vectors = {event_id: {"names": {}, "identities": {}, "balances": {}} for event_id in event_ids}
+    participants = list(
+        Participant.objects.filter(event_id__in=vectors)
+        .order_by("pk")
+        .values_list("pk", "event_id", "name", "email", "token", "balance_micros")
+    )
+    idle = set(vectors).difference(event_id for _, event_id, *_ in participants)
+    if idle:
+        from .archive import archived_participants  # archive importuje tento modul
+        participants += archived_participants(idle)
+    for pk, event_id, name, email, token, micros in participants:
+        vectors[event_id]["names"][pk] = name
+        vectors[event_id]["identities"][pk] = identity(email, token)
+        vectors[event_id]["balances"][pk] = from_micros(micros)
+    for vector in vectors.values():
+        metrics.observe("expenses_event_size", len(vector["names"]), dimension="participants")
+    return vectors
+
+
+def balance_vector(event_id):
+    """Return the balance vector of one event (see compute_balances)."""
+    return compute_balances([event_id])[event_id]
+
+
+def net_balances(vectors, currency):
+    """Merge balance vectors of several events into one keyed by participant identity, in `currency`.
+
+    `vectors` are (vector, event currency) pairs; amounts in another currency are converted with one rate
+    lookup (raises fx.MissingRate) and rounded like the ledger. Returns (balances, names, members):
+    {identity: Decimal}, {identity: name}, {identity: [participant ids]}. The first name seen for an identity is used.
+    """
+    vectors = list(vectors)
+    convert = fx.converter({(source, currency) for _, source in vectors})
+    balances, names, members = {}, {}, {}
+    for vector, source in vectors:
+        for participant_id, amount in vector["balances"].items():
+            if source != currency:
+                amount = from_micros(to_micros(convert(amount, source, currency)))
+            key = vector["identities"].get(participant_id, participant_id)
+            balances[key] = balances.get(key, 0) + amount
+            names.setdefault(key, vector["names"].get(participant_id))
+            members.setdefault(key, []).append(participant_id)
+    return balances, names, members
+
+
+def settle(balances, names):
+    """Return settlement transactions [{"from", "to", "amount"}] paying off `balances` (greedy, in dict order)."""
+    creditors = []
+    debtors = []
+    for participant_id, amount in balances.items():
+        amt = Decimal(amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        name = names.get(participant_id)
+        if name is None:
+            continue  # pokud účastník není, přeskočíme
+        if amt > 0:
+            creditors.append([name, amt])
+        elif amt < 0:
+            debtors.append([name, -amt])
+
+    settlements = []
+    i, j = 0, 0
+    while i < len(debtors) and j < len(creditors):
+        debtor, debt_amt = debtors[i]
+        creditor, cred_amt = creditors[j]
+        payment = min(debt_amt, cred_amt)
+        settlements.append({"from": debtor, "to": creditor, "amount": float(payment)})
+
+        debt_amt -= payment
+        cred_amt -= payment
+
+        if debt_amt == 0:
+            i += 1
+        else:
+            debtors[i][1] = debt_amt
+
+        if cred_amt == 0:
+            j += 1
+        else:
+            creditors[j][1] = cred_amt
+
+    return settlements
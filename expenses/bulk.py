@@ -0,0 +1,75 @@
+"""
+Bulk edits of expenses.
+update_expenses() applies one set of changes (category, payer, split) to many expenses with a constant number of
+queries: one UPDATE for the columns, one DELETE plus batched INSERTs for the split rows, and a single ledger
+rebuild for all touched events instead of per-row signal deltas. Every changed expense gets its version bumped,
+so concurrent single-expense edits based on the old version are rejected (expenses.ledger.claim). Locks are
+taken in the ledger's order (expense rows, then participant rows ascending), never on the events.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+
+from . import ledger
+from .models import Event, Expense, Participant
+from .snapshots import EventClosed
+
+SplitRow = Expense.split_between.through
+
+
+def update_expenses(queryset, changes, versions=None):
+    """Apply `changes` to the expenses matched by `queryset` in one transaction; return (ids, event ids).
+
+    `changes` may hold "category" (Category or None), "payer" (participant id) and "split_between_ids" (empty
+    means everyone). `versions` optionally maps expense ids to the version the client saw; a mismatch raises
+    StaleExpense. Payer and split changes need all expenses in one event.
+    """
+    with transaction.atomic():
+        # Pořadí zámků jako v ledger: řádky výdajů (jen ty, ne připojené události), potom účastníci vzestupně
+        limit = settings.EXPENSE_BULK_UPDATE_MAX
+        rows = list(
+            queryset.select_for_update(of=("self",)).order_by("pk").values_list("pk", "event_id", "version")[:limit + 1]
+        )
+        if len(rows) > limit:
+            raise ValidationError({"detail": f"At most {limit} expenses per request."})
+        if not rows:
+            return [], []
+        versions = versions or {}
+        if any(versions.get(pk, version) != version for pk, _, version in rows):
+            raise ledger.StaleExpense()
+        ids = [pk for pk, _, _ in rows]
+        event_ids = sorted({event_id for _, event_id, _ in rows})
+        if Event.objects.filter(pk__in=event_ids, closed_at__isnull=False).exists():
+            raise EventClosed()
+
+        moves_money = "payer" in changes or "split_between_ids" in changes
+        if moves_money:
+            if len(event_ids) > 1:
+                raise ValidationError({"detail": "Payer and split changes need expenses of a single event."})
+            named = {changes["payer"]} if "payer" in changes else set()
+            named.update(changes.get("split_between_ids", ()))
+            if Participant.objects.filter(event_id=event_ids[0], pk__in=named).count() != len(named):
+                raise ValidationError({"detail": "All participants must belong to this event."})
+            for event_id in event_ids:
+                ledger.lock(event_id)
+
+        fields = {"version": F("version") + 1}
+        if "category" in changes:
+            fields["category"] = changes["category"]
+        if "payer" in changes:
+            fields["payer_id"] = changes["payer"]
+        Expense.objects.filter(pk__in=ids).update(**fields)
+        if "split_between_ids" in changes:
+            # Přepis spojovací tabulky po množinách, bez m2m_changed pro každý výdaj
+            SplitRow.objects.filter(expense_id__in=ids).delete()
+            SplitRow.objects.bulk_create(
+                [
+                    SplitRow(expense_id=expense_id, participant_id=participant_id)
+                    for expense_id in ids for participant_id in sorted(set(changes["split_between_ids"]))
+                ],
+                batch_size=500,
+            )
+        if moves_money:
+            ledger.rebuild(event_ids)
+    return ids, event_ids
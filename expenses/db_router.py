@@ -0,0 +1,90 @@
+"""
+Read-replica routing for ExpenseApp.
+Safe-method (GET/HEAD/OPTIONS) requests to the API viewsets read ExpenseApp models from one of the
+``DATABASE_REPLICAS`` aliases; everything else, and auth/session data always, uses the primary (``default``).
+After any request that wrote ExpenseApp data (viewset or function view, see ReplicaPinMiddleware) the client is
+pinned to the primary for ``DATABASE_REPLICA_STICKINESS`` seconds by a cookie, so it reads its own writes even
+while replicas lag behind.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = "db_primary_until"
+
+# Stav aktuálního požadavku: smí se číst z repliky / proběhl během něj nějaký zápis
+_read_replica = ContextVar("expenses_read_replica", default=False)
+_wrote = ContextVar("expenses_wrote", default=None)
+
+
+class ReplicaRouter:
+    """Route reads of `app_labels` models to a random replica while a replica read is active."""
+    app_labels = {"expenses"}
+
+    def db_for_read(self, model, **hints):
+        if not _read_replica.get() or model._meta.app_label not in self.app_labels:
+            return None
+        replicas = settings.DATABASE_REPLICAS
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        wrote = _wrote.get()
+        if wrote is not None and model._meta.app_label in self.app_labels:
+            wrote.append(model._meta.label)
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Repliky obsahují stejná data jako primární databáze
+        return True
+
+
+def is_pinned(request):
+    """True while the client's read-your-writes window after its last write is open."""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin_to_primary(response):
+    """Make the client read from the primary for the next DATABASE_REPLICA_STICKINESS seconds."""
+    window = settings.DATABASE_REPLICA_STICKINESS
+    response.set_cookie(PIN_COOKIE, f"{time.time() + window:.3f}", max_age=window, httponly=True, samesite="Lax")
+
+
+class ReplicaPinMiddleware:
+    """Pin the client to the primary after any request that wrote ExpenseApp data.
+
+    Runs for every view, so function views (token links, deletes) pin exactly like the viewsets; writes on safe
+    methods count too (``?async=1`` queues a job the client polls next).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote.set([])
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and response.status_code < 400:
+                pin_to_primary(response)
+            return response
+        finally:
+            _wrote.reset(token)
+
+
+class ReplicaReadMixin:
+    """Viewset mixin: serve safe requests from replicas unless the client is pinned."""
+
+    def dispatch(self, request, *args, **kwargs):
+        use_replica = (
+            request.method in SAFE_METHODS and bool(settings.DATABASE_REPLICAS) and not is_pinned(request)
+        )
+        token = _read_replica.set(use_replica)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_replica.reset(token)
@@ -0,0 +1,102 @@
+"""
+Bulk deletion for ExpenseApp.
+Django's delete() collects and cascades every related row in memory first; for large events that takes
+seconds and holds locks. These helpers delete the same rows with chunked raw DELETEs in foreign-key order,
+each chunk in its own short transaction, so memory use and lock time stay bounded.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from . import ledger, tokens
+from .models import Event, EventArchive, EventSnapshot, Expense, Participant, Settlement
+
+SplitRow = Expense.split_between.through
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def delete_chunked(queryset, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+    """Delete all rows matched by queryset, chunk_size primary keys at a time, without signals or collection.
+
+    The caller is responsible for deleting referencing rows first. on_chunk() is called after every chunk.
+    Returns the number of deleted rows.
+    """
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic(using=queryset.db):
+            deleted += model._base_manager.using(queryset.db).filter(pk__in=ids)._raw_delete(queryset.db)
+        if on_chunk is not None:
+            on_chunk()
+
+
+def delete_ids(model, ids, chunk_size=DEFAULT_CHUNK_SIZE, using="default"):
+    """Delete exactly the rows with the given primary keys, chunk_size at a time, in the caller's transaction."""
+    ids = list(ids)
+    deleted = 0
+    for start in range(0, len(ids), chunk_size):
+        deleted += model._base_manager.using(using).filter(pk__in=ids[start:start + chunk_size])._raw_delete(using)
+    return deleted
+
+
+def event_steps(event_id):
+    """Return the (queryset, label) deletion steps for an event, children before parents."""
+    participants = Q(participant__event_id=event_id)
+    return [
+        (SplitRow.objects.filter(Q(expense__event_id=event_id) | participants), "splits"),
+        (
+            Settlement.objects.filter(
+                Q(event_id=event_id) | Q(from_participant__event_id=event_id) | Q(to_participant__event_id=event_id)
+            ),
+            "settlements",
+        ),
+        (Expense.objects.filter(Q(event_id=event_id) | Q(payer__event_id=event_id)), "expenses"),
+        (Participant.objects.filter(event_id=event_id), "participants"),
+        (EventSnapshot.objects.filter(event_id=event_id), "snapshot"),
+        (EventArchive.objects.filter(event_id=event_id), "archive"),
+        (Event.objects.filter(pk=event_id), "event"),
+    ]
+
+
+def participant_steps(participant_id):
+    """Return the (queryset, label) deletion steps for a participant, children before parents."""
+    return [
+        (SplitRow.objects.filter(Q(participant_id=participant_id) | Q(expense__payer_id=participant_id)), "splits"),
+        (
+            Settlement.objects.filter(Q(from_participant_id=participant_id) | Q(to_participant_id=participant_id)),
+            "settlements",
+        ),
+        (Expense.objects.filter(payer_id=participant_id), "expenses"),
+        (Participant.objects.filter(pk=participant_id), "participant"),
+    ]
+
+
+def run_steps(steps, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Execute deletion steps in order; progress(done_steps, total_steps) is called after every chunk and step."""
+    counts = {}
+    for index, (queryset, label) in enumerate(steps, start=1):
+        # Hlášení po každé dávce obnovuje i pronájem jobu (Job.report_progress)
+        on_chunk = None if progress is None else (lambda done=index - 1: progress(done, len(steps)))
+        counts[label] = delete_chunked(queryset, chunk_size, on_chunk)
+        if progress is not None:
+            progress(index, len(steps))
+    return counts
+
+
+def purge_event(event_id, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Delete an event with all its participants, expenses, splits and settlements in bounded chunks."""
+    tokens.invalidate(event_ids=[event_id])
+    return run_steps(event_steps(event_id), chunk_size, progress)
+
+
+def purge_participant(participant_id, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Delete a participant with the expenses they paid, their splits and settlements in bounded chunks."""
+    event_id = Participant.objects.filter(pk=participant_id).values_list("event_id", flat=True).first()
+    counts = run_steps(participant_steps(participant_id), chunk_size, progress)
+    # Raw DELETE neposílá signály, ledger a cache tokenů proto opravíme ručně
+    ledger.rebuild([event_id])
+    tokens.invalidate(participant_ids=[participant_id])
+    return counts
@@ -0,0 +1,136 @@
+"""
+Currency conversion for ExpenseApp.
+Expenses may be in any currency; balances are kept in the event's currency. Rates come from the local FxRate
+table (``manage.py load_fx_rates``, no network), each row giving how many units of a currency one unit of
+``FX_BASE_CURRENCY`` buys. Conversions are batched: converter() fetches every rate a pass needs in one query, and
+within a request (FxRateMiddleware) rates already read are memoized, so no conversion costs a lookup per expense.
+"""
+import csv
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import F, Q
+from rest_framework.exceptions import APIException
+
+from .models import Expense, FxRate
+
+_memo = ContextVar("fx_rates", default=None)
+
+
+class MissingRate(APIException):
+    """Raised when converting from or to a currency without a loaded exchange rate."""
+    status_code = 400
+    default_code = "missing_rate"
+
+    def __init__(self, currencies):
+        self.currencies = sorted(currencies)
+        super().__init__(
+            f"No exchange rate for {', '.join(self.currencies)}; load rates with `manage.py load_fx_rates`."
+        )
+
+
+@contextmanager
+def memoize():
+    """Memoize rates read inside the block (one request); nested blocks share the outer memo."""
+    if _memo.get() is not None:
+        yield
+        return
+    token = _memo.set({})
+    try:
+        yield
+    finally:
+        _memo.reset(token)
+
+
+def rates(currencies):
+    """Return {currency: Decimal rate against FX_BASE_CURRENCY} in at most one query; raise MissingRate."""
+    memo = _memo.get()
+    if memo is None:
+        memo = {}
+    memo.setdefault(settings.FX_BASE_CURRENCY, Decimal(1))
+    missing = set(currencies) - memo.keys()
+    if missing:
+        memo.update(FxRate.objects.filter(currency__in=missing).values_list("currency", "rate"))
+        missing -= memo.keys()
+        if missing:
+            raise MissingRate(missing)
+    return {currency: memo[currency] for currency in currencies}
+
+
+def converter(pairs):
+    """Return convert(amount, source, target) able to convert every (source, target) pair given, in one query."""
+    table = rates({currency for pair in pairs if pair[0] != pair[1] for currency in pair})
+
+    def convert(amount, source, target):
+        if source == target:
+            return amount
+        return Decimal(amount) * table[target] / table[source]
+
+    return convert
+
+
+def convert(amount, source, target):
+    """Convert one amount; the same currency costs nothing, otherwise rates are read (memoized)."""
+    return converter([(source, target)])(amount, source, target)
+
+
+def parse_rates(text, filename=""):
+    """Return {currency: Decimal} from a rate file.
+
+    ``*.json`` files hold ``{"base": "EUR", "rates": {"USD": 1.08, ...}}`` (``base`` optional); anything else is
+    CSV with ``currency,rate`` rows, where blank lines, ``#`` comments and a ``currency,rate`` header are skipped.
+    Raises ValueError on malformed input or a base other than FX_BASE_CURRENCY.
+    """
+    if filename.endswith(".json"):
+        data = json.loads(text, parse_float=Decimal)
+        base = data.get("base", settings.FX_BASE_CURRENCY).upper()
+        if base != settings.FX_BASE_CURRENCY:
+            raise ValueError(f"rates are quoted per {base}, expected {settings.FX_BASE_CURRENCY}")
+        pairs = data["rates"].items()
+    else:
+        pairs = [
+            row for row in csv.reader(text.splitlines())
+            if row and not row[0].startswith("#") and row[0].strip().lower() != "currency"
+        ]
+    rates = {}
+    for pair in pairs:
+        try:
+            currency, rate = pair
+            currency, rate = currency.strip().upper(), Decimal(str(rate).strip())
+        except (ValueError, InvalidOperation):
+            raise ValueError(f"malformed rate {pair!r}")
+        if len(currency) != 3 or not currency.isalpha() or not rate > 0:
+            raise ValueError(f"malformed rate {pair!r}")
+        rates[currency] = rate
+    return rates
+
+
+def affected_events(currencies):
+    """Return ids of events with an expense converted from or to any of the given currencies."""
+    foreign = Expense.objects.exclude(currency="").exclude(currency=F("event__currency"))
+    return sorted(set(
+        foreign.filter(Q(currency__in=currencies) | Q(event__currency__in=currencies))
+        .values_list("event_id", flat=True).distinct()
+    ))
+
+
+def load_rates(rates, batch_size=100):
+    """Store the rates and rebuild, in batches, the ledgers of events whose conversions they change.
+
+    Returns (rates changed, events rebuilt).
+    """
+    from .ledger import rebuild  # ledger importuje tento modul
+
+    stored = dict(FxRate.objects.filter(currency__in=rates).values_list("currency", "rate"))
+    changed = {currency for currency, rate in rates.items() if stored.get(currency) != rate}
+    FxRate.objects.bulk_create(
+        [FxRate(currency=currency, rate=rates[currency]) for currency in sorted(changed)],
+        update_conflicts=True, unique_fields=["currency"], update_fields=["rate", "updated_at"],
+    )
+    event_ids = affected_events(changed) if changed else []
+    for start in range(0, len(event_ids), batch_size):
+        rebuild(event_ids[start:start + batch_size])
+    return len(changed), len(event_ids)
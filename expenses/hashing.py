@@ -0,0 +1,92 @@
+"""
+Bounded execution of password hashing.
+PBKDF2 is deliberately CPU-heavy; running it on a small dedicated thread pool (hashlib releases the GIL) caps
+how much CPU authentication can take, and requests beyond the pool's queue fail fast with 503 instead of
+stalling every worker.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingBusy(APIException):
+    """Raised when the password hashing pool is saturated."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Authentication is busy, please retry shortly."
+    default_code = "hashing_busy"
+
+
+class BoundedExecutor:
+    """Thread pool that accepts at most `workers + queue` pending calls; submit() raises HashingBusy beyond that."""
+
+    def __init__(self, workers, queue, timeout):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hashing")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+    def run(self, func, *args):
+        """Run func(*args) on the pool and return its result."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusy()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return this process's hashing executor (re-created after fork)."""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = BoundedExecutor(
+                    settings.PASSWORD_HASHING_WORKERS,
+                    settings.PASSWORD_HASHING_QUEUE,
+                    settings.PASSWORD_HASHING_TIMEOUT,
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def hash_password(password):
+    """make_password() on the bounded pool."""
+    return get_executor().run(make_password, password)
+
+
+class BoundedHashingBackend(ModelBackend):
+    """ModelBackend whose password checks run on the bounded hashing pool; DB access stays on the request thread."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Stejně jako ModelBackend zahashujeme heslo i pro neexistujícího uživatele (časový útok)
+            hash_password(password)
+            return None
+        if not get_executor().run(check_password, password, user.password):
+            return None
+        if identify_hasher(user.password).must_update(user.password):
+            user.password = hash_password(password)
+            user.save(update_fields=["password"])
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,143 @@
+"""
+Idempotency keys for create endpoints.
+A client sends ``Idempotency-Key: <unique value>`` with a POST; the first response is stored for
+IDEMPOTENCY_KEY_TTL seconds and retries with the same key replay it instead of executing the view again.
+"""
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .deletion import delete_chunked
+from .models import IdempotencyKey
+
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = 255
+
+
+class RequestInProgress(APIException):
+    """Raised when a request with the same Idempotency-Key is still being executed."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still being processed; retry later."
+    default_code = "idempotency_in_progress"
+
+
+class KeyReused(APIException):
+    """Raised when an Idempotency-Key is reused with a different request body."""
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used for a different request."
+    default_code = "idempotency_key_reused"
+
+
+def idempotent(view):
+    """Decorate a DRF view function or viewset method so it honours the Idempotency-Key header.
+
+    Only successful (2xx) responses are stored; errors release the key so the client can fix and retry.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        key = request.META.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({"Idempotency-Key": f"Must be at most {MAX_KEY_LENGTH} characters."})
+
+        scope = f"{_client(request)}:{request.method}:{request.path}"[:255]
+        request_hash = request_digest(request.data)
+        record = _acquire(scope, key, request_hash)
+        if record.status_code is not None:
+            return Response(record.response, status=record.status_code, headers={"Idempotent-Replayed": "true"})
+
+        try:
+            # Zápis výsledku a uložení odpovědi se potvrdí spolu, takže pád mezi nimi nevede k duplicitě
+            with transaction.atomic():
+                response = view(*args, **kwargs)
+                if status.is_success(response.status_code):
+                    data = json.loads(json.dumps(response.data, cls=JSONEncoder))
+                    IdempotencyKey.objects.filter(pk=record.pk).update(
+                        status_code=response.status_code, response=data, locked_until=None
+                    )
+                    return response
+        except Exception:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            raise
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+        return response
+
+    return wrapper
+
+
+def _client(request):
+    """Return whose key space a request uses: the user, else the anonymous client's session or address.
+
+    Anonymous clients must not share one space, or two of them picking the same key would get each other's
+    stored response.
+    """
+    if request.user.is_authenticated:
+        return str(request.user.pk)
+    session = getattr(request, "session", None)
+    if session is not None and session.session_key:
+        return f"anon-session-{session.session_key}"
+    return f"anon-ip-{request.META.get('REMOTE_ADDR', '')}"
+
+
+def request_digest(data):
+    """Return the stored fingerprint of a request body.
+
+    An HMAC keyed with SECRET_KEY, not a bare hash: bodies such as signup's contain passwords, and a plain
+    digest kept for IDEMPOTENCY_KEY_TTL could be brute-forced offline.
+    """
+    body = json.dumps(data, sort_keys=True, cls=JSONEncoder)
+    return salted_hmac("expenses.idempotency", body, algorithm="sha256").hexdigest()
+
+
+def _acquire(scope, key, request_hash):
+    """Return the stored record for (scope, key), creating it locked for this request if it does not exist."""
+    now = timezone.now()
+    lock_until = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    scope=scope,
+                    key=key,
+                    request_hash=request_hash,
+                    locked_until=lock_until,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                )
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is None:
+            continue  # mezitím smazán (vypršel nebo selhal), zkusíme znovu
+        if record.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+            continue
+        if record.request_hash != request_hash:
+            raise KeyReused()
+        if record.status_code is not None:
+            return record
+        # Souběžný duplikát: počkat, dokud první požadavek nedoběhne nebo jeho zámek nevyprší
+        if record.locked_until and record.locked_until > now:
+            raise RequestInProgress()
+        taken = IdempotencyKey.objects.filter(pk=record.pk, locked_until=record.locked_until).update(
+            locked_until=lock_until
+        )
+        if taken:
+            return record
+        raise RequestInProgress()
+    raise RequestInProgress()
+
+
+def purge_expired(chunk_size=1000):
+    """Delete expired idempotency keys in bulk; returns the number of deleted rows."""
+    return delete_chunked(IdempotencyKey.objects.filter(expires_at__lte=timezone.now()), chunk_size)
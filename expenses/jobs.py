@@ -0,0 +1,148 @@
+"""
+Database-backed background jobs for ExpenseApp.
+Heavy operations are enqueued as Job rows and executed by `manage.py run_workers`; no external broker is needed.
+Workers claim jobs with a compare-and-swap UPDATE, so any number of processes/threads can share one queue.
+A claim is a lease of JOB_LEASE_SECONDS that Job.report_progress renews; long tasks must report progress.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .deletion import delete_chunked
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    """Register a function as a job task under `name`. It is called as func(job, **job.payload)."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, max_attempts=None):
+    """Queue a job of a registered kind and return it."""
+    if kind not in TASKS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def enqueue_once(kind, payload=None):
+    """Return the queued or running job of this kind and payload, or queue a new one (repeated requests share it)."""
+    pending = Job.objects.filter(kind=kind, payload=payload or {}, status__in=[Job.QUEUED, Job.RUNNING])
+    return pending.order_by("pk").first() or enqueue(kind, payload)
+
+
+def worker_id():
+    """Identify the current worker thread (host:pid:thread) for Job.locked_by."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:100]
+
+
+def claim(worker, batch=10):
+    """Atomically take the next runnable job for `worker`, or return None.
+
+    Running jobs whose lease (JOB_LEASE_SECONDS, renewed by Job.report_progress) expired are reclaimed, so a crashed
+    worker loses nothing; those that already used all their attempts are marked failed instead, so a job that
+    crashes its worker is not retried forever.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    Job.objects.filter(status=Job.RUNNING, locked_at__lt=stale, attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, error="Worker lease expired on the last attempt.", locked_by="", locked_at=None,
+        updated_at=now,
+    )
+    runnable = Q(status=Job.QUEUED, run_after__lte=now) | Q(
+        status=Job.RUNNING, locked_at__lt=stale, attempts__lt=F("max_attempts")
+    )
+    candidates = Job.objects.filter(runnable).order_by("run_after", "id").values_list("id", flat=True)[:batch]
+    for job_id in candidates:
+        # Compare-and-swap: jen jeden worker uspěje, ostatní zkusí dalšího kandidáta
+        claimed = Job.objects.filter(runnable, pk=job_id).update(
+            status=Job.RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def run(job):
+    """Execute a claimed job and record its result, scheduling a retry with backoff on failure."""
+    func = TASKS.get(job.kind)
+    try:
+        if func is None:
+            raise LookupError(f"No task registered for job kind {job.kind!r}")
+        result = func(job, **job.payload)
+    except Job.LeaseLost:
+        # Job převzal jiný worker; jeho stav už nepřepisujeme
+        logger.warning("Job %s lost its lease to another worker; stopped", job.pk)
+        return False
+    except Exception:
+        logger.exception("Job %s failed (attempt %s/%s)", job.pk, job.attempts, job.max_attempts)
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            changes = {"status": Job.QUEUED, "run_after": now + timedelta(seconds=delay)}
+        else:
+            changes = {"status": Job.FAILED}
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            error=traceback.format_exc(), locked_by="", locked_at=None, updated_at=now, **changes
+        )
+        return False
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status=Job.SUCCEEDED, result=result, progress=1.0, error="",
+        locked_by="", locked_at=None, updated_at=timezone.now(),
+    )
+    return True
+
+
+def purge_finished(days=None, chunk_size=1000):
+    """Delete succeeded and failed jobs last updated more than `days` (JOB_RETENTION_DAYS) ago; return the count."""
+    days = settings.JOB_RETENTION_DAYS if days is None else days
+    finished = Job.objects.filter(
+        status__in=[Job.SUCCEEDED, Job.FAILED], updated_at__lt=timezone.now() - timedelta(days=days)
+    )
+    return delete_chunked(finished, chunk_size)
+
+
+def work(stop=None, once=False, poll_interval=None):
+    """Claim and run jobs until `stop` is set; with once=True return as soon as the queue is empty."""
+    stop = stop or threading.Event()
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    worker = worker_id()
+    processed = 0
+    try:
+        while not stop.is_set():
+            if not connection.in_atomic_block:
+                close_old_connections()
+            job = claim(worker)
+            if job is None:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run(job)
+            processed += 1
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+    return processed
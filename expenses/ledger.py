@@ -0,0 +1,280 @@
+"""
+Per-participant balance ledger for ExpenseApp.
+Participant.balance_micros holds each balance in integer micro-units (millionths of the currency unit) and is
+changed only by F() deltas, so concurrent expense writes to one event never read-modify-write a shared row and
+reading balances is a single query. An amount is split into integer shares that add up exactly (the remainder
+goes to the lowest participant ids), so the ledger of every event sums to zero. Amounts in a foreign currency
+are converted to the event's currency (expenses.fx) before they are split; loading new rates rebuilds the events
+that have such expenses.
+
+Signal handlers below keep the ledger in step with ORM writes. Writers that change several balances at once
+lock the affected participant rows first with lock(), always in ascending pk order, so they cannot deadlock.
+Splits are replaced with set_split(), which touches only the old and new members. Bulk writes and raw deletes
+bypass the signals and must call rebuild().
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import fx
+from .models import Event, Expense, Participant
+
+SplitRow = Expense.split_between.through
+
+MICROS = 1_000_000
+
+# Značka „rozdělení neznámé“ pro pop() z instance; prázdný seznam znamená „všichni účastníci“
+_UNKNOWN = object()
+
+
+class StaleExpense(APIException):
+    """Raised when an expense changed since the version the client based its edit on."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Expense was changed by someone else; reload it and try again."
+    default_code = "stale_expense"
+
+
+def to_micros(amount):
+    return int((Decimal(str(amount)) * MICROS).to_integral_value())
+
+
+def from_micros(micros):
+    return Decimal(micros) / MICROS
+
+
+def share(micros, size, index):
+    """Return the micros owed by the `index`-th (by pk) of `size` split members; lower ids take the remainder."""
+    portion, remainder = divmod(micros, size)
+    return portion + (index < remainder)
+
+
+def effect(payer_id, amount, split_ids, members):
+    """Return {participant_id: micros} of one expense; an empty split means it is shared by all `members`."""
+    split_ids = sorted(set(split_ids) or members)
+    amount = to_micros(amount)
+    deltas = {}
+    for index, participant_id in enumerate(split_ids):
+        deltas[participant_id] = -share(amount, len(split_ids), index)
+    deltas[payer_id] = deltas.get(payer_id, 0) + amount
+    return deltas
+
+
+def difference(new, old):
+    """Return the non-zero per-participant change from effect `old` to effect `new`."""
+    changes = {key: new.get(key, 0) - old.get(key, 0) for key in new.keys() | old.keys()}
+    return {key: value for key, value in changes.items() if value}
+
+
+def apply(deltas):
+    """Add the deltas to the participants' balances, one F() update per row in ascending pk order."""
+    for participant_id in sorted(deltas):
+        if deltas[participant_id]:
+            Participant.objects.filter(pk=participant_id).update(
+                balance_micros=F("balance_micros") + deltas[participant_id]
+            )
+
+
+def members(event_id):
+    return list(Participant.objects.filter(event_id=event_id).order_by("pk").values_list("pk", flat=True))
+
+
+def lock(event_id, participant_ids=None):
+    """Lock the participant rows a write will change, in ascending pk order; None locks the whole event.
+
+    Must run inside a transaction. Returns the locked ids; for the whole event this includes participants
+    committed while waiting for the locks (they have higher pks, so the order still holds).
+    """
+    queryset = Participant.objects.select_for_update().order_by("pk")
+    if participant_ids is not None:
+        return list(queryset.filter(pk__in=set(participant_ids)).values_list("pk", flat=True))
+    locked = list(queryset.filter(event_id=event_id).values_list("pk", flat=True))
+    added = [pk for pk in members(event_id) if pk not in set(locked)]
+    if added:
+        locked += list(queryset.filter(pk__in=added).values_list("pk", flat=True))
+    return locked
+
+
+def lock_for(event_id, payer_ids, splits):
+    """Lock what writing an expense with these payers and (old and new) splits changes.
+
+    That is the named participants, or the whole event when a split is empty (shared by everyone).
+    """
+    if not all(splits):
+        return lock(event_id)
+    return lock(event_id, {*payer_ids, *(participant_id for split in splits for participant_id in split)})
+
+
+def claim(expense, expected_version):
+    """Bump the expense's version if it is still `expected_version`, else raise StaleExpense (optimistic lock).
+
+    The conditional UPDATE also locks the expense row until the caller's transaction ends.
+    """
+    if not Expense.objects.filter(pk=expense.pk, version=expected_version).update(version=F("version") + 1):
+        raise StaleExpense()
+    expense.version = expected_version + 1
+
+
+def replay(event_ids):
+    """Return {participant_id: micros} recomputed from the expenses of the given events."""
+    event_members = {}
+    participants = Participant.objects.filter(event_id__in=event_ids).order_by("pk")
+    for pk, event_id in participants.values_list("pk", "event_id"):
+        event_members.setdefault(event_id, []).append(pk)
+    splits = {}
+    for expense_id, participant_id in SplitRow.objects.filter(expense__event_id__in=event_ids).values_list(
+        "expense_id", "participant_id"
+    ):
+        splits.setdefault(expense_id, []).append(participant_id)
+    balances = {pk: 0 for ids in event_members.values() for pk in ids}
+    expenses = list(
+        Expense.objects.filter(event_id__in=event_ids)
+        .values_list("pk", "event_id", "payer_id", "amount", "currency", "event__currency")
+    )
+    # Jeden dotaz na kurzy pro celý průchod
+    convert = fx.converter({(currency or target, target) for *_, currency, target in expenses})
+    for pk, event_id, payer_id, amount, currency, target in expenses:
+        amount = convert(amount, currency or target, target)
+        for participant_id, micros in effect(payer_id, amount, splits.get(pk, ()), event_members[event_id]).items():
+            balances[participant_id] = balances.get(participant_id, 0) + micros
+    return balances
+
+
+def rebuild(event_ids):
+    """Recompute the ledger of the given events from their expenses (after bulk writes or raw deletes)."""
+    with transaction.atomic():
+        for event_id in sorted(event_ids):
+            lock(event_id)
+        balances = replay(event_ids)
+        Participant.objects.bulk_update(
+            [Participant(pk=pk, balance_micros=micros) for pk, micros in balances.items()], ["balance_micros"],
+            batch_size=500,
+        )
+
+
+def split_ids(expense_id):
+    return list(SplitRow.objects.filter(expense_id=expense_id).values_list("participant_id", flat=True))
+
+
+# (event_id, payer_id, amount, měna výdaje, měna události): vše, na čem závisí účinek výdaje kromě rozdělení
+_STATE = ("event_id", "payer_id", "amount", "currency", "event__currency")
+
+
+def _current_state(instance):
+    return instance.event_id, instance.payer_id, instance.amount, instance.currency, instance.event.currency
+
+
+def _stored_state(expense_id):
+    return Expense.objects.filter(pk=expense_id).values_list(*_STATE).first()
+
+
+def _effect(state, split):
+    event_id, payer_id, amount, currency, event_currency = state
+    amount = fx.convert(amount, currency or event_currency, event_currency)
+    return effect(payer_id, amount, split, [] if split else members(event_id))
+
+
+def expense_pre_save(sender, instance, raw=False, **kwargs):
+    """Remember the stored payer/amount/currency/event of an edited expense."""
+    if not raw and not instance._state.adding:
+        instance._ledger_old = _stored_state(instance.pk)
+
+
+def expense_post_save(sender, instance, created, raw=False, **kwargs):
+    """Apply a new expense, or the change of an edited one's payer/amount/currency/event under its current split."""
+    if raw:
+        return
+    if created:
+        # Tvůrce může předem říct konečné rozdělení (ExpenseSerializer.create), aby se nepočítalo „všichni“
+        split = list(instance.__dict__.pop("_ledger_split", ()))
+        apply(_effect(_current_state(instance), split))
+        instance._ledger_applied = split
+        return
+    old = instance.__dict__.pop("_ledger_old", None)
+    new = _current_state(instance)
+    if old is None or old == new:
+        return
+    split = split_ids(instance.pk)
+    apply(difference(_effect(new, split), _effect(old, split)))
+
+
+def set_split(expense, participants):
+    """Replace a saved expense's split and apply one delta from the effect of the old split to the new one.
+
+    Use this rather than split_between.set(): set() removes the old members before adding the new ones, so for a
+    disjoint re-split the handler would briefly see an empty split ("everyone") and write rows nobody locked.
+    """
+    applied = expense.__dict__.pop("_ledger_applied", _UNKNOWN)
+    before = split_ids(expense.pk) if applied is _UNKNOWN else applied
+    after = sorted({getattr(participant, "pk", participant) for participant in participants})
+    expense._ledger_set_split = True
+    try:
+        expense.split_between.set(after)
+    finally:
+        del expense._ledger_set_split
+    if sorted(before) != after:
+        state = _current_state(expense)
+        apply(difference(_effect(state, after), _effect(state, before)))
+
+
+def split_changed(sender, instance, action, reverse, **kwargs):
+    """m2m_changed handler for Expense.split_between (single add/remove/clear calls; see set_split)."""
+    if reverse:
+        # participant.shared_expenses.add(...): může se týkat mnoha výdajů, přepočítáme celou událost
+        if action.startswith("post_"):
+            rebuild([instance.event_id])
+        return
+    if instance.__dict__.get("_ledger_set_split"):
+        return  # set_split() použije jednu změnu za celou výměnu
+    if action.startswith("pre_"):
+        applied = instance.__dict__.pop("_ledger_applied", _UNKNOWN)
+        instance._ledger_before = split_ids(instance.pk) if applied is _UNKNOWN else applied
+    elif action.startswith("post_"):
+        before = instance.__dict__.pop("_ledger_before", [])
+        after = split_ids(instance.pk)
+        if sorted(before) != sorted(after):
+            state = _current_state(instance)
+            apply(difference(_effect(state, after), _effect(state, before)))
+
+
+def _deleting_event(origin):
+    """True when a delete cascades from an Event (instance or queryset): its balances go away with it."""
+    return isinstance(origin, Event) or getattr(origin, "model", None) is Event
+
+
+def expense_pre_delete(sender, instance, origin=None, **kwargs):
+    """Remove the stored effect of an expense before its split rows are deleted."""
+    if _deleting_event(origin):
+        return
+    state = _stored_state(instance.pk)
+    if state is not None:
+        apply({key: -value for key, value in _effect(state, split_ids(instance.pk)).items()})
+
+
+def participant_created(sender, instance, created, raw=False, **kwargs):
+    """post_save handler for Participant: a new member takes a share of the expenses split among everyone."""
+    if created and not raw and Expense.objects.filter(
+        event_id=instance.event_id, split_between__isnull=True
+    ).exists():
+        rebuild([instance.event_id])
+
+
+def participant_deleted(sender, instance, origin=None, **kwargs):
+    """post_delete handler for Participant: the cascade dropped their splits, so the remaining shares change."""
+    if not _deleting_event(origin):
+        rebuild([instance.event_id])
+
+
+def event_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Remember the stored currency of an edited event."""
+    if not raw and not instance._state.adding and (update_fields is None or "currency" in update_fields):
+        instance._ledger_currency = Event.objects.filter(pk=instance.pk).values_list("currency", flat=True).first()
+
+
+def event_post_save(sender, instance, created, raw=False, **kwargs):
+    """post_save handler for Event: balances are kept in the event's currency, so a new currency rebuilds them."""
+    old = instance.__dict__.pop("_ledger_currency", None)
+    if not created and not raw and old is not None and old != instance.currency:
+        rebuild([instance.pk])
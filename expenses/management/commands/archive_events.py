@@ -0,0 +1,18 @@
+"""
+Move inactive events into the archival tier in batches (run periodically, e.g. from cron).
+"""
+from django.core.management.base import BaseCommand
+
+from expenses.archive import archive_events
+
+
+class Command(BaseCommand):
+    help = "Archive events with nothing created for ARCHIVE_AFTER_DAYS days."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Override ARCHIVE_AFTER_DAYS.")
+        parser.add_argument("--batch-size", type=int, default=None, help="Override ARCHIVE_BATCH_SIZE.")
+
+    def handle(self, *args, **options):
+        archived = archive_events(options["days"], options["batch_size"])
+        self.stdout.write(f"Archived {archived} event(s)")
@@ -0,0 +1,93 @@
+"""
+Benchmark the DRF serializer path against the fast read-only path for expense and event payloads.
+Seeds a throwaway event inside a transaction that is rolled back afterwards.
+"""
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from expenses.models import Category, Event, Expense, Participant
+from expenses.renderers import FastJSONRenderer
+from expenses.serializers import EventSerializer, ExpenseSerializer, event_rows, expense_rows
+
+
+class _Rollback(Exception):
+    """Raised to discard the seeded benchmark data."""
+
+
+class Command(BaseCommand):
+    help = "Compare CPU time of DRF serialization vs. the fast path on a seeded event."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--expenses", type=int, default=10000)
+        parser.add_argument("--participants", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                event = self._seed(options["participants"], options["expenses"])
+                self._compare(
+                    "expense list",
+                    lambda: JSONRenderer().render(ExpenseSerializer(Expense.objects.filter(event=event), many=True).data),
+                    lambda: FastJSONRenderer().render(expense_rows(Expense.objects.filter(event=event))),
+                    options["repeat"],
+                )
+                self._compare(
+                    "event detail",
+                    lambda: JSONRenderer().render(EventSerializer(Event.objects.get(pk=event.pk)).data),
+                    lambda: FastJSONRenderer().render(event_rows(Event.objects.filter(pk=event.pk))[0]),
+                    options["repeat"],
+                )
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, participant_count, expense_count):
+        """Create one event with participants and evenly split expenses."""
+        event = Event.objects.create(title="Benchmark", description="bench_serialization")
+        category = Category.objects.get_or_create(name="Benchmark")[0]
+        participants = Participant.objects.bulk_create(
+            Participant(event=event, name=f"P{i}", email=f"p{i}@example.com") for i in range(participant_count)
+        )
+        expenses = Expense.objects.bulk_create(
+            Expense(
+                event=event,
+                description=f"Expense {i}",
+                amount=Decimal(10 + i % 90),
+                payer=participants[i % participant_count],
+                category=category if i % 2 else None,
+            )
+            for i in range(expense_count)
+        )
+        through = Expense.split_between.through
+        through.objects.bulk_create(
+            through(expense_id=expense.pk, participant_id=participant.pk)
+            for i, expense in enumerate(expenses)
+            for participant in participants[: 1 + i % participant_count]
+        )
+        return event
+
+    def _compare(self, label, slow, fast, repeat):
+        """Time both callables, check their output is identical and print the CPU reduction."""
+        slow_body, slow_time = self._time(slow, repeat)
+        fast_body, fast_time = self._time(fast, repeat)
+        if slow_body != fast_body:
+            raise CommandError(f"{label}: fast path output differs from DRF serializer output")
+        self.stdout.write(
+            f"{label}: DRF {slow_time * 1000:.1f} ms, fast {fast_time * 1000:.1f} ms CPU "
+            f"({slow_time / fast_time:.1f}x, {len(fast_body)} bytes)"
+        )
+
+    def _time(self, func, repeat):
+        """Return (last result, best CPU time) over `repeat` runs."""
+        best = None
+        for _ in range(repeat):
+            start = time.process_time()
+            result = func()
+            elapsed = time.process_time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
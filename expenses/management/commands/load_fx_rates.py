@@ -0,0 +1,23 @@
+"""
+Load exchange rates from a local file into the FxRate table (no network access).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.fx import load_rates, parse_rates
+
+
+class Command(BaseCommand):
+    help = "Load exchange rates (per one FX_BASE_CURRENCY) from a CSV or JSON file and rebuild affected balances."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV with currency,rate rows, or JSON {\"base\": ..., \"rates\": {...}}.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Events rebuilt per transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], encoding="utf-8") as handle:
+                rates = parse_rates(handle.read(), options["path"])
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Cannot load {options['path']}: {exc}")
+        changed, rebuilt = load_rates(rates, options["batch_size"])
+        self.stdout.write(f"Loaded {len(rates)} rate(s), {changed} changed; rebuilt {rebuilt} event(s)")
@@ -0,0 +1,420 @@
+"""
+Load-test the API in-process: seed data, serve the WSGI app on a local threaded server (or drive the ASGI app
+directly from an asyncio client pool) and report throughput, latency percentiles and error rates per endpoint.
+Seeded data is deleted afterwards unless --keep-data is given.
+"""
+import asyncio
+import http.client
+import json
+import math
+import platform
+import random
+import secrets
+import threading
+import time
+from decimal import Decimal
+from http.cookies import SimpleCookie
+
+import django
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+from django.utils import timezone
+
+from expenses.deletion import purge_event
+from expenses.ledger import rebuild
+from expenses.models import Event, Expense, Participant
+
+DEFAULT_MIX = "event_list=20,event_detail=25,balance=25,settlement=20,expense_create=10"
+ENDPOINTS = ("event_list", "event_detail", "balance", "settlement", "expense_create", "login")
+LOOPBACK = "127.0.0.1"
+
+
+def parse_mix(value):
+    """Parse "name=weight,..." into {name: weight}, rejecting unknown endpoints."""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint {name!r} in --mix (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise CommandError("--mix needs at least one endpoint with a positive weight")
+    return mix
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Return stats for [(status, seconds), ...]; statuses >= 400 and failed requests (status 0) are errors."""
+    latencies = sorted(seconds * 1000 for _, seconds in samples)
+    statuses = {}
+    for status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for status, _ in samples if not 200 <= status < 400)
+    stats = {"requests": len(samples), "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+             "errors": errors, "error_rate": round(errors / len(samples), 4) if samples else 0.0, "status": statuses}
+    if latencies:
+        stats.update({
+            f"p{pct}_ms": round(percentile(latencies, pct), 2) for pct in (50, 95, 99)
+        }, mean_ms=round(sum(latencies) / len(latencies), 2), max_ms=round(latencies[-1], 2))
+    return stats
+
+
+def client_address(index):
+    """Distinct loopback address per client, so per-IP throttles (keyed on REMOTE_ADDR) see separate clients.
+
+    Only Linux routes all of 127.0.0.0/8 by default; elsewhere binding fails and the WSGI run falls back to LOOPBACK.
+    """
+    index += 1
+    return f"127.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log every request."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Session:
+    """Cookie jar plus CSRF header of one virtual client."""
+
+    def __init__(self, address):
+        self.cookies = SimpleCookie()
+        self.address = address
+
+    def headers(self, body=None):
+        headers = {"Accept": "application/json"}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{key}={morsel.value}" for key, morsel in self.cookies.items())
+        if "csrftoken" in self.cookies:
+            headers["X-CSRFToken"] = self.cookies["csrftoken"].value
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        return headers
+
+    def absorb(self, set_cookie_headers):
+        for header in set_cookie_headers:
+            self.cookies.load(header)
+
+
+class Plan:
+    """Seeded data and the request builder shared by all clients."""
+
+    def __init__(self, username, password, events):
+        self.username = username
+        self.password = password
+        self.events = events  # {event_id: [participant ids]}
+        self.event_ids = list(events)
+
+    def request(self, name, rnd):
+        """Return (method, path, body) for one request of endpoint `name`."""
+        event_id = rnd.choice(self.event_ids)
+        if name == "event_list":
+            return "GET", reverse("event-list"), None
+        if name == "event_detail":
+            return "GET", reverse("event-detail", args=[event_id]), None
+        if name in ("balance", "settlement"):
+            return "GET", reverse(f"event-{name}", args=[event_id]), None
+        if name == "login":
+            return "POST", reverse("api_login"), {"username": self.username, "password": self.password}
+        participants = self.events[event_id]
+        return "POST", reverse("expense-list"), {
+            "description": "Load test", "amount": f"{rnd.randint(100, 20000) / 100:.2f}", "event": event_id,
+            "payer": rnd.choice(participants), "split_between_ids": rnd.sample(participants, k=min(3, len(participants))),
+        }
+
+
+class Command(BaseCommand):
+    help = "Load-test the API in-process and report throughput and p50/p95/p99 latency per endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi",
+                            help="wsgi: threaded HTTP server + thread client pool; asgi: ASGI app + asyncio tasks.")
+        parser.add_argument("--clients", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run (unless --requests).")
+        parser.add_argument("--requests", type=int, help="Stop after this many requests in total.")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted endpoints (default {DEFAULT_MIX}; also login).")
+        parser.add_argument("--events", type=int, default=20)
+        parser.add_argument("--participants", type=int, default=8)
+        parser.add_argument("--expenses", type=int, default=200, help="Expenses per seeded event.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for request selection.")
+        parser.add_argument("--output", help="Write results as JSON to this file.")
+        parser.add_argument("--baseline", help="Compare p95 latency per endpoint with an earlier --output file.")
+        parser.add_argument("--max-regression", type=float,
+                            help="Fail when any endpoint's p95 is more than this many percent above --baseline.")
+        parser.add_argument("--keep-data", action="store_true", help="Do not delete the seeded events and user.")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        if options["clients"] < 1:
+            raise CommandError("--clients must be at least 1")
+        plan = self._seed(options["events"], options["participants"], options["expenses"])
+        try:
+            started_at = timezone.now()
+            if options["server"] == "wsgi":
+                samples, elapsed = self._run_wsgi(plan, mix, options)
+            else:
+                samples, elapsed = asyncio.run(self._run_asgi(plan, mix, options))
+        finally:
+            if not options["keep_data"]:
+                self._cleanup(plan)
+
+        results = {
+            "started_at": started_at.isoformat(),
+            "server": options["server"],
+            "clients": options["clients"],
+            "duration": round(elapsed, 3),
+            "mix": mix,
+            "seed": {key: options[key] for key in ("events", "participants", "expenses", "seed")},
+            "versions": {"python": platform.python_version(), "django": django.get_version()},
+            "total": summarize([sample[1:] for sample in samples], elapsed),
+            "endpoints": {
+                name: summarize([sample[1:] for sample in samples if sample[0] == name], elapsed)
+                for name in mix if mix[name]
+            },
+        }
+        self._report(results)
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                json.dump(results, handle, indent=2)
+        if options["baseline"]:
+            self._compare(results, options["baseline"], options["max_regression"])
+
+    def _seed(self, event_count, participant_count, expense_count):
+        """Create a login user and events with participants and split expenses."""
+        username = f"loadtest-{secrets.token_hex(4)}"
+        password = secrets.token_urlsafe(16)
+        User.objects.create_user(username, password=password)
+        events = {}
+        through = Expense.split_between.through
+        for index in range(event_count):
+            event = Event.objects.create(title=f"Load test {index}", description="loadtest")
+            participants = Participant.objects.bulk_create(
+                Participant(event=event, name=f"P{i}", email=f"p{i}@example.com") for i in range(participant_count)
+            )
+            expenses = Expense.objects.bulk_create(
+                Expense(event=event, description=f"Expense {i}", amount=Decimal(10 + i % 90),
+                        payer=participants[i % participant_count])
+                for i in range(expense_count)
+            )
+            through.objects.bulk_create(
+                through(expense_id=expense.pk, participant_id=participant.pk)
+                for i, expense in enumerate(expenses)
+                for participant in participants[: 1 + i % participant_count]
+            )
+            events[event.pk] = [participant.pk for participant in participants]
+        rebuild(list(events))  # bulk_create obchází signály ledgeru
+        self.stdout.write(f"Seeded {event_count} events x {participant_count} participants x {expense_count} expenses")
+        return Plan(username, password, events)
+
+    def _cleanup(self, plan):
+        for event_id in plan.event_ids:
+            purge_event(event_id)
+        User.objects.filter(username=plan.username).delete()
+
+    def _schedule(self, mix, options):
+        """Return a function giving the next endpoint name for a client, or None when the run is over."""
+        names, weights = list(mix), list(mix.values())
+        deadline = time.perf_counter() + options["duration"]
+        budget = options["requests"]
+        lock = threading.Lock()
+        issued = [0]
+
+        def next_name(rnd):
+            if budget is not None:
+                with lock:
+                    if issued[0] >= budget:
+                        return None
+                    issued[0] += 1
+            elif time.perf_counter() >= deadline:
+                return None
+            return rnd.choices(names, weights)[0]
+        return next_name
+
+    # WSGI: skutečný HTTP server ve vlákně, klienti jsou vlákna s http.client
+    def _run_wsgi(self, plan, mix, options):
+        server = ThreadedWSGIServer((LOOPBACK, 0), QuietRequestHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        shared_address = threading.Event()
+
+        def connect(session):
+            # Klient se připojuje ze své vlastní adresy 127.x.y.z (celé 127.0.0.0/8 je loopback jen na Linuxu)
+            connection = http.client.HTTPConnection(LOOPBACK, port, timeout=60, source_address=(session.address, 0))
+            try:
+                connection.connect()
+            except OSError:
+                connection.close()
+                if session.address == LOOPBACK:
+                    raise
+                shared_address.set()
+                session.address = LOOPBACK
+                return connect(session)
+            return connection
+
+        def call(session, method, path, body=None):
+            connection = connect(session)
+            try:
+                payload = json.dumps(body).encode() if body is not None else None
+                headers = dict(session.headers(body), Connection="close")
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                session.absorb(response.headers.get_all("Set-Cookie") or [])
+                return response.status
+            finally:
+                connection.close()
+
+        samples = []
+        failures = []
+        next_name = self._schedule(mix, options)
+
+        def client(index):
+            rnd = random.Random(options["seed"] * 10007 + index)
+            try:
+                session = self._login(call, plan, index)
+            except CommandError as exc:
+                failures.append(exc)
+                return
+            local = []
+            while (name := next_name(rnd)) is not None:
+                method, path, body = plan.request(name, rnd)
+                start = time.perf_counter()
+                try:
+                    status = call(session, method, path, body)
+                except OSError:
+                    status = 0
+                local.append((name, status, time.perf_counter() - start))
+            samples.extend(local)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(index,)) for index in range(options["clients"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        server.server_close()
+        if shared_address.is_set():
+            self.stderr.write(
+                f"Per-client loopback addresses are not available here; clients connected from {LOOPBACK}, "
+                "so per-IP throttles saw them as one client."
+            )
+        if failures:
+            raise failures[0]
+        return samples, elapsed
+
+    def _login(self, call, plan, index):
+        """Log a client in and fetch its CSRF cookie (login rotates the token)."""
+        session = Session(client_address(index))
+        try:
+            status = call(session, "POST", reverse("api_login"), {"username": plan.username, "password": plan.password})
+            call(session, "GET", reverse("api_csrf"))
+        except OSError as exc:
+            raise CommandError(f"Load test client {index} could not connect: {exc}") from exc
+        if status != 200:
+            raise CommandError(f"Load test client {index} could not log in (HTTP {status})")
+        return session
+
+    # ASGI: aplikace se volá přímo (bez sítě), klienti jsou asyncio úlohy
+    async def _run_asgi(self, plan, mix, options):
+        application = get_asgi_application()
+
+        async def call(session, method, path, body=None):
+            payload = json.dumps(body).encode() if body is not None else b""
+            path, _, query = path.partition("?")
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+                "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+                "root_path": "", "client": (session.address, 0), "server": ("127.0.0.1", 80),
+                "headers": [(b"host", b"127.0.0.1")] + [
+                    (key.lower().encode(), value.encode()) for key, value in session.headers(body).items()
+                ] + ([(b"content-length", str(len(payload)).encode())] if payload else []),
+            }
+            request_sent = False
+            disconnect = asyncio.Event()
+            result = {}
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {"type": "http.request", "body": payload, "more_body": False}
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    result["status"] = message["status"]
+                    session.absorb(
+                        value.decode("latin-1") for key, value in message.get("headers", []) if key.lower() == b"set-cookie"
+                    )
+                elif message["type"] == "http.response.body" and not message.get("more_body"):
+                    disconnect.set()
+
+            await application(scope, receive, send)
+            disconnect.set()
+            return result.get("status", 0)
+
+        next_name = self._schedule(mix, options)
+
+        async def client(index):
+            rnd = random.Random(options["seed"] * 10007 + index)
+            session = Session(client_address(index))
+            login = {"username": plan.username, "password": plan.password}
+            if await call(session, "POST", reverse("api_login"), login) != 200:
+                raise CommandError(f"Load test client {index} could not log in")
+            await call(session, "GET", reverse("api_csrf"))
+            local = []
+            while (name := next_name(rnd)) is not None:
+                method, path, body = plan.request(name, rnd)
+                start = time.perf_counter()
+                status = await call(session, method, path, body)
+                local.append((name, status, time.perf_counter() - start))
+            return local
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client(index) for index in range(options["clients"])))
+        elapsed = time.perf_counter() - start
+        return [sample for local in results for sample in local], elapsed
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{results['server']}: {results['clients']} clients, {results['duration']:.1f} s, "
+            f"{results['total']['requests']} requests ({results['total']['rps']} req/s), "
+            f"error rate {results['total']['error_rate']:.2%}"
+        )
+        self.stdout.write(f"{'endpoint':<16}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for name, stats in results["endpoints"].items():
+            self.stdout.write(
+                f"{name:<16}{stats['requests']:>9}{stats['rps']:>9}{stats.get('p50_ms', 0):>9}"
+                f"{stats.get('p95_ms', 0):>9}{stats.get('p99_ms', 0):>9}{stats['errors']:>8}"
+            )
+
+    def _compare(self, results, baseline_path, max_regression):
+        """Print the p95 change against a baseline run and fail above max_regression percent."""
+        with open(baseline_path) as handle:
+            baseline = json.load(handle)
+        regressions = []
+        for name, stats in results["endpoints"].items():
+            old = baseline.get("endpoints", {}).get(name, {}).get("p95_ms")
+            new = stats.get("p95_ms")
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            self.stdout.write(f"{name}: p95 {old} -> {new} ms ({change:+.1f}%)")
+            if max_regression is not None and change > max_regression:
+                regressions.append(f"{name} ({change:+.1f}%)")
+        if regressions:
+            raise CommandError(f"p95 regressed by more than {max_regression}%: {', '.join(regressions)}")
@@ -0,0 +1,17 @@
+"""
+Delete expired idempotency keys in bulk (run periodically, e.g. from cron).
+"""
+from django.core.management.base import BaseCommand
+
+from expenses.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than IDEMPOTENCY_KEY_TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(options["chunk_size"])
+        self.stdout.write(f"Deleted {deleted} expired idempotency key(s)")
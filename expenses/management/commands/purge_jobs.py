@@ -0,0 +1,18 @@
+"""
+Delete finished background jobs in bulk (run periodically, e.g. from cron).
+"""
+from django.core.management.base import BaseCommand
+
+from expenses.jobs import purge_finished
+
+
+class Command(BaseCommand):
+    help = "Delete succeeded and failed jobs older than JOB_RETENTION_DAYS."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Override JOB_RETENTION_DAYS.")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_finished(options["days"], options["chunk_size"])
+        self.stdout.write(f"Deleted {deleted} finished job(s)")
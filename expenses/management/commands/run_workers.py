@@ -0,0 +1,65 @@
+"""
+Run background job workers (see expenses.jobs) in a pool of processes, each with a pool of threads.
+"""
+import multiprocessing
+import signal
+import threading
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from expenses import jobs
+
+
+def run_threads(threads, once, poll_interval):
+    """Run `threads` worker loops in this process until SIGTERM/SIGINT (or an empty queue with once=True)."""
+    django.setup()  # no-op after fork; needed where multiprocessing spawns fresh interpreters
+    stop = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stop.set())
+    workers = [
+        threading.Thread(target=jobs.work, kwargs={"stop": stop, "once": once, "poll_interval": poll_interval})
+        for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        while worker.is_alive():
+            worker.join(timeout=0.5)
+
+
+class Command(BaseCommand):
+    help = "Execute queued background jobs (no external broker needed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=settings.JOB_WORKER_PROCESSES)
+        parser.add_argument("--threads", type=int, default=settings.JOB_WORKER_THREADS)
+        parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL)
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        threads = max(1, options["threads"])
+        self.stdout.write(f"Starting {processes} worker process(es) x {threads} thread(s)")
+        if processes == 1:
+            run_threads(threads, options["once"], options["poll_interval"])
+            return
+        # Podprocesy nesmí sdílet databázová spojení rodiče
+        connections.close_all()
+        pool = [
+            multiprocessing.Process(target=run_threads, args=(threads, options["once"], options["poll_interval"]))
+            for _ in range(processes)
+        ]
+        for process in pool:
+            process.start()
+        try:
+            for process in pool:
+                process.join()
+        except KeyboardInterrupt:
+            for process in pool:
+                process.terminate()
+            for process in pool:
+                process.join()
@@ -0,0 +1,122 @@
+"""
+Profile the cold start of a worker: import time per module (python -X importtime) and the time until a fresh
+process has answered its first request through config.wsgi or config.asgi.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Spouští se v čerstvém interpretu: import aplikace a jeden požadavek, výsledek jako JSON na stdout
+WORKER_SCRIPT = r"""
+import asyncio, io, json, os, sys, time
+start = time.perf_counter()
+os.environ["DJANGO_SETTINGS_MODULE"] = sys.argv[1]
+app, path = sys.argv[2], sys.argv[3]
+if app == "wsgi":
+    from config.wsgi import application
+    imported = time.perf_counter()
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80", "HTTP_HOST": "localhost", "REMOTE_ADDR": "127.0.0.1", "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http", "SERVER_PROTOCOL": "HTTP/1.1",
+    }
+    statuses = []
+    b"".join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    status = int(statuses[0].split()[0])
+else:
+    from config.asgi import application
+    imported = time.perf_counter()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+    }
+    messages = []
+    async def request():
+        done = asyncio.Event()
+        async def receive():
+            if not messages:
+                messages.append(None)
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+        async def send(message):
+            messages.append(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                done.set()
+        await application(scope, receive, send)
+    asyncio.run(request())
+    status = next(m["status"] for m in messages if m and m["type"] == "http.response.start")
+print(json.dumps({"import": imported - start, "first_request": time.perf_counter() - start, "status": status}))
+"""
+
+
+def measure_startup(app="wsgi", settings_module=None, path="/api/csrf/"):
+    """Start a fresh interpreter, import config.<app> and serve one GET `path`.
+
+    Returns {"import", "first_request", "status", "process", "modules"}; times are seconds, "modules" is a list
+    of (module, self_seconds, cumulative_seconds) from -X importtime.
+    """
+    settings_module = settings_module or os.environ.get("DJANGO_SETTINGS_MODULE") or settings.SETTINGS_MODULE
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", WORKER_SCRIPT, settings_module, app, path],
+        cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+    )
+    process = time.perf_counter() - start
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise CommandError(f"Worker failed to start:\n" + "\n".join(errors[-20:]))
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        own, cumulative, module = line[len("import time:"):].split("|")
+        modules.append((module.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    result.update(process=process, modules=modules)
+    return result
+
+
+class Command(BaseCommand):
+    help = "Report per-module import time and time to first request of a fresh worker process."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--app", choices=["wsgi", "asgi"], default="wsgi")
+        parser.add_argument("--settings-module", help="Settings to profile (default: the current ones), "
+                                                      "e.g. config.settings_api.")
+        parser.add_argument("--path", default="/api/csrf/", help="Path of the first request.")
+        parser.add_argument("--limit", type=int, default=25, help="Number of modules to list.")
+        parser.add_argument("--sort", choices=["cumulative", "self"], default="cumulative")
+        parser.add_argument("--budget", type=float, help="Fail when time to first request exceeds this many seconds.")
+        parser.add_argument("--max-modules", type=int, help="Fail when more modules than this are imported.")
+        parser.add_argument("--json", action="store_true", help="Print the full result as JSON.")
+
+    def handle(self, *args, **options):
+        result = measure_startup(options["app"], options["settings_module"], options["path"])
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            column = 2 if options["sort"] == "cumulative" else 1
+            self.stdout.write(f"{'module':<60}{'self ms':>10}{'cumul. ms':>11}")
+            for module, own, cumulative in sorted(result["modules"], key=lambda row: -row[column])[: options["limit"]]:
+                self.stdout.write(f"{module:<60}{own * 1000:>10.1f}{cumulative * 1000:>11.1f}")
+            self.stdout.write(
+                f"{len(result['modules'])} modules; import of config.{options['app']} {result['import'] * 1000:.0f} ms, "
+                f"first request (HTTP {result['status']}) {result['first_request'] * 1000:.0f} ms, "
+                f"whole process {result['process'] * 1000:.0f} ms"
+            )
+        if options["budget"] is not None and result["first_request"] > options["budget"]:
+            raise CommandError(
+                f"Time to first request {result['first_request']:.2f} s exceeds the budget of {options['budget']:.2f} s"
+            )
+        if options["max_modules"] is not None and len(result["modules"]) > options["max_modules"]:
+            raise CommandError(
+                f"{len(result['modules'])} modules imported before the first request; the budget is "
+                f"{options['max_modules']}"
+            )
@@ -0,0 +1,301 @@
+"""
+Operational metrics for ExpenseApp in the Prometheus text format (served at /metrics).
+Recording is lock-free: every thread updates its own shard and shards are only merged when a snapshot is taken.
+With several worker processes (gunicorn) set ``METRICS_DIR``: each process periodically writes its snapshot to
+``<METRICS_DIR>/<pid>-<start>.json`` and a scrape sums the files of all processes. Files of workers that exited
+(cleanly at exit, or found dead by a scrape) are folded into ``dead.json``, so counters stay monotonic while the
+number of files stays bounded by the live workers.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (0, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# name: (typ, popis, hranice bucketů histogramu)
+METRICS = {
+    "expenses_http_request_duration_seconds": (
+        "histogram", "Request latency by DRF view and action.", LATENCY_BUCKETS,
+    ),
+    "expenses_http_requests_total": ("counter", "Requests by DRF view, action, method and status.", None),
+    "expenses_db_queries_per_request": ("histogram", "Database queries executed per request.", QUERY_BUCKETS),
+    "expenses_cache_requests_total": ("counter", "Cache lookups by cache and result (hit/miss).", None),
+    "expenses_event_size": (
+        "histogram", "Participants per event, observed when its balances are read.", SIZE_BUCKETS,
+    ),
+}
+
+
+class _ShardOwner:
+    """Lives in a thread's local storage; when the thread ends it is collected and its shard retired."""
+
+
+class Registry:
+    """Counters and histograms recorded into per-thread shards.
+
+    A finished thread's shard is merged into a base snapshot and dropped, so the number of shards follows the
+    live threads, not every thread that ever recorded (runserver and ThreadedWSGIServer start one per request).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._base = {}
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._file_pid = None
+        self._file_name = None
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            self._local.owner = owner = _ShardOwner()
+            weakref.finalize(owner, self._retire_shard, shard)
+            with self._shards_lock:  # jen jednou za život vlákna
+                self._shards.append(shard)
+        return shard
+
+    def _retire_shard(self, shard):
+        with self._shards_lock:
+            for key, value in shard.items():
+                merge(self._base, key, value)
+            self._shards = [other for other in self._shards if other is not shard]
+
+    def inc(self, name, value=1, **labels):
+        """Increase a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record one histogram observation."""
+        key = (name, tuple(sorted(labels.items())))
+        shard = self._shard()
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = [[0] * len(METRICS[name][2]), 0.0, 0]
+        for index, bound in enumerate(METRICS[name][2]):
+            if value <= bound:
+                series[0][index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def snapshot(self):
+        """Merge all shards into {(name, labels): value or [bucket counts, sum, count]} (non-cumulative buckets)."""
+        merged = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+            for key, value in self._base.items():
+                merge(merged, key, value)
+        for shard in shards:
+            for key, value in list(shard.items()):
+                merge(merged, key, value)
+        return merged
+
+    def reset(self):
+        """Forget everything recorded in this process."""
+        with self._shards_lock:
+            self._base.clear()
+            for shard in self._shards:
+                shard.clear()
+
+    def _path(self, directory):
+        if self._file_pid != os.getpid():  # nový proces (i po forku), recyklované pid nepřepíše cizí soubor
+            self._file_pid = os.getpid()
+            self._file_name = f"{self._file_pid}-{time.time_ns()}.json"
+        return os.path.join(directory, self._file_name)
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR (atomically), if configured."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        _write(self._path(directory), self.snapshot())
+        self._last_flush = time.monotonic()
+
+    def retire(self):
+        """Fold this process's snapshot into the METRICS_DIR accumulator and remove its file (clean exit)."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = self._path(directory)
+        with _locked(directory):
+            accumulated = _read(os.path.join(directory, ACCUMULATOR)) or {}
+            for key, value in self.snapshot().items():
+                merge(accumulated, key, value)
+            _write(os.path.join(directory, ACCUMULATOR), accumulated)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def maybe_flush(self):
+        """Flush when METRICS_FLUSH_INTERVAL elapsed; concurrent callers skip instead of waiting."""
+        if not settings.METRICS_DIR or time.monotonic() - self._last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self.flush()
+            finally:
+                self._flush_lock.release()
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+
+@atexit.register
+def _retire_at_exit():
+    try:
+        registry.retire()
+    except Exception:  # settings nemusí být nakonfigurované (např. při importu mimo Django)
+        pass
+
+
+def merge(merged, key, value):
+    """Add one counter value or histogram series into `merged`."""
+    if isinstance(value, list):
+        current = merged.get(key)
+        if current is None:
+            merged[key] = [list(value[0]), value[1], value[2]]
+        else:
+            current[0] = [a + b for a, b in zip(current[0], value[0])]
+            current[1] += value[1]
+            current[2] += value[2]
+    else:
+        merged[key] = merged.get(key, 0) + value
+
+
+ACCUMULATOR = "dead.json"
+
+
+def _read(path):
+    """Return the snapshot stored in `path`, or None when it is missing or being rewritten."""
+    try:
+        with open(path) as handle:
+            rows = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    snapshot = {}
+    for name, labels, value in rows:
+        merge(snapshot, (name, tuple(tuple(pair) for pair in labels)), value)
+    return snapshot
+
+
+def _write(path, snapshot):
+    with open(f"{path}.tmp", "w") as handle:
+        json.dump([[name, labels, value] for (name, labels), value in snapshot.items()], handle)
+    os.replace(f"{path}.tmp", path)
+
+
+@contextmanager
+def _locked(directory):
+    """Serialize folding into the accumulator (and scrapes reading it) across processes."""
+    import fcntl  # jen Unix, stejně jako gunicorn
+
+    with open(os.path.join(directory, ".lock"), "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _file_pid(filename):
+    head = filename.split(".")[0].split("-")[0]
+    return int(head) if head.isdigit() else None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _fold_dead(directory):
+    """Move the files of processes that no longer run into the accumulator (call under _locked)."""
+    stale = [
+        filename for filename in os.listdir(directory)
+        if (pid := _file_pid(filename)) is not None and pid != os.getpid() and not _alive(pid)
+    ]
+    if not stale:
+        return
+    accumulated = _read(os.path.join(directory, ACCUMULATOR)) or {}
+    for filename in stale:
+        if filename.endswith(".json"):
+            for key, value in (_read(os.path.join(directory, filename)) or {}).items():
+                merge(accumulated, key, value)
+    _write(os.path.join(directory, ACCUMULATOR), accumulated)
+    for filename in stale:
+        os.remove(os.path.join(directory, filename))
+
+
+def collect():
+    """Return the snapshot of all processes: this one from memory, others from their METRICS_DIR files."""
+    directory = settings.METRICS_DIR
+    if not directory:
+        return registry.snapshot()
+    registry.flush()
+    merged = {}
+    with _locked(directory):
+        _fold_dead(directory)
+        for filename in os.listdir(directory):
+            if not filename.endswith(".json"):
+                continue
+            # soubor, který jiný proces právě přepisuje, se přeskočí
+            for key, value in (_read(os.path.join(directory, filename)) or {}).items():
+                merge(merged, key, value)
+    return merged
+
+
+def _labels(pairs, extra=()):
+    items = list(pairs) + list(extra)
+    if not items:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for key, value in items
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot=None):
+    """Render a snapshot in the Prometheus text exposition format (version 0.0.4)."""
+    snapshot = collect() if snapshot is None else snapshot
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in snapshot.items() if metric == name)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind == "counter":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket in zip(buckets, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels(labels, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
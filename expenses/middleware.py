@@ -0,0 +1,155 @@
+"""
+Middleware for ExpenseApp.
+Negotiates brotli/gzip compression of API responses above a configurable size threshold, records
+per-view request metrics (expenses.metrics) and scopes exchange-rate memoization to a request (expenses.fx).
+"""
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+from . import fx, metrics
+
+try:
+    import brotli
+except ImportError:  # brotli je volitelná závislost, bez ní používáme jen gzip
+    brotli = None
+
+
+def parse_accept_encoding(header):
+    """Return {coding: q} from an Accept-Encoding header, ignoring malformed q-values."""
+    codings = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress API responses with brotli or gzip, whichever the client prefers and we support.
+
+    Only content types listed in ``COMPRESSION_CONTENT_TYPES`` are compressed (HTML pages carrying CSRF tokens
+    are left alone because of BREACH), and only bodies of at least ``COMPRESSION_MIN_SIZE`` bytes. Streaming
+    responses are gzipped chunk by chunk.
+    """
+
+    max_random_bytes = 100
+    brotli_quality = 5
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding") or (response.streaming and response.is_async):
+            return response
+        content_type = response.get("Content-Type", "").split(";")[0].strip()
+        if content_type not in settings.COMPRESSION_CONTENT_TYPES:
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        coding = self.choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""), response.streaming)
+        if coding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(
+                response.streaming_content,
+                max_random_bytes=self.max_random_bytes,
+            )
+            del response.headers["Content-Length"]
+        else:
+            if coding == "br":
+                compressed = brotli.compress(response.content, quality=self.brotli_quality)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = coding
+        return response
+
+    def choose_encoding(self, accept_encoding, streaming):
+        """Pick "br" or "gzip" by client q-values (brotli wins ties), or None when neither is acceptable."""
+        codings = parse_accept_encoding(accept_encoding)
+        wildcard = codings.get("*", 0.0)
+        candidates = ["gzip"] if streaming or brotli is None else ["br", "gzip"]
+        best, best_q = None, 0.0
+        for coding in candidates:
+            q = codings.get(coding, wildcard)
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+
+def view_labels(request, view_func):
+    """Return (view, action) metric labels: the DRF view class or function name and the viewset action."""
+    cls = getattr(view_func, "cls", None)
+    view = cls.__name__ if cls is not None else getattr(view_func, "__name__", type(view_func).__name__)
+    actions = getattr(view_func, "actions", None)
+    action = actions.get(request.method.lower(), "") if actions else request.method.lower()
+    return view, action
+
+
+class MetricsMiddleware:
+    """Record latency, status and DB query count of every request, labelled by view and action.
+
+    Should be first in MIDDLEWARE so the measured time covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view, action = getattr(request, "_metrics_labels", ("unresolved", ""))
+        metrics.observe("expenses_http_request_duration_seconds", elapsed, view=view, action=action)
+        metrics.observe("expenses_db_queries_per_request", queries[0], view=view, action=action)
+        metrics.inc(
+            "expenses_http_requests_total", view=view, action=action, method=request.method,
+            status=response.status_code,
+        )
+        metrics.registry.maybe_flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_labels = view_labels(request, view_func)
+
+
+class FxRateMiddleware:
+    """Memoize exchange rates for the duration of one request, so every conversion in it shares one lookup."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with fx.memoize():
+            return self.get_response(request)
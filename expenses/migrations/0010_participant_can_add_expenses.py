@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0009_event_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='can_add_expenses',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-19 03:51
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+MICROS = 10 ** 6
+
+
+def effect(payer_id, amount, split_ids, members):
+    """Frozen copy of expenses.ledger.effect at the time of this migration: {participant_id: micros}."""
+    split_ids = sorted(set(split_ids) or members)
+    amount = int((Decimal(str(amount)) * MICROS).to_integral_value())
+    deltas = {}
+    if split_ids:
+        share, remainder = divmod(amount, len(split_ids))
+        for index, participant_id in enumerate(split_ids):
+            deltas[participant_id] = -share - (index < remainder)
+    deltas[payer_id] = deltas.get(payer_id, 0) + amount
+    return deltas
+
+
+def fill_ledger(apps, schema_editor):
+    Participant = apps.get_model('expenses', 'Participant')
+    Expense = apps.get_model('expenses', 'Expense')
+    members, balances, splits = {}, {}, {}
+    for pk, event_id in Participant.objects.order_by('pk').values_list('pk', 'event_id'):
+        members.setdefault(event_id, []).append(pk)
+        balances[pk] = 0
+    for expense_id, participant_id in Expense.split_between.through.objects.values_list('expense_id', 'participant_id'):
+        splits.setdefault(expense_id, []).append(participant_id)
+    for pk, event_id, payer_id, amount in Expense.objects.values_list('pk', 'event_id', 'payer_id', 'amount'):
+        for participant_id, micros in effect(payer_id, amount, splits.get(pk, ()), members[event_id]).items():
+            balances[participant_id] += micros
+    Participant.objects.bulk_update(
+        [Participant(pk=pk, balance_micros=micros) for pk, micros in balances.items() if micros],
+        ['balance_micros'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0010_participant_can_add_expenses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='balance_micros',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_ledger, migrations.RunPython.noop),
+    ]
@@ -2,9 +2,12 @@
 Models for the ExpenseApp application.
 Defines entities for categories, events, participants, expenses, and settlements.
 """
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 import uuid
-from decimal import Decimal, ROUND_HALF_UP
 
 class Category(models.Model):
     """Represents an expense category (e.g., Food, Travel)."""
@@ -15,11 +18,24 @@ class Category(models.Model):
         """Return human-readable string representation of the category."""
         return self.name
 
+def default_currency():
+    """Return the currency new events get (settings.DEFAULT_CURRENCY)."""
+    return settings.DEFAULT_CURRENCY
+
+
 class Event(models.Model):
     """Represents an event that groups participants and expenses."""
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
+    # Měna zůstatků a vyrovnání; výdaje v jiné měně se převádějí (expenses.fx)
+    currency = models.CharField(max_length=3, default=default_currency)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Nastaveno při mazání: událost je okamžitě skrytá, data se mažou po částech (expenses.deletion)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # Uzavřená událost je zmrazená: čte se z EventSnapshot a zápisy jsou odmítnuty (expenses.snapshots)
+    closed_at = models.DateTimeField(null=True, blank=True)
+    # Archivovaná událost nemá řádky v horkých tabulkách; čte se ze snapshotu, zápis ji obnoví (expenses.archive)
+    archived_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         """Return human-readable string representation of the event."""
@@ -27,76 +43,15 @@ class Event(models.Model):
     
     def get_balance(self):
         """Return a dict mapping participant_id to balance (positive = to receive, negative = owes)."""
-        balances = {p.id: 0 for p in self.participants.all()}
-
-        for expense in self.expenses.all():
-            if expense.payer is None:
-                continue
-
-            participants_to_split = expense.split_between.all()
-            if not participants_to_split.exists():
-                # Pokud není nikdo ve split_between, rozdělíme výdaj mezi všechny účastníky
-                participants_to_split = self.participants.all()
-
-            split_count = participants_to_split.count()
-            share = expense.amount / split_count
-
-            for participant in participants_to_split:
-                balances[participant.id] -= share
+        from .balances import balance_vector
+        return dict(balance_vector(self.pk)["balances"])
 
-            balances[expense.payer.id] += expense.amount
-
-        return balances
-    
     def get_settlement(self):
         """Return a list of settlement transactions to balance debts among participants."""
-        balances = self.get_balance()
-        creditors = []
-        debtors = []
-
-        # Načteme všechny účastníky do slovníku pro rychlý lookup
-        participants = {p.id: p for p in self.participants.all()}
-
-        for participant_id, amount in balances.items():
-            amt = Decimal(amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            participant = participants.get(participant_id)
-            if not participant:
-                continue  # pokud účastník není, přeskočíme
-
-            if amt > 0:
-                creditors.append([participant, amt])
-            elif amt < 0:
-                debtors.append([participant, -amt])
-
-        settlements = []
-
-        i, j = 0, 0
-        while i < len(debtors) and j < len(creditors):
-            debtor, debt_amt = debtors[i]
-            creditor, cred_amt = creditors[j]
-            payment = min(debt_amt, cred_amt)
-            if debtor is not None and creditor is not None:
-                settlements.append({
-                    "from": debtor.name,
-                    "to": creditor.name,
-                    "amount": float(payment)
-                })
-
-            debt_amt -= payment
-            cred_amt -= payment
-
-            if debt_amt == 0:
-                i += 1
-            else:
-                debtors[i][1] = debt_amt
+        from .balances import balance_vector, settle
+        vector = balance_vector(self.pk)
+        return settle(vector["balances"], vector["names"])
 
-            if cred_amt == 0:
-                j += 1
-            else:
-                creditors[j][1] = cred_amt
-
-        return settlements
-        
 
 class Participant(models.Model):
     """Represents a participant of an event."""
@@ -104,20 +59,93 @@ class Participant(models.Model):
     name = models.CharField(max_length=120)
     email = models.EmailField(blank=True)
     token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    # Sdílený odkaz /api/p/<token>/ je jen pro čtení, pokud není povoleno přidávat výdaje (expenses.tokens)
+    can_add_expenses = models.BooleanField(default=False)
+    # Zůstatek v milióntinách měny, mění se jen přičítáním F() delt (expenses.ledger)
+    balance_micros = models.BigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         """Return human-readable string representation of the participant."""
         return f"{self.name} ({self.event.title})"
 
+    def get_statement(self, after=None, limit=None):
+        """Yield this participant's expenses in chronological order with paid/share amounts and running balance.
+
+        ``after`` is an optional ``(created_at, id, balance_micros)`` cursor; rows up to it are skipped and its
+        balance is carried into the running total. A page of ``limit`` rows costs one query wherever it starts, plus
+        one rate lookup per foreign currency it meets. Amounts are in the event's currency and split like the ledger
+        (integer micro-units, remainder to the lowest participant ids), so the last balance equals the stored one.
+        """
+        from .fx import converter
+        from .ledger import from_micros, share, to_micros
+
+        def count(queryset, group):
+            return Coalesce(Subquery(queryset.values(group).annotate(n=Count('*')).values('n')), 0)
+
+        split = Expense.split_between.through.objects.filter(expense_id=OuterRef('pk'))
+        members = Participant.objects.filter(event_id=self.event_id)
+        expenses = Expense.objects.filter(event_id=self.event_id).annotate(
+            split_count=count(split, 'expense_id'),
+            split_rank=count(split.filter(participant_id__lt=self.pk), 'expense_id'),
+            in_split=Exists(split.filter(participant_id=self.pk)),
+        ).filter(Q(payer_id=self.pk) | Q(in_split=True) | Q(split_count=0)).annotate(
+            # Výdaj bez split_between se dělí mezi všechny účastníky události
+            event_size=count(members, 'event_id'),
+            event_rank=count(members.filter(pk__lt=self.pk), 'event_id'),
+        )
+        balance = 0
+        if after is not None:
+            created_at, pk, balance = after
+            expenses = expenses.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+        rows = expenses.order_by('created_at', 'pk').values_list(
+            'id', 'description', 'amount', 'currency', 'created_at', 'payer_id', 'split_count', 'split_rank',
+            'in_split', 'event_size', 'event_rank', 'event__currency',
+        )
+        rows = rows[:limit] if limit is not None else rows.iterator(chunk_size=2000)
+
+        converters = {}
+        for pk, description, amount, currency, created_at, payer_id, split_count, split_rank, in_split, \
+                event_size, event_rank, target in rows:
+            currency = currency or target
+            converted = amount
+            if currency != target:
+                if currency not in converters:
+                    converters[currency] = converter([(currency, target)])
+                converted = converters[currency](amount, currency, target)
+            micros = to_micros(converted)
+            paid = micros if payer_id == self.pk else 0
+            if in_split:
+                owed = share(micros, split_count, split_rank)
+            elif split_count == 0:
+                owed = share(micros, event_size, event_rank)
+            else:
+                owed = 0
+            balance += paid - owed
+            yield {
+                'id': pk,
+                'description': description,
+                'amount': amount,
+                'expense_currency': currency,
+                'created_at': created_at,
+                'paid': from_micros(paid),
+                'share': from_micros(owed),
+                'running_balance': from_micros(balance),
+                'balance_micros': balance,
+            }
+
 class Expense(models.Model):
     """Represents a single expense paid by a participant and split among others."""
     description = models.CharField(max_length=255)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # ISO 4217 kód; prázdný znamená měnu události
+    currency = models.CharField(max_length=3, blank=True)
     payer = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name='paid_expenses')
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='expenses')
     split_between = models.ManyToManyField(Participant, related_name='shared_expenses', blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="expenses")
+    # Optimistické zamykání: API odmítne úpravu se zastaralou verzí (409)
+    version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -135,4 +163,103 @@ class Settlement(models.Model):
 
     def __str__(self):
         """Return human-readable string representation of the settlement."""
-        return f"{self.from_participant.name} → {self.to_participant.name}: {self.amount} Kč"
\ No newline at end of file
+        return f"{self.from_participant.name} → {self.to_participant.name}: {self.amount} Kč"
+
+class FxRate(models.Model):
+    """Represents how many units of a currency one unit of FX_BASE_CURRENCY buys (loaded by load_fx_rates)."""
+    currency = models.CharField(max_length=3, primary_key=True)
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Return human-readable string representation of the rate."""
+        return f"1 {settings.FX_BASE_CURRENCY} = {self.rate} {self.currency}"
+
+
+class EventSnapshot(models.Model):
+    """Represents the frozen, zlib-compressed JSON read payload (detail, balance, settlement) of a closed event."""
+    event = models.OneToOneField(Event, primary_key=True, related_name="snapshot", on_delete=models.CASCADE)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return human-readable string representation of the snapshot."""
+        return f"Snapshot of event #{self.event_id}"
+
+
+class EventArchive(models.Model):
+    """Represents the zlib-compressed raw rows (participants, expenses, splits, settlements) of an archived event."""
+    event = models.OneToOneField(Event, primary_key=True, related_name="archive", on_delete=models.CASCADE)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return human-readable string representation of the archive."""
+        return f"Archive of event #{self.event_id}"
+
+
+class Job(models.Model):
+    """Represents a unit of background work (see expenses.jobs) executed by `manage.py run_workers`."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (SUCCEEDED, "Succeeded"), (FAILED, "Failed")]
+
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.FloatField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        """Return human-readable string representation of the job."""
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    class LeaseLost(Exception):
+        """Raised in a task whose job was taken over by another worker after its lease expired."""
+
+    def report_progress(self, done, total=1):
+        """Store progress as a 0..1 fraction and renew the worker's lease (heartbeat; safe to call often).
+
+        Raises Job.LeaseLost when the job no longer belongs to this worker, so the task stops instead of running
+        alongside the worker that reclaimed it.
+        """
+        self.progress = min(1.0, done / total) if total else 1.0
+        now = timezone.now()
+        renewed = Job.objects.filter(pk=self.pk, status=Job.RUNNING, locked_by=self.locked_by).update(
+            progress=self.progress, locked_at=now, updated_at=now
+        )
+        if not renewed:
+            raise Job.LeaseLost(f"Job {self.pk} was reclaimed by another worker.")
+        self.locked_at = now
+
+
+class IdempotencyKey(models.Model):
+    """Represents a client Idempotency-Key and the stored response of the first request made with it."""
+    scope = models.CharField(max_length=255)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["scope", "key"], name="unique_idempotency_key")]
+
+    def __str__(self):
+        """Return human-readable string representation of the idempotency key."""
+        return f"{self.key} ({self.scope})"
@@ -0,0 +1,57 @@
+"""
+Renderers for ExpenseApp.
+Provide a faster drop-in replacement for DRF's JSONRenderer and an optional MessagePack renderer.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # volitelná závislost; renderer se v settings registruje jen pokud je k dispozici
+    msgpack = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Render compact JSON byte-for-byte like JSONRenderer, but without circular-reference checks.
+
+    API payloads are freshly built trees of dicts and lists, so the per-container cycle bookkeeping done by
+    ``json.dumps`` is pure overhead. Indented output (browsable API, ``; indent=`` media types) falls back to DRF.
+    """
+    def __init__(self):
+        super().__init__()
+        self._encoder = JSONEncoder(
+            ensure_ascii=self.ensure_ascii,
+            allow_nan=not self.strict,
+            separators=(',', ':') if self.compact else (', ', ': '),
+            check_circular=False,
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render `data` into JSON, returning a bytestring."""
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = self._encoder.encode(data)
+        # Stejně jako JSONRenderer escapujeme \u2028 a \u2029 (JSON jako podmnožina JavaScriptu)
+        return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render data as MessagePack for clients sending ``Accept: application/msgpack``.
+
+    Values JSON cannot carry natively (Decimal, datetime, UUID) are converted exactly like JSONRenderer does.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render `data` into MessagePack, returning a bytestring."""
+        if msgpack is None:
+            raise ImproperlyConfigured("MessagePackRenderer requires the 'msgpack' package.")
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
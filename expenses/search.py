@@ -0,0 +1,204 @@
+"""
+Full-text search for ExpenseApp.
+Indexes expense descriptions, event titles/descriptions and participant names. PostgreSQL uses generated
+``tsvector`` columns with GIN indexes; SQLite uses an FTS5 table kept in sync by triggers. Both are maintained
+by the database on every write, including bulk and raw ones.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+KIND_CODES = {'event': 1, 'participant': 2, 'expense': 3}
+KINDS = {code: kind for kind, code in KIND_CODES.items()}
+
+# Každá indexovaná tabulka: (druh, tabulka, tsvector výraz pro PostgreSQL, text, popisek, id události, sloupce)
+SOURCES = [
+    (
+        'event', 'expenses_event',
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A')"
+        " || setweight(to_tsvector('simple', coalesce(description, '')), 'B')",
+        "{row}.title || ' ' || {row}.description", '{row}.title', '{row}.id', 'title, description',
+    ),
+    (
+        'participant', 'expenses_participant',
+        "to_tsvector('simple', coalesce(name, ''))",
+        '{row}.name', '{row}.name', '{row}.event_id', 'name, event_id',
+    ),
+    (
+        'expense', 'expenses_expense',
+        "to_tsvector('simple', coalesce(description, ''))",
+        '{row}.description', '{row}.description', '{row}.event_id', 'description, event_id',
+    ),
+]
+
+FTS_TABLE = 'expenses_search'
+# Smazané události jsou skryté hned, i když jejich řádky ještě nebyly odstraněny (expenses.deletion)
+DELETED_EVENTS = 'SELECT id FROM expenses_event WHERE deleted_at IS NOT NULL'
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def install(schema_editor):
+    """Create the vendor-specific search index and backfill it from existing rows."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for kind, table, vector, *_ in SOURCES:
+            schema_editor.execute(
+                f'ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED'
+            )
+            schema_editor.execute(f'CREATE INDEX {table}_search_idx ON {table} USING gin (search_vector)')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(body, label UNINDEXED, event_id UNINDEXED)'
+        )
+        for kind, table, _, body, label, event_id, _ in SOURCES:
+            schema_editor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, body, label, event_id) '
+                f'SELECT {_rowid(kind, table)}, {body.format(row=table)}, {label.format(row=table)}, '
+                f'{event_id.format(row=table)} FROM {table}'
+            )
+        install_sqlite_triggers(schema_editor.connection)
+
+
+def uninstall(schema_editor):
+    """Drop the search index created by install()."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for kind, table, *_ in SOURCES:
+            schema_editor.execute(f'ALTER TABLE {table} DROP COLUMN search_vector')
+    elif vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            for kind, table, *_ in SOURCES:
+                for suffix in ('ai', 'au', 'ad'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{suffix}')
+        schema_editor.execute(f'DROP TABLE {FTS_TABLE}')
+
+
+def install_sqlite_triggers(conn):
+    """(Re)create the FTS5 sync triggers. Idempotent; SQLite drops triggers when migrations rebuild a table."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if cursor.fetchone() is None:
+            return
+        for kind, table, _, body, label, event_id, columns in SOURCES:
+            insert = (
+                f'INSERT INTO {FTS_TABLE}(rowid, body, label, event_id) VALUES '
+                f"({_rowid(kind, 'new')}, {body.format(row='new')}, {label.format(row='new')}, "
+                f"{event_id.format(row='new')});"
+            )
+            delete = f"DELETE FROM {FTS_TABLE} WHERE rowid = {_rowid(kind, 'old')};"
+            triggers = {
+                'ai': f'AFTER INSERT ON {table} BEGIN {insert} END',
+                'au': f'AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END',
+                'ad': f'AFTER DELETE ON {table} BEGIN {delete} END',
+            }
+            for suffix, trigger in triggers.items():
+                cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_search_{suffix} {trigger}')
+
+
+def ensure_search_triggers(sender, using='default', **kwargs):
+    """post_migrate handler restoring SQLite triggers lost when a migration rebuilt an indexed table."""
+    from django.db import connections
+    conn = connections[using]
+    if conn.vendor == 'sqlite':
+        install_sqlite_triggers(conn)
+
+
+def _rowid(kind, row):
+    """SQL expression encoding (kind, id) into a single FTS5 rowid."""
+    return f'{row}.id * 4 + {KIND_CODES[kind]}'
+
+
+def _terms(query):
+    """Split a user query into word terms; operators and punctuation are ignored."""
+    return TERM_RE.findall(query.lower())
+
+
+def search(query, event_id=None, kinds=None, limit=20):
+    """Return ranked hits [{"type", "id", "event", "label", "rank"}] for all query terms (last one as a prefix).
+
+    ``rank`` is higher for better matches on every backend.
+    """
+    terms = _terms(query)
+    kinds = [kind for kind in (kinds or KIND_CODES) if kind in KIND_CODES]
+    if not terms or not kinds:
+        return []
+    if connection.vendor == 'postgresql':
+        rows = _search_postgresql(terms, event_id, kinds, limit)
+    elif connection.vendor == 'sqlite':
+        rows = _search_sqlite(terms, event_id, kinds, limit)
+    else:
+        rows = []
+    return [
+        {'type': kind, 'id': pk, 'event': event, 'label': label, 'rank': float(rank)}
+        for kind, pk, event, label, rank in rows
+    ]
+
+
+def _tsquery(terms):
+    return ' & '.join(terms[:-1] + [terms[-1] + ':*'])
+
+
+def _fts_match(terms):
+    return (' '.join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*').strip()
+
+
+def matching(queryset, query):
+    """Filter a queryset of an indexed model to the rows matching query, without a result limit (admin search)."""
+    kind = queryset.model._meta.model_name
+    terms = _terms(query)
+    if not terms or kind not in KIND_CODES:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        table = queryset.model._meta.db_table
+        sql, params = f"SELECT id FROM {table} WHERE search_vector @@ to_tsquery('simple', %s)", [_tsquery(terms)]
+    elif connection.vendor == 'sqlite':
+        sql = f'SELECT rowid / 4 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid % 4 = {KIND_CODES[kind]}'
+        params = [_fts_match(terms)]
+    else:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def _search_postgresql(terms, event_id, kinds, limit):
+    tsquery = _tsquery(terms)
+    selects = []
+    params = []
+    for kind, table, _, _, label, event, _ in SOURCES:
+        if kind not in kinds:
+            continue
+        event_column = event.format(row=table)
+        sql = (
+            f"SELECT '{kind}', {table}.id, {event_column} AS event_id, {label.format(row=table)}, "
+            f"ts_rank({table}.search_vector, to_tsquery('simple', %s)) AS rank "
+            f"FROM {table} WHERE {table}.search_vector @@ to_tsquery('simple', %s)"
+        )
+        params += [tsquery, tsquery]
+        if event_id is not None:
+            sql += f' AND {event_column} = %s'
+            params.append(event_id)
+        selects.append(sql)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT * FROM ({" UNION ALL ".join(selects)}) hits WHERE hits.event_id NOT IN ({DELETED_EVENTS}) '
+            'ORDER BY rank DESC LIMIT %s',
+            params + [limit],
+        )
+        return cursor.fetchall()
+
+
+def _search_sqlite(terms, event_id, kinds, limit):
+    match = _fts_match(terms)
+    sql = (
+        f'SELECT rowid, event_id, label, -bm25({FTS_TABLE}) AS rank '
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND event_id NOT IN ({DELETED_EVENTS})'
+    )
+    params = [match]
+    if len(kinds) < len(KIND_CODES):
+        sql += f" AND rowid % 4 IN ({', '.join(str(KIND_CODES[kind]) for kind in kinds)})"
+    if event_id is not None:
+        sql += ' AND event_id = %s'
+        params.append(event_id)
+    with connection.cursor() as cursor:
+        cursor.execute(sql + ' ORDER BY rank DESC LIMIT %s', params + [limit])
+        return [(KINDS[rowid % 4], rowid // 4, event, label, rank) for rowid, event, label, rank in cursor.fetchall()]
@@ -2,8 +2,20 @@
 Serializers for ExpenseApp.
 Provide JSON representations and validation for participants, expenses, events and categories.
 """
+import re
+
+from django.conf import settings
 from rest_framework import serializers
-from .models import Event, Participant, Expense, Category
+from . import fx, ledger
+from .models import Event, Participant, Expense, Category, Job
+
+
+def validate_currency_code(value):
+    """Return an upper-cased ISO 4217 code or raise ValidationError."""
+    value = value.strip().upper()
+    if not re.fullmatch(r"[A-Z]{3}", value):
+        raise serializers.ValidationError("Expected a three-letter ISO 4217 currency code.")
+    return value
 
 class ParticipantSerializer(serializers.ModelSerializer):
     """Serialize a participant (id, name, email)."""
@@ -12,11 +24,15 @@ class ParticipantSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'email']
 
 class ExpenseSerializer(serializers.ModelSerializer):
-    """Serialize an expense including payer, event, optional category and split participants."""
+    """Serialize an expense including payer, event, optional category and split participants.
+
+    ``currency`` defaults to the event's currency; others need a loaded exchange rate (expenses.fx).
+    """
+    currency = serializers.CharField(max_length=3, required=False)
     payer = serializers.PrimaryKeyRelatedField(
         queryset=Participant.objects.all()
     )
-    event = serializers.PrimaryKeyRelatedField(queryset=Event.objects.all())
+    event = serializers.PrimaryKeyRelatedField(queryset=Event.objects.filter(deleted_at__isnull=True))
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False, allow_null=True)
     split_between = ParticipantSerializer(many=True, read_only=True)
     # Write-only helper to accept participant IDs for split_between.
@@ -30,13 +46,18 @@ class ExpenseSerializer(serializers.ModelSerializer):
             'id',
             'description',
             'amount',
+            'currency',
             'payer',
             'event',
             'category',
             'split_between',
-            'split_between_ids'
+            'split_between_ids',
+            'version',
         ]
 
+    def validate_currency(self, value):
+        return validate_currency_code(value)
+
     def validate(self, attrs):
         """Validate cross-model constraints (payer/split participants belong to the same event, amount > 0)."""
         # Ensure payer and split_between participants belong to the same event
@@ -60,13 +81,25 @@ class ExpenseSerializer(serializers.ModelSerializer):
         if amount is not None and amount <= 0:
             raise serializers.ValidationError({ 'amount': 'Amount must be a positive number.' })
 
+        if self.instance is None:
+            attrs.setdefault('currency', event.currency)
+        currency = attrs.get('currency') or getattr(self.instance, 'currency', '') or event.currency
+        if currency != event.currency:
+            try:
+                fx.rates({currency, event.currency})
+            except fx.MissingRate as exc:
+                raise serializers.ValidationError({'currency': exc.detail})
+
         return attrs
 
     def create(self, validated_data):
         """Create an expense and set its many-to-many split participants."""
         split_between_data = validated_data.pop('split_between', [])
-        expense = Expense.objects.create(**validated_data)
-        expense.split_between.set(split_between_data)
+        expense = Expense(**validated_data)
+        # Ledger zapíše výdaj rovnou s konečným rozdělením (jinak by ho nejdřív rozpočítal na všechny)
+        expense._ledger_split = [participant.pk for participant in split_between_data]
+        expense.save()
+        ledger.set_split(expense, split_between_data)
         return expense
 
     def update(self, instance, validated_data):
@@ -76,7 +109,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         if split_between_data is not None:
-            instance.split_between.set(split_between_data)
+            ledger.set_split(instance, split_between_data)
         return instance
 
     def to_representation(self, instance):
@@ -84,6 +117,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
         rep = super().to_representation(instance)
         # Ensure decimals are serialized as numbers for the frontend.
         rep['amount'] = float(rep['amount']) if rep.get('amount') is not None else None
+        rep['currency'] = instance.currency or instance.event.currency
         rep['payer'] = {
             'id': instance.payer.id,
             'name': instance.payer.name,
@@ -108,9 +142,216 @@ class EventSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Event
-        fields = ['id', 'title', 'description', 'participants', 'expenses']
+        fields = ['id', 'title', 'description', 'currency', 'participants', 'expenses']
+
+    def validate_currency(self, value):
+        """Require a known code; switching an existing event needs rates for the currencies of its expenses."""
+        value = validate_currency_code(value)
+        if self.instance is not None and value != self.instance.currency:
+            used = set(self.instance.expenses.exclude(currency='').values_list('currency', flat=True).distinct())
+            if used - {value}:
+                try:
+                    fx.rates(used | {value})
+                except fx.MissingRate as exc:
+                    raise serializers.ValidationError(exc.detail)
+        return value
+
+
+def _split_rows(expenses):
+    """Return {expense_id: [participant dict, ...]} for the given expenses queryset in one query."""
+    through = Expense.split_between.through
+    splits = {}
+    rows = (
+        through.objects.filter(expense_id__in=expenses.values('pk'))
+        .order_by('expense_id', 'participant_id')
+        .values_list('expense_id', 'participant_id', 'participant__name', 'participant__email')
+    )
+    for expense_id, participant_id, name, email in rows:
+        splits.setdefault(expense_id, []).append({'id': participant_id, 'name': name, 'email': email})
+    return splits
+
+
+def expense_rows(queryset):
+    """Read-only fast path for ExpenseSerializer: build the same payload from two flat queries.
+
+    Produces exactly what ``ExpenseSerializer(queryset, many=True).data`` renders to, without running DRF field
+    machinery per row. Use only for GET responses.
+    """
+    queryset = queryset.order_by('pk')
+    splits = _split_rows(queryset)
+    rows = queryset.values_list(
+        'id', 'description', 'amount', 'currency', 'event__currency', 'payer_id', 'payer__name', 'payer__email',
+        'event_id', 'category_id', 'category__name', 'version',
+    )
+    return [
+        {
+            'id': pk,
+            'description': description,
+            'amount': float(amount),
+            'currency': currency or event_currency,
+            'payer': {'id': payer_id, 'name': payer_name, 'email': payer_email},
+            'event': event_id,
+            'category': {'id': category_id, 'name': category_name} if category_id is not None else None,
+            'split_between': splits.get(pk, []),
+            'version': version,
+        }
+        for (
+            pk, description, amount, currency, event_currency, payer_id, payer_name, payer_email, event_id,
+            category_id, category_name, version,
+        ) in rows
+    ]
+
+
+def event_rows(queryset):
+    """Read-only fast path for EventSerializer; see expense_rows. Costs four queries for any number of events.
+
+    Archived events have no participant/expense rows; their row comes from the snapshot (one extra query).
+    """
+    queryset = queryset.order_by('pk')
+    events = list(queryset.values_list('id', 'title', 'description', 'currency', 'archived_at'))
+    archived = [pk for pk, *_, archived_at in events if archived_at is not None]
+    frozen = {}
+    if archived:
+        from .snapshots import load_many  # snapshots importuje tento modul
+        frozen = {event_id: data['event'] for event_id, data in load_many(archived).items()}
+    participants = {}
+    for event_id, pk, name, email in (
+        Participant.objects.filter(event__in=queryset.values('pk'))
+        .order_by('pk')
+        .values_list('event_id', 'id', 'name', 'email')
+    ):
+        participants.setdefault(event_id, []).append({'id': pk, 'name': name, 'email': email})
+    expenses = {}
+    for row in expense_rows(Expense.objects.filter(event__in=queryset.values('pk'))):
+        expenses.setdefault(row['event'], []).append(row)
+    return [
+        frozen[pk] if pk in frozen else {
+            'id': pk,
+            'title': title,
+            'description': description,
+            'currency': currency,
+            'participants': participants.get(pk, []),
+            'expenses': expenses.get(pk, []),
+        }
+        for pk, title, description, currency, _ in events
+    ]
+
+
+def normalize_event(row):
+    """Return a compact variant of an event_rows() row: participants and categories listed once, referenced by id."""
+    categories = {}
+    expenses = []
+    for expense in row['expenses']:
+        category = expense['category']
+        if category is not None:
+            categories[category['id']] = category
+        expenses.append({
+            'id': expense['id'],
+            'description': expense['description'],
+            'amount': expense['amount'],
+            'currency': expense.get('currency'),
+            'payer': expense['payer']['id'],
+            'category': category['id'] if category is not None else None,
+            'split_between': [p['id'] for p in expense['split_between']],
+        })
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'description': row['description'],
+        'currency': row.get('currency'),
+        'participants': row['participants'],
+        'categories': list(categories.values()),
+        'expenses': expenses,
+    }
+
+
 class CategorySerializer(serializers.ModelSerializer):
     """Serialize an expense category (id, name)."""
     class Meta:
         model = Category
-        fields = ['id', 'name']
\ No newline at end of file
+        fields = ['id', 'name']
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serialize a background job's status (read-only)."""
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'progress', 'result', 'error', 'attempts', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+class ExpensePreviewSerializer(serializers.Serializer):
+    """Validate a hypothetical expense (or an edit/removal of an existing one) for the what-if preview.
+
+    Participant ids are only type-checked here; the view checks them against the event's cached balance vector.
+    """
+    expense = serializers.IntegerField(required=False, help_text="Existing expense to edit or remove.")
+    delete = serializers.BooleanField(default=False)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    currency = serializers.CharField(max_length=3, required=False)
+    payer = serializers.IntegerField(required=False)
+    split_between_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate_currency(self, value):
+        return validate_currency_code(value)
+
+    def validate(self, attrs):
+        """Require amount and payer for new expenses, an expense id for removals, and a positive amount."""
+        if attrs['delete'] and 'expense' not in attrs:
+            raise serializers.ValidationError({'expense': 'Required when delete is set.'})
+        if 'expense' not in attrs:
+            missing = {field: 'This field is required.' for field in ('amount', 'payer') if field not in attrs}
+            if missing:
+                raise serializers.ValidationError(missing)
+        amount = attrs.get('amount')
+        if amount is not None and amount <= 0:
+            raise serializers.ValidationError({'amount': 'Amount must be a positive number.'})
+        return attrs
+
+
+class ExpenseFilterSerializer(serializers.Serializer):
+    """Select the expenses of one event for a bulk edit, optionally narrowed by category, payer and description."""
+    event = serializers.IntegerField()
+    category = serializers.IntegerField(required=False, allow_null=True, help_text="null selects uncategorized.")
+    payer = serializers.IntegerField(required=False)
+    description = serializers.CharField(required=False, help_text="Case-insensitive substring.")
+
+
+class ExpenseChangesSerializer(serializers.Serializer):
+    """Changes applied to every expense of a bulk edit; an empty split means shared by everyone."""
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False, allow_null=True)
+    payer = serializers.IntegerField(required=False)
+    split_between_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        """Require at least one change."""
+        if not attrs:
+            raise serializers.ValidationError('Give at least one of category, payer, split_between_ids.')
+        return attrs
+
+
+class ExpenseBulkUpdateSerializer(serializers.Serializer):
+    """Validate a bulk expense edit: the expenses (``ids`` or ``filter``), the changes and optional versions."""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = ExpenseFilterSerializer(required=False)
+    changes = ExpenseChangesSerializer()
+    versions = serializers.DictField(
+        child=serializers.IntegerField(min_value=0), required=False,
+        help_text="{expense id: version the client saw}; a mismatch fails the whole edit with 409.",
+    )
+
+    def validate_ids(self, value):
+        # Limit se čte za běhu (settings), ne při importu jako ListField(max_length=...)
+        if len(value) > settings.EXPENSE_BULK_UPDATE_MAX:
+            raise serializers.ValidationError(f'At most {settings.EXPENSE_BULK_UPDATE_MAX} expenses per request.')
+        return value
+
+    def validate_versions(self, value):
+        try:
+            return {int(pk): version for pk, version in value.items()}
+        except ValueError:
+            raise serializers.ValidationError('Keys must be expense ids.')
+
+    def validate(self, attrs):
+        """Require exactly one of ids and filter."""
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Give either ids or filter.')
+        return attrs
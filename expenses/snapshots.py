@@ -0,0 +1,114 @@
+"""
+Frozen snapshots of closed events.
+Closing an event stores its full read payload (EventSerializer data, balances, settlement) as one compressed
+row; reads of closed events are then served from that row and writes are rejected until the event is reopened.
+Archived events (expenses.archive) are read from the same kind of row and restored by the first write.
+"""
+import json
+import zlib
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.utils.encoders import JSONEncoder
+
+from .balances import balance_vector, compute_balances, settle
+from .models import Event, EventSnapshot
+from .serializers import event_rows
+
+
+class EventClosed(APIException):
+    """Raised when writing to a closed (frozen) event."""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Event is closed; reopen it to make changes."
+    default_code = "event_closed"
+
+
+def ensure_open(event, restore=True):
+    """Raise EventClosed if the event has been closed; restore it first if it is archived (unless restore=False)."""
+    if event is None:
+        return
+    if event.closed_at is not None:
+        raise EventClosed()
+    if restore:
+        restore_archived(event)
+
+
+def restore_archived(event):
+    """Move an archived event's rows back into the hot tables before it is written to."""
+    if event.archived_at is not None:
+        from .archive import restore_event  # archive používá build_payloads a encode z tohoto modulu
+        restore_event(event.pk)
+        event.archived_at = None
+
+
+def payload(row, vector):
+    """Return the read payload of an event from its event_rows() row and balance vector."""
+    return {
+        "event": row,
+        "balance": {str(participant_id): float(amount) for participant_id, amount in vector["balances"].items()},
+        "settlement": settle(vector["balances"], vector["names"]),
+    }
+
+
+def build_payload(event):
+    """Return the read payload of an event exactly as the live endpoints would render it."""
+    return payload(event_rows(Event.objects.filter(pk=event.pk))[0], balance_vector(event.pk))
+
+
+def build_payloads(event_ids):
+    """Return {event_id: payload} for many events at once (balances computed together, bypassing the cache)."""
+    vectors = compute_balances(event_ids)
+    return {row["id"]: payload(row, vectors[row["id"]]) for row in event_rows(Event.objects.filter(pk__in=event_ids))}
+
+
+def encode(data):
+    return zlib.compress(json.dumps(data, cls=JSONEncoder).encode())
+
+
+def decode(data):
+    return json.loads(zlib.decompress(data))
+
+
+def close_event(event):
+    """Freeze an event: store its compressed snapshot and mark it closed."""
+    with transaction.atomic():
+        event = Event.objects.select_for_update().get(pk=event.pk)
+        ensure_open(event, restore=False)
+        data = encode(build_payload(event))
+        EventSnapshot.objects.update_or_create(event=event, defaults={"data": data})
+        event.closed_at = timezone.now()
+        event.save(update_fields=["closed_at"])
+    return event
+
+
+def reopen_event(event):
+    """Unfreeze an event: drop its snapshot so reads are computed live again and writes are accepted."""
+    restore_archived(event)
+    with transaction.atomic():
+        EventSnapshot.objects.filter(event_id=event.pk).delete()
+        Event.objects.filter(pk=event.pk).update(closed_at=None)
+    event.closed_at = None
+    return event
+
+
+def load(event_id):
+    """Return the decoded snapshot payload of a visible closed event with a single-row fetch, or None."""
+    try:
+        data = (
+            EventSnapshot.objects.filter(event_id=event_id, event__deleted_at__isnull=True)
+            .values_list("data", flat=True)
+            .first()
+        )
+    except (TypeError, ValueError):
+        return None
+    return decode(data) if data is not None else None
+
+
+def load_many(event_ids):
+    """Return {event_id: decoded snapshot payload} for those of the given events that have a snapshot."""
+    return {
+        event_id: decode(data)
+        for event_id, data in EventSnapshot.objects.filter(event_id__in=event_ids).values_list("event_id", "data")
+    }
@@ -0,0 +1,34 @@
+"""
+Background tasks for ExpenseApp.
+Each task is registered with expenses.jobs and receives the Job plus its JSON payload as keyword arguments.
+"""
+from .deletion import purge_event
+from .jobs import task
+from .models import Event
+from .snapshots import close_event
+
+
+@task("event.balance")
+def event_balance(job, event_id):
+    """Compute per-participant balances of an event."""
+    balances = Event.objects.get(pk=event_id).get_balance()
+    return {str(participant_id): float(amount) for participant_id, amount in balances.items()}
+
+
+@task("event.settlement")
+def event_settlement(job, event_id):
+    """Compute the settlement plan of an event."""
+    return Event.objects.get(pk=event_id).get_settlement()
+
+
+@task("event.purge")
+def event_purge(job, event_id):
+    """Delete a soft-deleted event's data in chunks."""
+    return purge_event(event_id, progress=job.report_progress)
+
+
+@task("event.close")
+def event_close(job, event_id):
+    """Freeze an event by building its snapshot."""
+    event = close_event(Event.objects.get(pk=event_id))
+    return {"id": event.pk, "closed_at": event.closed_at.isoformat()}
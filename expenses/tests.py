@@ -5,6 +5,7 @@ Each test has a one-line docstring to satisfy the documentation requirement.
 """
 
 import json
+import os
 import pytest
 from django.urls import reverse
 from django.contrib.auth.models import User
@@ -46,6 +47,13 @@ def jpost(client, url_name, payload=None, url_kwargs=None):
     return client.post(url, data=json.dumps(payload), content_type="application/json")
 
 
+@pytest.fixture(autouse=True)
+def reset_auth_throttle():
+    """Start every test with empty login/signup throttle buckets (all test clients share one IP)."""
+    from expenses.throttling import get_store
+    get_store().clear()
+
+
 @pytest.mark.django_db
 def test_signup_success(client):
     """Registers a new user successfully via API."""
@@ -276,3 +284,1297 @@ def test_delete_event_ok(client):
     event_id = r_event.json()["id"]
     r_del = client.delete(reverse("delete_event", kwargs={"event_id": event_id}))
     assert r_del.status_code == 204
+
+
+def make_event_with_expenses(client):
+    """Create an event with three participants and a few expenses via API; return (event_id, participant ids)."""
+    login_user(client)
+    event_id = client.post(
+        reverse("event-list"),
+        data=json.dumps({"title": "Trip", "description": "X"}),
+        content_type="application/json",
+    ).json()["id"]
+    pids = []
+    for name in ("A", "B", "C"):
+        r = client.post(
+            reverse("event-add-participant", args=[event_id]),
+            data=json.dumps({"name": name, "email": f"{name.lower()}@example.com"}),
+            content_type="application/json",
+        )
+        pids.append(r.json()["id"])
+    a, b, c = pids
+    for description, amount, payer, split in (
+        ("Hotel", 300, a, [a, b, c]),
+        ("Taxi", 40, b, [a, b]),
+        ("Dinner", 90, c, []),
+        ("Museum", 20, a, [b]),
+    ):
+        r = client.post(
+            reverse("expense-list"),
+            data=json.dumps({
+                "description": description, "amount": amount, "payer": payer,
+                "event": event_id, "split_between_ids": split,
+            }),
+            content_type="application/json",
+        )
+        assert r.status_code == 201
+    return event_id, pids
+
+
+@pytest.mark.django_db
+def test_participant_statement_running_balance(client):
+    """Statement lists the participant's expenses with a running balance ending at get_balance."""
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    r = client.get(reverse("participant-statement", args=[b]))
+    assert r.status_code == 200
+    rows = r.json()["results"]
+    assert [row["description"] for row in rows] == ["Hotel", "Taxi", "Dinner", "Museum"]
+    assert [row["balance"] for row in rows] == [-100.0, -80.0, -110.0, -130.0]
+    balance = client.get(reverse("event-balance", args=[event_id])).json()
+    assert round(balance[str(b)], 2) == rows[-1]["balance"]
+
+
+@pytest.mark.django_db
+def test_participant_statement_cursor_pagination_and_stream(client):
+    """Cursor pages carry the running balance over; stream returns the same rows as NDJSON."""
+    from urllib.parse import unquote
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    url = reverse("participant-statement", args=[a])
+    first = client.get(url, {"page_size": 2}).json()
+    assert len(first["results"]) == 2 and first["next"]
+    second = client.get(first["next"]).json()
+    assert second["next"] is None
+    paged = first["results"] + second["results"]
+    assert [row["balance"] for row in paged] == [200.0, 180.0, 150.0, 170.0]
+
+    r = client.get(url, {"stream": 1})
+    assert r["Content-Type"] == "application/x-ndjson"
+    streamed = [json.loads(line) for line in b"".join(r.streaming_content).splitlines()]
+    assert streamed == paged
+
+    assert client.get(url, {"cursor": "forged"}).status_code == 400
+    cursor = first["next"].split("cursor=")[1].split("&")[0]
+    r = client.get(reverse("participant-statement", args=[b]), {"cursor": unquote(cursor)})
+    assert r.status_code == 400 and "cursor" in r.json()
+
+
+@pytest.mark.django_db
+def test_participant_statement_matches_ledger_micros(client, django_assert_num_queries):
+    """Statement shares use the ledger's integer split, so the last running balance equals the stored balance."""
+    from expenses.models import Event, Expense, Participant
+
+    event = Event.objects.create(title="Coffee")
+    a, b, c = (Participant.objects.create(event=event, name=name) for name in "ABC")
+    for i in range(90):
+        expense = Expense.objects.create(event=event, payer=(a, b)[i % 2], description=f"#{i}", amount="0.10")
+        if i % 3:
+            expense.split_between.set([a, b, c])
+    c.refresh_from_db()
+
+    rows = list(c.get_statement())
+    assert rows[-1]["balance_micros"] == c.balance_micros != 0
+    with django_assert_num_queries(2):  # účastník a jedna stránka výpisu
+        page = client.get(reverse("participant-statement", args=[c.pk]), {"page_size": 40}).json()
+    assert page["results"][-1]["balance"] == float(round(rows[39]["running_balance"], 2))
+
+
+@pytest.mark.django_db
+def test_fast_path_matches_drf_serializers(client, django_assert_max_num_queries):
+    """List and detail GETs return byte-for-byte the payload of the DRF serializers, in bounded queries."""
+    from rest_framework.renderers import JSONRenderer
+    from expenses.models import Category, Event, Expense
+    from expenses.serializers import EventSerializer, ExpenseSerializer
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    expense = Expense.objects.get(description="Taxi")
+    expense.category = Category.objects.create(name="Doprava \u2028 č")
+    expense.save()
+
+    expected = JSONRenderer().render(ExpenseSerializer(Expense.objects.order_by("pk"), many=True).data)
+    with django_assert_max_num_queries(6):
+        r = client.get(reverse("expense-list"))
+    assert r.content == expected
+
+    expected = JSONRenderer().render(ExpenseSerializer(expense).data)
+    assert client.get(reverse("expense-detail", args=[expense.pk])).content == expected
+
+    expected = JSONRenderer().render(EventSerializer(Event.objects.get(pk=event_id)).data)
+    with django_assert_max_num_queries(8):
+        r = client.get(reverse("event-detail", args=[event_id]))
+    assert r.content == expected
+    assert client.get(reverse("event-detail", args=[event_id + 1])).status_code == 404
+    assert client.get(reverse("expense-detail", args=["abc"])).status_code == 404
+
+
+@pytest.mark.django_db
+def test_event_normalized_shape(client):
+    """?shape=normalized lists participants once and references them by id from expenses."""
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    data = client.get(reverse("event-detail", args=[event_id]), {"shape": "normalized"}).json()
+    assert [p["id"] for p in data["participants"]] == [a, b, c]
+    taxi = next(e for e in data["expenses"] if e["description"] == "Taxi")
+    assert taxi["payer"] == b and taxi["split_between"] == [a, b] and taxi["category"] is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("encoding, expected", [("gzip", "gzip"), ("br;q=1, gzip;q=0.5", "br"), ("identity", None)])
+def test_response_compression_negotiation(client, settings, encoding, expected):
+    """Large JSON responses are compressed with the client's preferred supported coding."""
+    if expected == "br":
+        pytest.importorskip("brotli")
+    settings.COMPRESSION_MIN_SIZE = 100
+    event_id, _ = make_event_with_expenses(client)
+    r = client.get(reverse("event-detail", args=[event_id]), HTTP_ACCEPT_ENCODING=encoding)
+    assert r.get("Content-Encoding") == expected
+    assert "Accept-Encoding" in r["Vary"]
+
+    settings.COMPRESSION_MIN_SIZE = 10 ** 6
+    r = client.get(reverse("event-detail", args=[event_id]), HTTP_ACCEPT_ENCODING=encoding)
+    assert not r.has_header("Content-Encoding")
+
+
+@pytest.mark.django_db
+def test_event_msgpack_renderer(client):
+    """Accept: application/msgpack returns the same payload encoded as MessagePack."""
+    msgpack = pytest.importorskip("msgpack")
+    event_id, _ = make_event_with_expenses(client)
+    r = client.get(reverse("event-detail", args=[event_id]), HTTP_ACCEPT="application/msgpack")
+    assert r["Content-Type"] == "application/msgpack"
+    assert msgpack.unpackb(r.content) == client.get(reverse("event-detail", args=[event_id])).json()
+
+
+@pytest.mark.django_db
+def test_full_text_search_ranks_and_tracks_writes(client):
+    """Search finds expenses, events and participants, follows updates/deletes and can be scoped by type/event."""
+    from expenses.models import Expense
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    hits = client.get(reverse("api_search"), {"q": "taxi"}).json()
+    assert [(h["type"], h["label"]) for h in hits] == [("expense", "Taxi")]
+
+    hits = client.get(reverse("api_search"), {"q": "tri"}).json()
+    assert [(h["type"], h["id"]) for h in hits] == [("event", event_id)]
+
+    taxi = Expense.objects.get(description="Taxi")
+    taxi.description = "Airport shuttle"
+    taxi.save()
+    Expense.objects.filter(description="Museum").delete()
+    assert client.get(reverse("api_search"), {"q": "taxi"}).json() == []
+    assert client.get(reverse("api_search"), {"q": "museum"}).json() == []
+    hits = client.get(reverse("api_search"), {"q": "airport shut", "type": "expense", "event": event_id}).json()
+    assert [h["id"] for h in hits] == [taxi.pk]
+    assert client.get(reverse("api_search"), {"q": "airport", "event": event_id + 1}).json() == []
+
+
+def seed_event(participants=5, expenses=120, title="Big"):
+    """Create an event with participants and evenly split expenses directly via ORM."""
+    from decimal import Decimal
+    from expenses.ledger import rebuild
+    from expenses.models import Event, Expense, Participant
+
+    event = Event.objects.create(title=title, description="seeded")
+    people = Participant.objects.bulk_create(
+        Participant(event=event, name=f"P{i}", email=f"p{i}@example.com") for i in range(participants)
+    )
+    rows = Expense.objects.bulk_create(
+        Expense(event=event, description=f"E{i}", amount=Decimal(10 + i % 7), payer=people[i % participants])
+        for i in range(expenses)
+    )
+    through = Expense.split_between.through
+    through.objects.bulk_create(
+        through(expense_id=expense.pk, participant_id=person.pk) for expense in rows for person in people[:2]
+    )
+    rebuild([event.pk])
+    return event, people
+
+
+@pytest.mark.django_db
+def test_admin_pages_have_bounded_query_counts(admin_client, django_assert_max_num_queries):
+    """Admin changelists and the event change page stay at a constant query count for large events."""
+    from expenses.models import Settlement
+
+    event, people = seed_event()
+    Settlement.objects.bulk_create(
+        Settlement(event=event, from_participant=people[0], to_participant=people[i], amount=5) for i in range(1, 5)
+    )
+    for name in ("expense", "participant", "settlement", "event"):
+        with django_assert_max_num_queries(12):
+            assert admin_client.get(reverse(f"admin:expenses_{name}_changelist")).status_code == 200
+
+    url = reverse("admin:expenses_event_change", args=[event.pk])
+    with django_assert_max_num_queries(20):
+        r = admin_client.get(url, {"expense_page": 3})
+    assert r.status_code == 200
+    formset = next(f for f in r.context["inline_admin_formsets"] if f.opts.model.__name__ == "Expense").formset
+    assert formset.initial_form_count() == 20 and formset.page_count == 3
+    r = admin_client.get(url, {"expense_page": 2, "participant_page": 1, "_changelist_filters": "q=x"})
+    assert 'href="?expense_page=3&amp;participant_page=1&amp;_changelist_filters=q%3Dx"' in r.content.decode()
+
+
+@pytest.mark.django_db
+def test_admin_expense_search_returns_every_full_text_hit(admin_client):
+    """The admin expense search filters through the full-text index without capping the number of hits."""
+    from expenses import search
+    from expenses.models import Event, Expense, Participant
+
+    event = Event.objects.create(title="Import")
+    payer = Participant.objects.create(event=event, name="A")
+    Expense.objects.bulk_create(
+        [Expense(description=f"Snack {i}", amount=1, payer=payer, event=event) for i in range(1200)]
+        + [Expense(description="Hotel", amount=1, payer=payer, event=event)]
+    )
+    assert search.matching(Expense.objects.all(), "snack").count() == 1200
+    r = admin_client.get(reverse("admin:expenses_expense_changelist"), {"q": "hotel"})
+    assert [expense.description for expense in r.context["cl"].result_list] == ["Hotel"]
+
+
+@pytest.mark.django_db
+def test_admin_participant_autocomplete_scoped_to_event(admin_client):
+    """Participant autocomplete on an expense page only offers participants of that expense's event."""
+    from expenses.models import Expense
+
+    event, people = seed_event(participants=3, expenses=1)
+    seed_event(participants=3, expenses=1, title="Other")
+    expense = Expense.objects.filter(event=event).get()
+    r = admin_client.get(
+        reverse("admin:autocomplete"),
+        {"app_label": "expenses", "model_name": "expense", "field_name": "payer", "term": "P"},
+        HTTP_REFERER="http://testserver" + reverse("admin:expenses_expense_change", args=[expense.pk]),
+    )
+    assert r.status_code == 200
+    assert sorted(int(item["id"]) for item in r.json()["results"]) == sorted(p.pk for p in people)
+
+
+@pytest.mark.django_db
+def test_async_settlement_returns_job_handle(client):
+    """?async=1 queues a job (202); a worker computes it and /api/jobs/{id}/ reports the result."""
+    from django.test import Client
+    from expenses import jobs
+
+    event_id, _ = make_event_with_expenses(client)
+    expected = client.get(reverse("event-settlement", args=[event_id])).json()
+    r = client.get(reverse("event-settlement", args=[event_id]), {"async": 1})
+    assert r.status_code == 202
+    job_url = r.json()["url"]
+    # Opakovaný požadavek sdílí čekající job; anonymní klient job nezaloží
+    assert client.get(reverse("event-settlement", args=[event_id]), {"async": 1}).json()["url"] == job_url
+    anonymous = Client()
+    assert anonymous.get(reverse("event-balance", args=[event_id]), {"async": 1}).status_code in (401, 403)
+    assert client.get(job_url).json()["status"] == "queued"
+
+    assert jobs.work(once=True) == 1
+    job = client.get(job_url).json()
+    assert job["status"] == "succeeded" and job["progress"] == 1.0
+    assert job["result"] == expected
+
+
+@pytest.mark.django_db
+def test_job_retries_then_fails(settings, monkeypatch):
+    """A failing task is retried with backoff and marked failed after max attempts."""
+    from expenses import jobs
+    from expenses.models import Job
+
+    settings.JOB_RETRY_BACKOFF = 0
+
+    def flaky(job, fail_times):
+        job.report_progress(1, 2)
+        if job.attempts <= fail_times:
+            raise RuntimeError("boom")
+        return "ok"
+
+    monkeypatch.setitem(jobs.TASKS, "test.flaky", flaky)
+    ok = jobs.enqueue("test.flaky", {"fail_times": 1})
+    doomed = jobs.enqueue("test.flaky", {"fail_times": 10}, max_attempts=2)
+    jobs.work(once=True)
+    ok.refresh_from_db()
+    doomed.refresh_from_db()
+    assert (ok.status, ok.result, ok.attempts) == (Job.SUCCEEDED, "ok", 2)
+    assert doomed.status == Job.FAILED and doomed.attempts == 2 and "boom" in doomed.error
+    with pytest.raises(ValueError):
+        jobs.enqueue("test.unknown")
+
+    # Job, který shodil workera při posledním pokusu, se už neopakuje
+    from datetime import timedelta
+    from django.utils import timezone
+    crashed = jobs.enqueue("test.flaky", {"fail_times": 0}, max_attempts=2)
+    long_ago = timezone.now() - timedelta(seconds=settings.JOB_LEASE_SECONDS + 1)
+    Job.objects.filter(pk=crashed.pk).update(status=Job.RUNNING, attempts=2, locked_at=long_ago)
+    assert jobs.claim("w") is None
+    crashed.refresh_from_db()
+    assert crashed.status == Job.FAILED and "lease" in crashed.error
+
+    Job.objects.filter(pk__in=[ok.pk, doomed.pk]).update(updated_at=timezone.now() - timedelta(days=30))
+    assert jobs.purge_finished() == 2
+    assert list(Job.objects.values_list("pk", flat=True)) == [crashed.pk]
+
+
+@pytest.mark.django_db
+def test_progress_renews_lease_and_stops_reclaimed_task(settings, monkeypatch):
+    """report_progress is a heartbeat; a task whose job was reclaimed stops without overwriting the new owner."""
+    from datetime import timedelta
+    from django.utils import timezone
+    from expenses import jobs
+    from expenses.models import Job
+
+    seen = []
+
+    def slow(job):
+        stale = timezone.now() - timedelta(seconds=settings.JOB_LEASE_SECONDS + 1)
+        Job.objects.filter(pk=job.pk).update(locked_at=stale)
+        job.report_progress(1, 3)
+        # Obnovený pronájem: jiný worker job nepřevezme
+        assert jobs.claim("other") is None
+        Job.objects.filter(pk=job.pk).update(locked_at=stale)
+        seen.append(jobs.claim("other").pk)
+        job.report_progress(2, 3)
+        seen.append("not stopped")
+
+    monkeypatch.setitem(jobs.TASKS, "test.slow", slow)
+    queued = jobs.enqueue("test.slow")
+    job = jobs.claim("w")
+    assert jobs.run(job) is False
+    assert seen == [queued.pk]
+    queued.refresh_from_db()
+    assert (queued.status, queued.locked_by, queued.attempts) == (Job.RUNNING, "other", 2)
+    assert queued.progress == pytest.approx(1 / 3)
+
+
+@pytest.mark.django_db
+def test_delete_event_async_hides_then_purges(client):
+    """Async delete hides the event at once (202) and the purge job removes all of its rows in chunks."""
+    from expenses import jobs
+    from expenses.models import Event, Expense, Participant
+
+    event_id, _ = make_event_with_expenses(client)
+    other, _ = seed_event(expenses=3)
+    r = client.delete(reverse("delete_event", kwargs={"event_id": event_id}) + "?async=1")
+    assert r.status_code == 202
+    assert client.get(reverse("event-detail", args=[event_id])).status_code == 404
+    assert event_id not in [e["id"] for e in client.get(reverse("event-list")).json()]
+    assert all(e["event"] != event_id for e in client.get(reverse("expense-list")).json())
+    assert client.get(reverse("api_search"), {"q": "taxi"}).json() == []
+    assert client.delete(reverse("delete_event", kwargs={"event_id": event_id})).status_code == 404
+
+    jobs.work(once=True)
+    assert not Event.objects.filter(pk=event_id).exists()
+    assert not Participant.objects.filter(event_id=event_id).exists()
+    assert not Expense.split_between.through.objects.filter(expense__event_id=event_id).exists()
+    assert Expense.objects.filter(event=other).count() == 3
+
+
+@pytest.mark.django_db
+def test_purge_in_small_chunks_respects_foreign_keys():
+    """Chunked purges delete every dependent row for both participants and events."""
+    from expenses.deletion import purge_event, purge_participant
+    from expenses.models import Event, Expense, Settlement
+
+    event, people = seed_event(participants=4, expenses=25)
+    Settlement.objects.create(event=event, from_participant=people[1], to_participant=people[0], amount=3)
+    counts = purge_participant(people[0].pk, chunk_size=4)
+    # P0 is in every split (25 rows) and paid 7 expenses whose other split rows (P1) go too
+    assert counts == {"splits": 25 + 7, "settlements": 1, "expenses": 7, "participant": 1}
+    assert Expense.objects.filter(event=event).count() == 18
+    counts = purge_event(event.pk, chunk_size=4)
+    assert counts["expenses"] == 18 and counts["participants"] == 3 and counts["event"] == 1
+    assert not Event.objects.filter(pk=event.pk).exists()
+
+
+@pytest.mark.django_db
+def test_closed_event_served_from_snapshot_and_read_only(client, django_assert_num_queries):
+    """Closing freezes an event: reads are one-row snapshot fetches, writes get 409 until reopened."""
+    from django.test import Client
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    urls = [reverse(name, args=[event_id]) for name in ("event-detail", "event-balance", "event-settlement")]
+    before = [client.get(url).content for url in urls]
+
+    assert client.post(reverse("event-close", args=[event_id])).status_code == 200
+    anonymous = Client()
+    for url, expected in zip(urls, before):
+        with django_assert_num_queries(1):
+            r = anonymous.get(url)
+        assert r.content == expected
+
+    expense = {"description": "Late", "amount": 5, "payer": a, "event": event_id}
+    r = client.post(reverse("expense-list"), data=json.dumps(expense), content_type="application/json")
+    assert r.status_code == 409
+    r = client.post(reverse("event-add-participant", args=[event_id]), data=json.dumps({"name": "D"}),
+                    content_type="application/json")
+    assert r.status_code == 409
+    assert client.delete(reverse("delete_participant", args=[a])).status_code == 409
+    assert client.post(reverse("event-close", args=[event_id])).status_code == 409
+
+    assert client.post(reverse("event-reopen", args=[event_id])).status_code == 200
+    r = client.post(reverse("expense-list"), data=json.dumps(expense), content_type="application/json")
+    assert r.status_code == 201
+    assert len(client.get(urls[0]).json()["expenses"]) == 5
+
+
+@pytest.mark.django_db
+def test_archived_event_served_read_only_and_restored_on_write(client):
+    """Inactive events leave the hot tables but keep serving reads; the first write restores them."""
+    from datetime import timedelta
+    from io import StringIO
+
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from expenses.models import Event, EventArchive, EventSnapshot, Expense, Participant
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    recent_id = client.post(reverse("event-list"), data=json.dumps({"title": "Recent"}),
+                            content_type="application/json").json()["id"]
+    old = timezone.now() - timedelta(days=400)
+    Event.objects.filter(pk=event_id).update(created_at=old)
+    Expense.objects.filter(event_id=event_id).update(created_at=old)
+    Participant.objects.filter(event_id=event_id).update(created_at=old)
+    urls = [reverse(name, args=[event_id]) for name in ("event-detail", "event-balance", "event-settlement")]
+    before = [client.get(url).json() for url in urls]
+    listed = client.get(reverse("event-list")).json()
+
+    call_command("archive_events", days=365, batch_size=1, stdout=StringIO())
+    assert list(Event.objects.exclude(archived_at=None).values_list("pk", flat=True)) == [event_id]
+    assert not Participant.objects.filter(event_id=event_id).exists()
+    assert not Expense.objects.filter(event_id=event_id).exists()
+    assert [client.get(url).json() for url in urls] == before
+    assert client.get(reverse("event-list")).json() == listed
+    net = client.get(reverse("event-net"), {"events": f"{event_id},{recent_id}"}).json()
+    assert {row["email"]: row["balance"] for row in net["balance"]} == {
+        "a@example.com": 170.0, "b@example.com": -130.0, "c@example.com": -40.0,
+    }
+
+    for invalid in ({"payer": 999999}, {"split_between_ids": [a, 999999]}, {"amount": -5}, {"payer": None}):
+        expense = {"description": "Late", "amount": 30, "payer": b, "event": event_id, "split_between_ids": [a, b, c]}
+        expense.update(invalid)
+        r = client.post(reverse("expense-list"), data=json.dumps(expense), content_type="application/json")
+        assert r.status_code == 400
+    assert Event.objects.get(pk=event_id).archived_at is not None
+
+    expense = {"description": "Late", "amount": 30, "payer": b, "event": event_id, "split_between_ids": [a, b, c]}
+    r = client.post(reverse("expense-list"), data=json.dumps(expense), content_type="application/json")
+    assert r.status_code == 201
+    assert Event.objects.get(pk=event_id).archived_at is None
+    assert not EventArchive.objects.exists() and not EventSnapshot.objects.exists()
+    assert Participant.objects.filter(event_id=event_id, created_at=old).count() == 3
+    assert client.get(urls[1]).json() == {str(a): 160.0, str(b): -110.0, str(c): -50.0}
+    assert len(client.get(urls[0]).json()["expenses"]) == 5
+
+
+@pytest.mark.django_db
+def test_participant_share_link_without_session(client, django_assert_num_queries):
+    """A participant's token link serves its event without session/CSRF; resolution is cached until deletion."""
+    from django.test import Client
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    assert Client().get(reverse("participant-share", args=[b])).status_code in (401, 403)
+    share = client.get(reverse("participant-share", args=[b])).json()
+    assert share["url"].endswith(f"/api/p/{share['token']}/") and share["can_add_expenses"] is False
+
+    stranger = Client(enforce_csrf_checks=True)
+    r = stranger.get(share["url"])
+    assert r.status_code == 200
+    assert r.json()["participant"] == {"id": b, "name": "B"} and r.json()["event"]["id"] == event_id
+    stranger.get(reverse("token_balance", args=[share["token"]]))
+    with django_assert_num_queries(2):  # stav události a ledger; token je v cache
+        balance = stranger.get(reverse("token_balance", args=[share["token"]])).json()
+    assert balance == {str(a): 170.0, str(b): -130.0, str(c): -40.0}
+
+    add = reverse("token_add_expense", args=[share["token"]])
+    expense = {"description": "Snacks", "amount": 30, "split_between_ids": [a, b, c]}
+    assert stranger.post(add, data=json.dumps(expense), content_type="application/json").status_code == 403
+    jpost_csrf(client, "participant-share", {"can_add_expenses": True}, {"pk": b})
+    for payer in (a, str(a), None):
+        r = stranger.post(add, data=json.dumps(dict(expense, payer=payer)), content_type="application/json")
+        assert r.status_code == 403
+    r = stranger.post(add, data=json.dumps(dict(expense, payer=b)), content_type="application/json")
+    assert r.status_code == 201 and r.json()["payer"]["id"] == b
+    r = stranger.post(add, data=json.dumps(expense), content_type="application/json")
+    assert r.status_code == 201 and r.json()["payer"]["id"] == b
+    assert stranger.get(reverse("token_settlement", args=[share["token"]])).status_code == 200
+
+    assert client.delete(reverse("delete_participant", args=[b])).status_code == 204
+    assert stranger.get(share["url"]).status_code == 404
+
+
+@pytest.mark.django_db
+def test_idempotency_key_replays_first_response(client):
+    """Retries with the same Idempotency-Key replay the stored response instead of creating duplicates."""
+    from expenses.models import Expense
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    payload = {"description": "Retry", "amount": 12, "payer": a, "event": event_id, "split_between_ids": [a, b]}
+
+    def post(body, key="k-1"):
+        return client.post(reverse("expense-list"), data=json.dumps(body), content_type="application/json",
+                           HTTP_IDEMPOTENCY_KEY=key)
+
+    first, second = post(payload), post(payload)
+    assert first.status_code == second.status_code == 201
+    assert second["Idempotent-Replayed"] == "true" and second.json() == first.json()
+    assert Expense.objects.filter(description="Retry").count() == 1
+    assert post(dict(payload, amount=13)).status_code == 422
+
+    # Failed requests release the key so a corrected retry executes
+    assert post(dict(payload, amount=-1), key="k-2").status_code == 400
+    assert post(payload, key="k-2").status_code == 201
+    assert Expense.objects.filter(description="Retry").count() == 2
+
+    r = client.post(reverse("event-add-participant", args=[event_id]), data=json.dumps({"name": "D"}),
+                    content_type="application/json", HTTP_IDEMPOTENCY_KEY="p-1")
+    r2 = client.post(reverse("event-add-participant", args=[event_id]), data=json.dumps({"name": "D"}),
+                     content_type="application/json", HTTP_IDEMPOTENCY_KEY="p-1")
+    assert r.json() == r2.json()
+
+
+@pytest.mark.django_db
+def test_idempotency_concurrent_duplicate_and_purge(client):
+    """A duplicate arriving while the first request holds the lock gets 409; expired keys are purged in bulk."""
+    import hashlib
+    from datetime import timedelta
+    from django.utils import timezone
+    from django.test import Client
+    from expenses.idempotency import purge_expired, request_digest
+    from expenses.models import IdempotencyKey
+
+    login_user(client)
+    body = {"title": "Trip", "description": "X"}
+    request_hash = request_digest(body)
+    user_id = User.objects.get(username="luke").pk
+    IdempotencyKey.objects.create(
+        scope=f"{user_id}:POST:{reverse('event-list')}", key="busy", request_hash=request_hash,
+        locked_until=timezone.now() + timedelta(seconds=30), expires_at=timezone.now() + timedelta(hours=1),
+    )
+    r = client.post(reverse("event-list"), data=json.dumps(body), content_type="application/json",
+                    HTTP_IDEMPOTENCY_KEY="busy")
+    assert r.status_code == 409
+
+    IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+    assert purge_expired(chunk_size=1) == 1
+    assert not IdempotencyKey.objects.exists()
+
+    # Tělo registrace obsahuje heslo: uložený otisk je HMAC, ne prostý hash, který by šel hádat offline
+    signup = {"username": "leia", "password": "hunter2"}
+    r = client.post(reverse("api_signup"), data=json.dumps(signup), content_type="application/json",
+                    HTTP_IDEMPOTENCY_KEY="s-1")
+    assert r.status_code == 201
+    stored = IdempotencyKey.objects.get(key="s-1").request_hash
+    assert stored != hashlib.sha256(json.dumps(signup, sort_keys=True).encode()).hexdigest()
+
+    # Anonymní klienti nesdílejí prostor klíčů: cizí klient se stejným klíčem nedostane uloženou odpověď
+    signup = {"username": "han", "password": "solo"}
+    first, other = Client(REMOTE_ADDR="10.0.0.1"), Client(REMOTE_ADDR="10.0.0.2")
+    post = lambda c: c.post(reverse("api_signup"), data=json.dumps(signup), content_type="application/json",
+                            HTTP_IDEMPOTENCY_KEY="same")
+    assert post(first).status_code == 201
+    assert post(first)["Idempotent-Replayed"] == "true"
+    r = post(other)
+    assert r.status_code == 400 and "Idempotent-Replayed" not in r
+
+
+@pytest.mark.django_db
+def test_login_throttled_per_username_and_ip(client, settings):
+    """Repeated logins for one username get 429 with Retry-After; other usernames are limited per IP."""
+    settings.AUTH_THROTTLE_RATES = {"auth_ip": "5/min", "auth_username": "2/min"}
+    User.objects.create_user("luke", password="secret")
+    codes = [jpost(client, "api_login", {"username": "luke", "password": "wrong"}).status_code for _ in range(3)]
+    assert codes == [401, 401, 429]
+    r = jpost(client, "api_login", {"username": "LUKE", "password": "secret"})
+    assert r.status_code == 429 and int(r["Retry-After"]) > 0
+    assert jpost(client, "api_login", {"username": "leia", "password": "x"}).status_code == 401
+    assert jpost(client, "api_login", {"username": "han", "password": "x"}).status_code == 429
+    # Podvržená X-Forwarded-For hlavička limit pro IP neobejde
+    r = client.post(reverse("api_login"), data=json.dumps({"username": "chewie", "password": "x"}),
+                    content_type="application/json", HTTP_X_FORWARDED_FOR="203.0.113.7")
+    assert r.status_code == 429
+
+
+@pytest.mark.django_db
+def test_password_hashing_pool_saturated_returns_503(client, monkeypatch):
+    """When every hashing slot is taken, login fails fast with 503 instead of queueing unboundedly."""
+    import threading
+    from expenses import hashing
+
+    User.objects.create_user("luke", password="secret")
+    executor = hashing.BoundedExecutor(workers=1, queue=0, timeout=0.05)
+    monkeypatch.setattr(hashing, "_executor", executor)
+    monkeypatch.setattr(hashing, "_executor_pid", __import__("os").getpid())
+    release = threading.Event()
+    blocker = threading.Thread(target=executor.run, args=(release.wait,))
+    blocker.start()
+    try:
+        r = jpost(client, "api_login", {"username": "luke", "password": "secret"})
+        assert r.status_code == 503
+    finally:
+        release.set()
+        blocker.join()
+    assert jpost(client, "api_login", {"username": "luke", "password": "secret"}).status_code == 200
+
+
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix, tmp_path_factory):
+    """Add a "replica" alias: a second SQLite file standing in for a read replica.
+
+    A SQLite primary is moved from the shared-cache in-memory database, which locks whole tables and fails
+    concurrent clients with "database table is locked", to a WAL file where writers wait for each other.
+    """
+    import copy
+    from django.db import connections
+
+    primary = connections.settings["default"]
+    if primary["ENGINE"] == "django.db.backends.sqlite3":
+        primary["TEST"]["NAME"] = str(tmp_path_factory.mktemp("primary") / "primary.sqlite3")
+        primary["OPTIONS"] = {
+            **primary.get("OPTIONS", {}),
+            "timeout": 30,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": "PRAGMA journal_mode=WAL;",
+        }
+    path = tmp_path_factory.mktemp("replica") / "replica.sqlite3"
+    config = copy.deepcopy(connections.settings["default"])
+    config.update(ENGINE="django.db.backends.sqlite3", NAME=str(path), OPTIONS={})
+    config["TEST"].update(NAME=str(path), MIRROR=None)
+    connections.settings["replica"] = config
+
+
+@pytest.mark.django_db(databases=["default", "replica"])
+def test_safe_requests_read_from_replica_until_client_writes(client, settings):
+    """GETs hit the replica; after a write the client reads the primary for the stickiness window."""
+    import time
+    from expenses.db_router import PIN_COOKIE
+    from expenses.models import Event
+
+    settings.DATABASE_REPLICAS = ["replica"]
+    settings.DATABASE_REPLICA_STICKINESS = 30
+    login_user(client)
+    Event.objects.using("replica").create(title="Replica copy")
+    Event.objects.create(title="Primary only")
+
+    titles = lambda: [e["title"] for e in client.get(reverse("event-list")).json()]
+    assert titles() == ["Replica copy"]
+
+    r = client.post(reverse("event-list"), data=json.dumps({"title": "Fresh"}), content_type="application/json")
+    assert r.status_code == 201
+    assert r.cookies[PIN_COOKIE]["max-age"] == 30
+    assert sorted(titles()) == ["Fresh", "Primary only"]
+    assert client.get(reverse("api_me")).json()["authenticated"] is True
+
+    client.cookies[PIN_COOKIE] = str(time.time() - 1)
+    assert titles() == ["Replica copy"]
+    assert not Event.objects.using("replica").filter(title="Fresh").exists()
+
+
+@pytest.mark.django_db(databases=["default", "replica"])
+def test_function_view_writes_pin_client_to_primary(client, settings):
+    """Writes through function views (not the viewsets) set the read-your-writes cookie too."""
+    from expenses.db_router import PIN_COOKIE
+    from expenses.models import Event, Participant
+
+    settings.DATABASE_REPLICAS = ["replica"]
+    login_user(client)
+    event = Event.objects.create(title="Trip")
+    participant = Participant.objects.create(event=event, name="Ann")
+
+    r = client.delete(reverse("delete_participant", args=[participant.pk]))
+    assert r.status_code == 204
+    assert PIN_COOKIE in r.cookies
+    r = client.get(reverse("api_me"))
+    assert PIN_COOKIE not in r.cookies
+    r = client.delete(reverse("delete_event", args=[999999]))
+    assert r.status_code == 404 and PIN_COOKIE not in r.cookies
+
+
+@pytest.mark.django_db
+def test_preview_matches_real_change_without_writing(client, django_assert_max_num_queries):
+    """Previewing a new expense or an edit predicts the balances/settlement a real save produces; nothing is written."""
+    from django.test import Client
+    from expenses.models import Expense, Participant
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    hotel = Expense.objects.get(event_id=event_id, description="Hotel").pk
+    url = reverse("event-preview", args=[event_id])
+    anonymous = Client()
+    preview = lambda body: anonymous.post(url, data=json.dumps(body), content_type="application/json")
+    assert client.get(reverse("event-balance", args=[event_id])).json() == {str(a): 170.0, str(b): -130.0, str(c): -40.0}
+    ledger = list(Participant.objects.filter(event_id=event_id).values_list("balance_micros", flat=True))
+
+    r = preview({"amount": "60.00", "payer": c, "split_between_ids": [a, b]})
+    assert r.status_code == 200
+    assert r.json()["before"]["balance"] == {str(a): 170.0, str(b): -130.0, str(c): -40.0}
+    assert r.json()["after"]["balance"] == {str(a): 140.0, str(b): -160.0, str(c): 20.0}
+    assert r.json()["after"]["settlement"] == [{"from": "B", "to": "A", "amount": 140.0}, {"from": "B", "to": "C", "amount": 20.0}]
+
+    with django_assert_max_num_queries(3):  # událost, ledger, upravovaný výdaj
+        edit = preview({"expense": hotel, "amount": "150.00", "split_between_ids": []})
+    assert Expense.objects.get(pk=hotel).amount == 300
+    assert list(Participant.objects.filter(event_id=event_id).values_list("balance_micros", flat=True)) == ledger
+    r = client.patch(reverse("expense-detail", args=[hotel]), data=json.dumps({"amount": "150.00", "split_between_ids": []}),
+                     content_type="application/json")
+    assert r.status_code == 200
+    assert client.get(reverse("event-balance", args=[event_id])).json() == edit.json()["after"]["balance"]
+    assert client.get(reverse("event-settlement", args=[event_id])).json() == edit.json()["after"]["settlement"]
+
+    assert preview({"expense": hotel, "delete": True}).json()["after"]["balance"] == {str(a): -30.0, str(b): -30.0, str(c): 60.0}
+    assert preview({"amount": "10", "payer": 999999}).status_code == 400
+    assert preview({"payer": a}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_stale_expense_writes_get_409_and_ledger_matches_replay(client):
+    """Edits carry the expense version (409 when stale); the F()-maintained ledger equals a full recomputation."""
+    from decimal import Decimal
+    from expenses.ledger import replay
+    from expenses.models import Expense, Participant
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    hotel = Expense.objects.get(event_id=event_id, description="Hotel").pk
+    url = reverse("expense-detail", args=[hotel])
+    r = client.patch(url, data=json.dumps({"amount": "301.00", "version": 0}), content_type="application/json")
+    assert r.status_code == 200 and r.json()["version"] == 1
+    r = client.patch(url, data=json.dumps({"amount": "302.00"}), content_type="application/json", HTTP_IF_MATCH='"0"')
+    assert r.status_code == 409
+    assert client.delete(f"{url}?version=0").status_code == 409
+    assert Expense.objects.get(pk=hotel).amount == Decimal("301.00")
+
+    # Zápisy přes ORM: změny rozdělení, nový účastník u výdaje „pro všechny“, kaskádové mazání
+    d = Participant.objects.create(event_id=event_id, name="D")
+    dinner = Expense.objects.get(event_id=event_id, description="Dinner")
+    dinner.split_between.add(a, d)
+    dinner.split_between.clear()
+    Participant.objects.get(pk=b).delete()
+    assert client.delete(f"{url}?version=1").status_code == 204
+
+    stored = dict(Participant.objects.filter(event_id=event_id).values_list("pk", "balance_micros"))
+    assert stored == replay([event_id]) and sum(stored.values()) == 0
+    # Dinner 90 a Museum 20 (jeho jediný dlužník B zmizel) se dělí mezi A, C, D; zbytek mikrojednotek dostanou nižší id
+    assert stored == {a: -16_666_667, c: 53_333_333, d.pk: -36_666_666}
+
+
+@pytest.mark.django_db
+def test_orm_event_delete_skips_ledger_work(client, django_assert_max_num_queries):
+    """Deleting an event through the ORM (admin) cascades without per-expense or per-participant ledger updates."""
+    from expenses.models import Event, Expense, Participant
+
+    event_id, _ = make_event_with_expenses(client)
+    for i in range(20):
+        Participant.objects.create(event_id=event_id, name=f"Extra {i}")
+    event = Event.objects.get(pk=event_id)
+    with django_assert_max_num_queries(20):
+        event.delete()
+    assert not Participant.objects.filter(event_id=event_id).exists()
+    assert not Expense.objects.filter(event_id=event_id).exists()
+
+
+@pytest.mark.django_db
+def test_resplit_changes_only_old_and_new_split_members(client):
+    """A disjoint re-split writes one delta to the payer and the old and new members, never to the others."""
+    import re
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from expenses.ledger import replay
+    from expenses.models import Event, Participant
+
+    login_user(client)
+    event = Event.objects.create(title="Six")
+    people = [Participant.objects.create(event=event, name=f"P{i}").pk for i in range(6)]
+    body = {"description": "Taxi", "amount": "30", "payer": people[0], "event": event.pk,
+            "split_between_ids": people[:2]}
+    expense = client.post(reverse("expense-list"), data=json.dumps(body), content_type="application/json").json()
+
+    with CaptureQueriesContext(connection) as queries:
+        r = client.patch(reverse("expense-detail", args=[expense["id"]]),
+                         data=json.dumps({"split_between_ids": [people[2]]}), content_type="application/json")
+    assert r.status_code == 200
+    touched = [
+        int(pk) for query in queries if query["sql"].startswith('UPDATE "expenses_participant"')
+        for pk in re.findall(r'"id" = (\d+)', query["sql"])
+    ]
+    assert sorted(touched) == people[:3]
+    stored = dict(Participant.objects.filter(event=event).values_list("pk", "balance_micros"))
+    assert stored == replay([event.pk]) and stored[people[2]] == -30_000_000
+
+
+@pytest.mark.django_db
+def test_interleaved_expense_writes_keep_ledger_exact():
+    """Interleaved creates, edits, re-splits and deletes from several clients keep balances equal to replay()."""
+    import random
+    from django.test import Client
+    from expenses.ledger import replay
+    from expenses.models import Event, Expense, Participant
+
+    user = User.objects.create_user("mixer", password="secret")
+    event = Event.objects.create(title="Mixed")
+    people = [Participant.objects.create(event=event, name=f"P{i}").pk for i in range(6)]
+    clients = []
+    for _ in range(3):
+        clients.append(Client())
+        clients[-1].force_login(user)
+    rnd = random.Random(7)
+    created = {}  # id -> version
+
+    def split():
+        # Prázdný split znamená „všichni“
+        return rnd.sample(people, rnd.randint(1, len(people))) if rnd.random() < 0.8 else []
+
+    for step in range(120):
+        client = rnd.choice(clients)
+        op = rnd.choice(["create", "create", "edit", "resplit", "delete", "join", "leave"]) if created else "create"
+        if op == "create":
+            body = {"description": f"E{step}", "amount": f"{rnd.randint(1, 99999) / 100:.2f}",
+                    "payer": rnd.choice(people), "event": event.pk, "split_between_ids": split()}
+            r = client.post(reverse("expense-list"), data=json.dumps(body), content_type="application/json")
+            assert r.status_code == 201, r.content
+            created[r.json()["id"]] = r.json()["version"]
+        elif op in ("edit", "resplit"):
+            expense_id = rnd.choice(sorted(created))
+            body = {"version": created[expense_id]}
+            if op == "edit":
+                body.update(amount=f"{rnd.randint(1, 99999) / 100:.2f}", payer=rnd.choice(people))
+            else:
+                body.update(split_between_ids=split())
+            r = client.patch(reverse("expense-detail", args=[expense_id]), data=json.dumps(body),
+                             content_type="application/json")
+            assert r.status_code == 200, r.content
+            created[expense_id] = r.json()["version"]
+        elif op == "delete":
+            expense_id = rnd.choice(sorted(created))
+            assert client.delete(reverse("expense-detail", args=[expense_id])).status_code == 204
+            del created[expense_id]
+        elif op == "join":
+            r = client.post(reverse("event-add-participant", args=[event.pk]), data=json.dumps({"name": f"J{step}"}),
+                            content_type="application/json")
+            assert r.status_code == 201, r.content
+            people.append(r.json()["id"])
+        elif len(people) > 2:
+            leaving = people.pop(rnd.randrange(len(people)))
+            assert client.delete(reverse("delete_participant", args=[leaving])).status_code == 204
+            remaining = set(Expense.objects.filter(event=event).values_list("pk", flat=True))
+            created = {pk: version for pk, version in created.items() if pk in remaining}
+        stored = dict(Participant.objects.filter(event=event).values_list("pk", "balance_micros"))
+        assert stored == replay([event.pk]), (step, op)
+    assert sum(stored.values()) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_expense_writes_keep_ledger_exact():
+    """Many threads writing expenses of one event keep balances exact and lose no edit (scaling: loadtest)."""
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import connection, connections
+    from django.test import Client
+    from expenses.ledger import replay
+    from expenses.models import Event, Participant
+
+    # Bez zámků řádků (SQLite) běží stejný scénář v jednom vlákně, aby se ověřila aspoň přesnost a verze
+    threads = 8 if connection.features.has_select_for_update else 1
+    user = User.objects.create_user("stress", password="secret")
+    event = Event.objects.create(title="Live")
+    people = [Participant.objects.create(event=event, name=f"P{i}").pk for i in range(12)]
+
+    def worker(seed, count):
+        client = Client()
+        client.force_login(user)
+        rnd = random.Random(seed)
+        try:
+            for i in range(count):
+                body = {"description": f"{seed}-{i}", "amount": f"{rnd.randint(100, 9999) / 100:.2f}",
+                        "payer": rnd.choice(people), "event": event.pk, "split_between_ids": rnd.sample(people, 3)}
+                r = client.post(reverse("expense-list"), data=json.dumps(body), content_type="application/json")
+                assert r.status_code == 201, r.content
+                if i % 3 == 0:
+                    edit = {"amount": "12.34", "version": r.json()["version"]}
+                    r = client.patch(reverse("expense-detail", args=[r.json()["id"]]), data=json.dumps(edit),
+                                     content_type="application/json")
+                    assert r.status_code == 200, r.content
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda seed: worker(seed, 24), range(8)))
+    stored = dict(Participant.objects.filter(event=event).values_list("pk", "balance_micros"))
+    assert stored == replay([event.pk]) and sum(stored.values()) == 0
+
+    # Souběžné úpravy téhož výdaje ze stejné verze: projde právě jedna
+    first = Client()
+    first.force_login(user)
+    expense = first.get(reverse("expense-list")).json()[0]
+
+    def edit(amount):
+        client = Client()
+        client.force_login(user)
+        try:
+            body = {"amount": f"{amount}.00", "version": expense["version"]}
+            return client.patch(reverse("expense-detail", args=[expense["id"]]), data=json.dumps(body),
+                                content_type="application/json").status_code
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(threads) as pool:
+        codes = sorted(pool.map(edit, range(1, 9)))
+    assert codes == [200] + [409] * 7
+
+
+@pytest.mark.django_db
+def test_foreign_currency_expenses_convert_into_event_balances(client, tmp_path):
+    """Expenses in another currency are converted with loaded FX rates; reloading rates rebuilds the balances."""
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from expenses.ledger import replay
+    from expenses.models import Participant
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    balance_url = reverse("event-balance", args=[event_id])
+    with CaptureQueriesContext(connection) as single:
+        client.get(balance_url)
+    body = {"description": "Ferry", "amount": "10.00", "currency": "usd", "payer": a, "event": event_id,
+            "split_between_ids": [b]}
+    r = client.post(reverse("expense-list"), data=json.dumps(body), content_type="application/json")
+    assert r.status_code == 400 and "currency" in r.json()
+
+    rates = tmp_path / "rates.csv"
+    rates.write_text("currency,rate\n# za 1 EUR\nUSD,1.25\nCZK,25\n")
+    call_command("load_fx_rates", str(rates))
+    r = client.post(reverse("expense-list"), data=json.dumps(body), content_type="application/json")
+    assert r.status_code == 201 and r.json()["currency"] == "USD"
+    assert client.get(reverse("event-detail", args=[event_id])).json()["currency"] == "CZK"
+
+    # 10 USD = 8 EUR = 200 CZK; čtení zůstatku stojí stejně jako u jednoměnové události
+    with CaptureQueriesContext(connection) as mixed:
+        balance = client.get(balance_url).json()
+    assert len(mixed) == len(single)
+    assert balance == {str(a): 370.0, str(b): -330.0, str(c): -40.0}
+    statement = client.get(reverse("participant-statement", args=[b])).json()["results"]
+    assert statement[-1]["currency"] == "USD" and statement[-1]["balance"] == -330.0
+
+    (tmp_path / "rates.json").write_text('{"base": "EUR", "rates": {"USD": 1.0, "CZK": 25}}')
+    call_command("load_fx_rates", str(tmp_path / "rates.json"))
+    assert client.get(balance_url).json()[str(b)] == -380.0
+    stored = dict(Participant.objects.filter(event_id=event_id).values_list("pk", "balance_micros"))
+    assert stored == replay([event_id]) and sum(stored.values()) == 0
+
+
+@pytest.mark.django_db
+def test_bulk_update_recategorizes_and_resplits_in_constant_queries(client):
+    """Bulk edits re-categorize and re-split set-wise, bump versions, rebuild the ledger once, in O(1) queries."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from expenses.ledger import replay
+    from expenses.models import Category, Event, Expense, Participant
+
+    event_id, (a, b, c) = make_event_with_expenses(client)
+    food = Category.objects.create(name="Food")
+    expenses = dict(Expense.objects.filter(event_id=event_id).values_list("description", "pk"))
+    url = reverse("expense-bulk-update")
+
+    def post(payload):
+        return client.post(url, data=json.dumps(payload), content_type="application/json")
+
+    picked = [expenses["Hotel"], expenses["Taxi"], expenses["Museum"]]
+    changes = {"category": food.pk, "split_between_ids": [a, c]}
+    assert post({"ids": picked, "changes": changes, "versions": {str(expenses["Hotel"]): 5}}).status_code == 409
+    with CaptureQueriesContext(connection) as few:
+        r = post({"ids": picked, "changes": changes, "versions": {str(expenses["Hotel"]): 0}})
+    assert r.status_code == 200 and r.json() == {"updated": 3, "ids": sorted(picked), "events": [event_id]}
+    rows = Expense.objects.filter(pk__in=picked)
+    assert {(e.category_id, e.version, tuple(sorted(e.split_between.values_list("pk", flat=True)))) for e in rows} == {
+        (food.pk, 1, (a, c))
+    }
+    assert client.get(reverse("event-balance", args=[event_id])).json() == {str(a): 110.0, str(b): 10.0, str(c): -120.0}
+
+    # Dvacetkrát víc výdajů, stejný počet dotazů
+    for i in range(20):
+        client.post(reverse("expense-list"), data=json.dumps(
+            {"description": f"Snack {i}", "amount": "3.00", "payer": b, "event": event_id, "split_between_ids": [b]}
+        ), content_type="application/json")
+    many = list(Expense.objects.filter(event_id=event_id).values_list("pk", flat=True))
+    with CaptureQueriesContext(connection) as lots:
+        r = post({"ids": many, "changes": {"split_between_ids": [], "payer": a}})
+    assert r.status_code == 200 and r.json()["updated"] == 24
+    assert len(lots) == len(few)
+    stored = dict(Participant.objects.filter(event_id=event_id).values_list("pk", "balance_micros"))
+    assert stored == replay([event_id]) and sum(stored.values()) == 0
+
+    r = post({"filter": {"event": event_id, "description": "snack"}, "changes": {"category": None}})
+    assert r.status_code == 200 and r.json()["updated"] == 20
+    elsewhere = Event.objects.create(title="Other")
+    stranger = Participant.objects.create(event=elsewhere, name="X")
+    foreign = Expense.objects.create(description="Boat", amount=5, payer=stranger, event=elsewhere).pk
+    assert post({"ids": [*many, foreign], "changes": {"payer": b}}).status_code == 400
+    r = post({"ids": [*many, foreign], "changes": {"category": food.pk}})
+    assert r.json()["events"] == [event_id, elsewhere.pk]
+    assert post({"ids": many, "changes": {}}).status_code == 400
+    assert jpost_csrf(client, "event-close", url_kwargs={"pk": event_id}).status_code == 200
+    assert post({"filter": {"event": event_id}, "changes": {"category": None}}).status_code == 409
+
+
+@pytest.mark.django_db
+def test_bulk_update_rejects_more_than_the_limit(client, settings):
+    """Over EXPENSE_BULK_UPDATE_MAX ids fail validation; a filter locks at most one row past the limit."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from expenses.models import Expense
+
+    settings.EXPENSE_BULK_UPDATE_MAX = 2
+    event_id, _ = make_event_with_expenses(client)
+    ids = list(Expense.objects.filter(event_id=event_id).values_list("pk", flat=True))
+    url = reverse("expense-bulk-update")
+
+    def post(payload):
+        return client.post(url, data=json.dumps(payload), content_type="application/json")
+
+    r = post({"ids": ids[:3], "changes": {"category": None}})
+    assert r.status_code == 400 and "ids" in r.json()
+    with CaptureQueriesContext(connection) as queries:
+        assert post({"filter": {"event": event_id}, "changes": {"category": None}}).status_code == 400
+    assert any("LIMIT 3" in query["sql"] for query in queries)
+    assert post({"ids": ids[:2], "changes": {"category": None}}).status_code == 200
+
+
+@pytest.mark.django_db
+def test_net_balances_across_events_by_email(client, django_assert_max_num_queries):
+    """Events sharing members (matched by e-mail) are netted into one balance vector and settlement plan."""
+    from django.test import Client
+    from expenses.models import Event, Expense, Participant
+
+    first, (a, b, c) = make_event_with_expenses(client)
+    second = Event.objects.create(title="Weekend")
+    a2 = Participant.objects.create(event=second, name="Alice", email="A@Example.com ")
+    b2 = Participant.objects.create(event=second, name="B", email="b@example.com")
+    d = Participant.objects.create(event=second, name="D")
+    expense = Expense.objects.create(event=second, payer=b2, description="Cabin", amount=90)
+    expense.split_between.set([a2, b2, d])
+
+    anonymous = Client()
+    with django_assert_max_num_queries(4):
+        r = anonymous.get(reverse("event-net"), {"events": f"{first},{second.pk},999999"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["events"] == [first, second.pk]
+    assert [(row["name"], row["email"], row["participants"], row["balance"]) for row in data["balance"]] == [
+        ("A", "a@example.com", [a, a2.pk], 140.0),
+        ("B", "b@example.com", [b, b2.pk], -70.0),
+        ("C", "c@example.com", [c], -40.0),
+        ("D", "", [d.pk], -30.0),
+    ]
+    assert data["settlement"] == [
+        {"from": "B", "to": "A", "amount": 70.0},
+        {"from": "C", "to": "A", "amount": 40.0},
+        {"from": "D", "to": "A", "amount": 30.0},
+    ]
+    assert anonymous.get(reverse("event-net"), {"events": "x"}).status_code == 400
+    assert anonymous.get(reverse("event-net")).status_code == 400
+
+
+@pytest.mark.django_db
+def test_net_balances_convert_events_into_one_currency(client):
+    """Netting events in different currencies converts every balance into one currency before summing."""
+    from expenses.models import Event, Expense, FxRate, Participant
+
+    FxRate.objects.create(currency="CZK", rate=25)
+    trips = {}
+    for title, currency, amount in (("Prague", "CZK", 100), ("Vienna", "EUR", 4)):
+        event = Event.objects.create(title=title, currency=currency)
+        a = Participant.objects.create(event=event, name="A", email="a@example.com")
+        b = Participant.objects.create(event=event, name="B", email="b@example.com")
+        payer, other = (a, b) if currency == "CZK" else (b, a)
+        Expense.objects.create(event=event, payer=payer, description=title, amount=amount).split_between.set([other])
+        trips[currency] = event.pk
+
+    events = {"events": f"{trips['CZK']},{trips['EUR']}"}
+    data = client.get(reverse("event-net"), events).json()
+    assert data["currency"] == "CZK"
+    assert [row["balance"] for row in data["balance"]] == [0.0, 0.0] and data["settlement"] == []
+    data = client.get(reverse("event-net"), {"events": str(trips["CZK"])}).json()
+    assert data["currency"] == "CZK" and [row["balance"] for row in data["balance"]] == [100.0, -100.0]
+    data = client.get(reverse("event-net"), {**events, "currency": "eur"}).json()
+    assert data["currency"] == "EUR" and [row["balance"] for row in data["balance"]] == [0.0, 0.0]
+    assert client.get(reverse("event-net"), {**events, "currency": "USD"}).status_code == 400
+    assert client.get(reverse("event-net"), {**events, "currency": "euro"}).status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("server", ["wsgi", "asgi"])
+def test_loadtest_command_reports_percentiles(server, tmp_path):
+    """loadtest drives the in-process app, writes per-endpoint stats as JSON and removes its seeded data."""
+    from io import StringIO
+
+    from django.core.management import call_command
+    from expenses.models import Event
+
+    output = tmp_path / "results.json"
+    call_command(
+        "loadtest", "--server", server, "--clients", "3", "--requests", "30", "--events", "2",
+        "--participants", "3", "--expenses", "5", "--output", str(output), stdout=StringIO(),
+    )
+    results = json.loads(output.read_text())
+    assert results["total"]["requests"] == 30 and results["total"]["errors"] == 0
+    assert set(results["endpoints"]) == {"event_list", "event_detail", "balance", "settlement", "expense_create"}
+    for stats in results["endpoints"].values():
+        if stats["requests"]:
+            assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+    assert not Event.objects.exists() and not User.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_loadtest_falls_back_to_shared_loopback_when_binding_fails(monkeypatch, tmp_path):
+    """Where per-client source addresses cannot be bound (e.g. macOS), WSGI clients connect from 127.0.0.1."""
+    from io import StringIO
+
+    from django.core.management import call_command
+    from expenses.management.commands import loadtest
+
+    # 192.0.2.0/24 (TEST-NET-1) není přiřazená žádnému rozhraní, bind selže
+    monkeypatch.setattr(loadtest, "client_address", lambda index: f"192.0.2.{index + 1}")
+    output, stderr = tmp_path / "results.json", StringIO()
+    call_command(
+        "loadtest", "--clients", "2", "--requests", "6", "--events", "1", "--participants", "2", "--expenses", "2",
+        "--output", str(output), stdout=StringIO(), stderr=stderr,
+    )
+    assert "clients connected from 127.0.0.1" in stderr.getvalue()
+    assert json.loads(output.read_text())["total"]["errors"] == 0
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_exports_view_latency_and_queries(client):
+    """/metrics exposes per-view/action latency histograms, query counts and event sizes."""
+    from expenses import metrics
+
+    metrics.registry.reset()
+    event_id, _ = make_event_with_expenses(client)
+    for _ in range(2):
+        assert client.get(reverse("event-balance", args=[event_id])).status_code == 200
+    r = client.get(reverse("metrics"))
+    assert r.status_code == 200 and r["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = r.content.decode()
+    assert "# TYPE expenses_http_request_duration_seconds histogram" in text
+    assert 'expenses_http_request_duration_seconds_count{action="balance",view="EventViewSet"} 2' in text
+    assert 'expenses_http_request_duration_seconds_bucket{action="balance",view="EventViewSet",le="+Inf"} 2' in text
+    assert 'expenses_http_requests_total{action="create",method="POST",status="201",view="ExpenseViewSet"} 4' in text
+    assert 'expenses_db_queries_per_request_count{action="balance",view="EventViewSet"} 2' in text
+    assert 'expenses_event_size_bucket{dimension="participants",le="5"} 2' in text
+
+
+@pytest.mark.django_db
+def test_metrics_aggregate_process_snapshots(client, settings, tmp_path):
+    """With METRICS_DIR every process's snapshot file is summed at scrape time; METRICS_TOKEN guards the endpoint."""
+    from expenses import metrics
+
+    metrics.registry.reset()
+    settings.METRICS_DIR = str(tmp_path)
+    settings.METRICS_TOKEN = "s3cret"
+    labels = [["action", "list"], ["method", "GET"], ["status", 200], ["view", "EventViewSet"]]
+    (tmp_path / "999999.json").write_text(json.dumps([["expenses_http_requests_total", labels, 5]]))
+    client.get(reverse("event-list"))
+
+    assert client.get(reverse("metrics")).status_code == 401
+    text = client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret").content.decode()
+    assert 'expenses_http_requests_total{action="list",method="GET",status="200",view="EventViewSet"} 6' in text
+    assert any(path.name != "999999.json" for path in tmp_path.glob("*.json"))
+
+
+def test_metrics_shards_of_finished_threads_are_merged_and_dropped():
+    """Short-lived request threads leave their counts in the registry but not their shards."""
+    import gc
+    import threading
+    from expenses import metrics
+
+    registry = metrics.Registry()
+
+    def record():
+        registry.inc("expenses_cache_requests_total", cache="tokens", result="hit")
+        registry.observe("expenses_db_queries_per_request", 3, view="V", action="a")
+
+    for _ in range(200):
+        thread = threading.Thread(target=record)
+        thread.start()
+        thread.join()
+    gc.collect()
+    assert registry._shards == []
+    snapshot = registry.snapshot()
+    assert snapshot[("expenses_cache_requests_total", (("cache", "tokens"), ("result", "hit")))] == 200
+    assert snapshot[("expenses_db_queries_per_request", (("action", "a"), ("view", "V")))][1:] == [600.0, 200]
+    registry.reset()
+    assert registry.snapshot() == {}
+
+
+@pytest.mark.django_db
+def test_metrics_fold_files_of_exited_workers(settings, tmp_path):
+    """Dead workers' files are folded into one accumulator once; a clean exit folds the process's own snapshot."""
+    from expenses import metrics
+
+    metrics.registry.reset()
+    settings.METRICS_DIR = str(tmp_path)
+    key = ("expenses_http_requests_total", (("view", "EventViewSet"),))
+    for pid in (999997, 999998):
+        (tmp_path / f"{pid}-1.json").write_text(json.dumps([[key[0], [list(key[1][0])], 5]]))
+    metrics.inc(key[0], 1, view="EventViewSet")
+
+    assert metrics.collect()[key] == 11
+    assert metrics.collect()[key] == 11
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == sorted([
+        "dead.json", os.path.basename(metrics.registry._path(str(tmp_path))),
+    ])
+    metrics.registry.retire()
+    assert [path.name for path in tmp_path.glob("*.json")] == ["dead.json"]
+    metrics.registry.reset()
+    assert metrics.collect()[key] == 11
+    metrics.registry.retire()
+
+
+@pytest.mark.parametrize("app", ["wsgi", "asgi"])
+def test_lean_api_profile_skips_deferred_apps_at_startup(app, settings, tmp_path, monkeypatch):
+    """A fresh config.settings_api worker answers its first request without importing the deferred apps."""
+    from expenses.management.commands.startup_profile import measure_startup
+
+    (tmp_path / "lean_test_settings.py").write_text(
+        f"from config.settings_api import *  # noqa\nfrom {settings.SETTINGS_MODULE} import DATABASES  # noqa\n"
+    )
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join(filter(None, [str(tmp_path), os.environ.get("PYTHONPATH")])))
+    result = measure_startup(app, "lean_test_settings")
+    modules = {module for module, _, _ in result["modules"]}
+    assert result["status"] == 200
+    assert f"config.{app}" in modules and "config.settings_api" in modules
+    deferred = ("django_extensions", "django.contrib.staticfiles", "django.contrib.messages.storage.session")
+    assert not [module for module in modules if module.startswith(deferred)]
+
+
+@pytest.mark.parametrize("app", ["wsgi", "asgi"])
+def test_modules_imported_before_first_request_within_budget(app, settings):
+    """A fresh worker imports at most STARTUP_MAX_MODULES modules before answering its first request."""
+    from expenses.management.commands.startup_profile import measure_startup
+
+    result = measure_startup(app)
+    assert result["status"] == 200
+    assert len(result["modules"]) <= settings.STARTUP_MAX_MODULES, (
+        f"{len(result['modules'])} modules; slowest imports: {sorted(result['modules'], key=lambda row: -row[2])[:5]}"
+    )
+
+
+@pytest.mark.skipif(
+    not os.environ.get("EXPENSES_STARTUP_BUDGET"), reason="wall-clock check; opt in with EXPENSES_STARTUP_BUDGET=1"
+)
+@pytest.mark.parametrize("app", ["wsgi", "asgi"])
+def test_time_to_first_request_within_budget(app, settings):
+    """A fresh process importing config.wsgi/config.asgi answers its first request within STARTUP_BUDGET_SECONDS."""
+    from expenses.management.commands.startup_profile import measure_startup
+
+    result = measure_startup(app)
+    assert result["status"] == 200
+    assert any(module == f"config.{app}" for module, _, _ in result["modules"])
+    assert result["first_request"] <= settings.STARTUP_BUDGET_SECONDS, (
+        f"first request after {result['first_request']:.2f} s; slowest imports: "
+        f"{sorted(result['modules'], key=lambda row: -row[1])[:5]}"
+    )
+
+
+def test_api_settings_profile_defers_admin_and_debug_tooling():
+    """config.settings_api drops the admin, HTML-only apps, debug tooling and the browsable API."""
+    import importlib
+
+    lean = importlib.import_module("config.settings_api")
+    for app in ("django.contrib.admin", "django.contrib.messages", "django_extensions", "rest_framework.authtoken"):
+        assert app not in lean.INSTALLED_APPS
+    assert {"expenses", "rest_framework", "corsheaders"} <= set(lean.INSTALLED_APPS)
+    assert "rest_framework.renderers.BrowsableAPIRenderer" not in lean.REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"]
+    assert not lean.DEBUG
@@ -0,0 +1,107 @@
+"""
+Token-bucket throttling for the authentication endpoints.
+Buckets live in a pluggable store (AUTH_THROTTLE_STORE); the default keeps them in process memory, so no cache
+or database round trip is needed to reject a login flood.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+
+def parse_rate(rate):
+    """Parse "20/min" into (capacity, refill tokens per second)."""
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period]
+
+
+class InMemoryBucketStore:
+    """Thread-safe token buckets kept in a dict; full (idle) buckets are swept once `max_entries` is reached."""
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, tokens=1):
+        """Take `tokens` from the bucket; return (allowed, seconds until enough tokens are available)."""
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.get(key, (capacity, now))
+            level = min(capacity, level + (now - updated) * refill_rate)
+            allowed = level >= tokens
+            if allowed:
+                level -= tokens
+            if key not in self._buckets and len(self._buckets) >= self.max_entries:
+                self._sweep(now)
+            self._buckets[key] = (level, now)
+        return allowed, 0.0 if allowed else (tokens - level) / refill_rate
+
+    def clear(self):
+        """Forget all buckets."""
+        with self._lock:
+            self._buckets.clear()
+
+    def _sweep(self, now):
+        # Kyblíky, které by se už stejně doplnily, nenesou žádnou informaci; rate je ale per-klíč neznámý,
+        # proto zahodíme nejstarší polovinu podle času poslední aktualizace.
+        oldest = sorted(self._buckets.items(), key=lambda item: item[1][1])[: len(self._buckets) // 2]
+        for key, _ in oldest:
+            del self._buckets[key]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide bucket store configured by AUTH_THROTTLE_STORE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = import_string(settings.AUTH_THROTTLE_STORE)()
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle backed by a token bucket; subclasses define `scope` and `get_key()`."""
+    scope = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        key = self.get_key(request)
+        if key is None:
+            return True
+        capacity, refill_rate = parse_rate(settings.AUTH_THROTTLE_RATES[self.scope])
+        allowed, self._wait = get_store().consume(f"{self.scope}:{key}", capacity, refill_rate)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class AuthIPThrottle(TokenBucketThrottle):
+    """Limit authentication attempts per client IP."""
+    scope = "auth_ip"
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class AuthUsernameThrottle(TokenBucketThrottle):
+    """Limit authentication attempts per target username (regardless of the client IP)."""
+    scope = "auth_username"
+
+    def get_key(self, request):
+        username = request.data.get("username") if hasattr(request.data, "get") else None
+        if not username:
+            return None
+        return str(username).strip().lower()
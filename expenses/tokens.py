@@ -0,0 +1,88 @@
+"""
+Share-link access for participants without an account.
+``/api/p/<token>/...`` resolves Participant.token to the participant, its event and its permissions. Resolutions
+are kept in process memory for ``PARTICIPANT_TOKEN_CACHE_TTL`` seconds, so a busy share link costs no lookup query.
+Edits and deletions drop the affected entries in the process that made them; other worker processes pick the
+change up when their entry expires, which bounds how long a deleted participant's link keeps working.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from . import metrics
+from .models import Participant
+
+TokenAccess = namedtuple("TokenAccess", "participant_id event_id name can_add_expenses")
+
+
+class TokenCache:
+    """Thread-safe {token: TokenAccess} with a TTL; expired entries are swept once `max_entries` is reached."""
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        entry = self._entries.get(token)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, token, access, ttl):
+        now = time.monotonic()
+        with self._lock:
+            if token not in self._entries and len(self._entries) >= self.max_entries:
+                self._sweep(now)
+            self._entries[token] = (now + ttl, access)
+
+    def invalidate(self, participant_ids=(), event_ids=()):
+        """Drop the entries of the given participants and of all participants of the given events."""
+        participant_ids, event_ids = set(participant_ids), set(event_ids)
+        with self._lock:
+            for token, (_, access) in list(self._entries.items()):
+                if access.participant_id in participant_ids or access.event_id in event_ids:
+                    del self._entries[token]
+
+    def clear(self):
+        """Forget all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def _sweep(self, now):
+        for token in [token for token, (expires, _) in self._entries.items() if expires < now]:
+            del self._entries[token]
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()  # samé živé záznamy: začneme znovu, dotaz na token je levný
+
+
+cache = TokenCache()
+
+
+def resolve(token):
+    """Return the TokenAccess of a participant of a visible event, or None for an unknown token."""
+    access = cache.get(token)
+    metrics.inc("expenses_cache_requests_total", cache="token", result="miss" if access is None else "hit")
+    if access is None:
+        row = (
+            Participant.objects.filter(token=token, event__deleted_at__isnull=True)
+            .values_list("pk", "event_id", "name", "can_add_expenses")
+            .first()
+        )
+        if row is None:
+            return None
+        access = TokenAccess(*row)
+        cache.set(token, access, settings.PARTICIPANT_TOKEN_CACHE_TTL)
+    return access
+
+
+def invalidate(participant_ids=(), event_ids=()):
+    """Forget cached resolutions after participants or whole events were changed or removed."""
+    cache.invalidate(participant_ids, event_ids)
+
+
+def invalidate_on_change(sender, instance, **kwargs):
+    """post_save/post_delete handler for Participant."""
+    invalidate(participant_ids=[instance.pk])
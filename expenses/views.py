@@ -2,48 +2,204 @@
 Views for ExpenseApp.
 Provide REST API endpoints (via DRF ViewSets and function-based views) for events, participants, expenses, categories, and user authentication.
 """
-from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, redirect
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
-from rest_framework import viewsets
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core import signing
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.conf import settings
+from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from rest_framework.permissions import AllowAny
-from .models import Event, Participant, Expense, Category
-from .serializers import EventSerializer, ParticipantSerializer, ExpenseSerializer, CategorySerializer
+from rest_framework.utils.encoders import JSONEncoder
+import json
+from urllib.parse import urlencode
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from .models import Event, Participant, Expense, Category, Job
+from .serializers import EventSerializer, ParticipantSerializer, ExpenseSerializer, CategorySerializer, JobSerializer
+from .serializers import ExpenseBulkUpdateSerializer, ExpensePreviewSerializer, event_rows, expense_rows
+from .serializers import normalize_event, validate_currency_code
+from .balances import apply_expense, balance_vector, compute_balances, net_balances, settle
 from .forms import ParticipantForm
+from . import bulk, fx, jobs, ledger, metrics, search, snapshots, tokens
+from .archive import archived_participants
+from .deletion import purge_event, purge_participant
+from .idempotency import idempotent
+from .db_router import ReplicaReadMixin
+from .hashing import hash_password
+from .throttling import AuthIPThrottle, AuthUsernameThrottle
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """CRUD API for events. Public can list/retrieve; authenticated users can create/update/delete."""
-    queryset = Event.objects.all()
+    queryset = Event.objects.filter(deleted_at__isnull=True)
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """Create an event (honours the Idempotency-Key header)."""
+        return super().create(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """List events via the read-only fast serialization path (``?shape=normalized`` for the compact form)."""
+        rows = event_rows(self.filter_queryset(self.get_queryset()))
+        if self._normalized():
+            rows = [normalize_event(row) for row in rows]
+        return Response(rows)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve one event via the read-only fast serialization path (``?shape=normalized`` for the compact form).
+
+        Closed events are served straight from their snapshot.
+        """
+        snapshot = snapshots.load(kwargs['pk'])
+        row = snapshot['event'] if snapshot is not None else _fast_detail(self, event_rows)
+        return Response(normalize_event(row) if self._normalized() else row)
+
+    def perform_update(self, serializer):
+        """Reject edits of closed events."""
+        snapshots.ensure_open(serializer.instance)
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        """Hide the event and delete its data in bounded chunks (see delete_event)."""
+        snapshots.ensure_open(instance, restore=False)
+        Event.objects.filter(pk=instance.pk).update(deleted_at=timezone.now())
+        tokens.invalidate(event_ids=[instance.pk])
+        purge_event(instance.pk)
+
+    def _normalized(self):
+        """Return True when the client asked for the normalized event representation."""
+        return self.request.query_params.get('shape') == 'normalized'
+
     @action(detail=True, methods=['get'])
     def balance(self, request, pk=None):
-        """Return per-participant balances for this event."""
+        """Return per-participant balances for this event (``?async=1`` queues a job and returns 202)."""
+        snapshot = snapshots.load(pk)
+        if snapshot is not None:
+            return Response(snapshot['balance'])
         event = self.get_object()
-        balances = event.get_balance()
-        return Response(balances)
+        if _wants_async(request):
+            return _job_accepted(request, jobs.enqueue_once('event.balance', {'event_id': event.pk}))
+        return Response(balance_vector(event.pk)['balances'])
     
     @action(detail=True, methods=['get'])
     def settlement(self, request, pk=None):
-        """Return settlement instructions (who pays whom) to balance this event."""
+        """Return settlement instructions (who pays whom) to balance this event (``?async=1`` for a job)."""
+        snapshot = snapshots.load(pk)
+        if snapshot is not None:
+            return Response(snapshot['settlement'])
         event = self.get_object()
-        settlements = event.get_settlement()
-        return Response(settlements)
+        if _wants_async(request):
+            return _job_accepted(request, jobs.enqueue_once('event.settlement', {'event_id': event.pk}))
+        vector = balance_vector(event.pk)
+        return Response(settle(vector['balances'], vector['names']))
+
+    @action(detail=False, methods=['get'])
+    def net(self, request):
+        """Net balances across several events (``?events=1,2,3``) and return one combined settlement plan.
+
+        Participants are matched across events by e-mail (case-insensitive); those without an e-mail stay separate.
+        Amounts are converted into ``?currency=`` (default: the events' common currency, else DEFAULT_CURRENCY).
+        """
+        try:
+            ids = {int(value) for value in request.query_params.get('events', '').split(',') if value.strip()}
+        except ValueError:
+            raise ValidationError({'events': 'Expected a comma-separated list of event ids.'})
+        if not ids or len(ids) > settings.NETTING_MAX_EVENTS:
+            raise ValidationError({'events': f'Give between 1 and {settings.NETTING_MAX_EVENTS} event ids.'})
+        currencies = dict(self.get_queryset().filter(pk__in=ids).order_by('pk').values_list('pk', 'currency'))
+        event_ids = list(currencies)
+        currency = request.query_params.get('currency')
+        if currency:
+            try:
+                currency = validate_currency_code(currency)
+            except ValidationError as exc:
+                raise ValidationError({'currency': exc.detail})
+        elif len(set(currencies.values())) == 1:
+            currency = currencies[event_ids[0]]
+        else:
+            currency = settings.DEFAULT_CURRENCY
+        vectors = compute_balances(event_ids)
+        balances, names, members = net_balances(
+            ((vectors[event_id], currencies[event_id]) for event_id in event_ids), currency
+        )
+        return Response({
+            'events': event_ids,
+            'currency': currency,
+            'balance': [
+                {
+                    'name': names[key],
+                    'email': key[len('email:'):] if str(key).startswith('email:') else '',
+                    'participants': members[key],
+                    'balance': amount,
+                }
+                for key, amount in balances.items()
+            ],
+            'settlement': settle(balances, names),
+        })
+
+    @action(detail=True, methods=['post'], permission_classes=[AllowAny])
+    def preview(self, request, pk=None):
+        """Show balances and settlement as they would be after adding, editing or removing an expense.
+
+        The change is applied as a delta to the event's ledger balances; nothing is written. Amounts in another
+        currency are converted to the event's currency like the ledger does.
+        """
+        event = self.get_object()
+        snapshots.ensure_open(event, restore=False)
+        serializer = ExpensePreviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = serializer.validated_data
+        vector = balance_vector(event.pk)
+        names = vector['names']
+        balances = dict(vector['balances'])
+
+        if 'expense' in change:
+            # Jeden dotaz: řádek na každého účastníka rozdělení (LEFT JOIN), payer/amount se opakují
+            rows = list(
+                Expense.objects.filter(pk=change['expense'], event=event)
+                .values_list('payer_id', 'amount', 'currency', 'split_between')
+            )
+            if not rows:
+                raise Http404
+            payer, amount, currency = rows[0][:3]
+            currency = currency or event.currency
+            split = [participant_id for *_, participant_id in rows if participant_id is not None]
+            apply_expense(balances, payer, fx.convert(amount, currency, event.currency), split, sign=-1)
+        else:
+            payer, amount, currency, split = None, None, event.currency, []
+        if not change['delete']:
+            payer = change.get('payer', payer)
+            split = change.get('split_between_ids', split)
+            unknown = [participant_id for participant_id in [payer, *split] if participant_id not in names]
+            if unknown:
+                raise ValidationError({'detail': 'All participants must belong to this event.', 'unknown': unknown})
+            amount = fx.convert(change.get('amount', amount), change.get('currency', currency), event.currency)
+            apply_expense(balances, payer, amount, split)
+
+        return Response({
+            'before': {'balance': vector['balances'], 'settlement': settle(vector['balances'], names)},
+            'after': {'balance': balances, 'settlement': settle(balances, names)},
+        })
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def add_participant(self, request, pk=None):
         """Create a new participant inside this event. Requires auth + CSRF."""
         event = self.get_object()
+        snapshots.ensure_open(event)
         form = ParticipantForm(request.data)
         if form.is_valid():
             participant = form.save(commit=False)
@@ -53,38 +209,226 @@ class EventViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=201)
         return Response(form.errors, status=400)
 
+    @action(detail=True, methods=['post'])
+    def close(self, request, pk=None):
+        """Freeze the event: store a snapshot for reads and reject writes until reopened (``?async=1`` for a job)."""
+        event = self.get_object()
+        snapshots.ensure_open(event, restore=False)
+        if _wants_async(request):
+            return _job_accepted(request, jobs.enqueue_once('event.close', {'event_id': event.pk}))
+        event = snapshots.close_event(event)
+        return Response({'id': event.pk, 'closed_at': event.closed_at})
+
+    @action(detail=True, methods=['post'])
+    def reopen(self, request, pk=None):
+        """Unfreeze a closed event so it can be edited again."""
+        event = snapshots.reopen_event(self.get_object())
+        return Response({'id': event.pk, 'closed_at': event.closed_at})
+
 
-class ParticipantViewSet(viewsets.ModelViewSet):
+class ParticipantViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """CRUD API for participants. Public can list/retrieve; authenticated can write."""
-    queryset = Participant.objects.all()
+    queryset = Participant.objects.filter(event__deleted_at__isnull=True)
     serializer_class = ParticipantSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    statement_page_size = 50
+    statement_max_page_size = 500
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """Create a participant (honours the Idempotency-Key header)."""
+        return super().create(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        """Reject edits of participants of closed events."""
+        snapshots.ensure_open(serializer.instance.event)
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        """Reject deleting participants of closed events; otherwise delete in bounded chunks."""
+        snapshots.ensure_open(instance.event)
+        purge_participant(instance.pk)
+
+    @action(detail=True, methods=['get', 'post'], permission_classes=[IsAuthenticated])
+    def share(self, request, pk=None):
+        """Return the participant's share link; POST {"can_add_expenses": bool} changes what it allows. Requires auth."""
+        participant = self.get_object()
+        if request.method == 'POST':
+            snapshots.ensure_open(participant.event)
+            participant.can_add_expenses = bool(request.data.get('can_add_expenses'))
+            participant.save(update_fields=['can_add_expenses'])
+        return Response({
+            'token': participant.token,
+            'url': request.build_absolute_uri(reverse('token_event', args=[participant.token])),
+            'can_add_expenses': participant.can_add_expenses,
+        })
+
+    @action(detail=True, methods=['get'])
+    def statement(self, request, pk=None):
+        """Return the participant's chronological statement with running balance.
+
+        Paginated with an opaque ``cursor`` (``page_size`` rows per page); ``?stream=1`` streams the
+        whole statement from the cursor on as newline-delimited JSON instead.
+        """
+        participant = self.get_object()
+        after = None
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                participant_id, created_at, expense_id, balance = signing.loads(cursor, salt='participant-statement')
+            except (signing.BadSignature, ValueError, TypeError):
+                raise ValidationError({'cursor': 'Invalid cursor.'})
+            # Kurzor nese průběžný zůstatek, platí jen pro výpis účastníka, pro kterého byl vydán
+            if participant_id != participant.pk:
+                raise ValidationError({'cursor': 'Cursor belongs to another participant.'})
+            if not isinstance(balance, int):
+                raise ValidationError({'cursor': 'Invalid cursor.'})
+            after = (parse_datetime(created_at), expense_id, balance)
+
+        if request.query_params.get('stream'):
+            rows = participant.get_statement(after=after)
+            lines = (json.dumps(_statement_row(row), cls=JSONEncoder) + '\n' for row in rows)
+            return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+        try:
+            page_size = int(request.query_params.get('page_size', self.statement_page_size))
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer.'})
+        page_size = max(1, min(page_size, self.statement_max_page_size))
+
+        # Načteme o řádek víc, abychom poznali, jestli existuje další stránka
+        page = list(participant.get_statement(after=after, limit=page_size + 1))
+        next_url = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            token = signing.dumps(
+                [participant.pk, last['created_at'].isoformat(), last['id'], last['balance_micros']],
+                salt='participant-statement',
+            )
+            next_url = request.build_absolute_uri(
+                f"{request.path}?{urlencode({'cursor': token, 'page_size': page_size})}"
+            )
+        return Response({'next': next_url, 'results': [_statement_row(row) for row in page]})
+
+
+def _statement_row(row):
+    """Format one statement row with amounts rounded to cents (paid/share/balance in the event's currency)."""
+    return {
+        'id': row['id'],
+        'description': row['description'],
+        'created_at': row['created_at'],
+        'amount': float(row['amount']),
+        'currency': row['expense_currency'],
+        'paid': float(round(row['paid'], 2)),
+        'share': float(round(row['share'], 2)),
+        'balance': float(round(row['running_balance'], 2)),
+    }
+
+
+class JobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Status of background jobs (GET /api/jobs/{id}/)."""
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+
+def _wants_async(request):
+    """Return True when the client asked to run the operation as a background job (authenticated users only)."""
+    if request.query_params.get('async') not in ('1', 'true'):
+        return False
+    # Jinak by anonymní GET zakládal řádek Job při každém volání
+    if not request.user.is_authenticated:
+        raise NotAuthenticated('Background jobs require authentication.')
+    return True
+
+
+def _job_accepted(request, job):
+    """Return 202 Accepted with a handle for polling the queued job."""
+    url = request.build_absolute_uri(reverse('job-detail', args=[job.pk]))
+    return Response({'job': job.pk, 'status': job.status, 'url': url}, status=202, headers={'Location': url})
+
+
+def _int_or_none(value):
+    """Return value as an int, or None when it is not a valid id."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _fast_detail(view, build_rows):
+    """Return the single fast-path row for the view's lookup kwarg, or raise 404 like get_object()."""
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    queryset = view.filter_queryset(view.get_queryset())
+    try:
+        rows = build_rows(queryset.filter(**{view.lookup_field: view.kwargs[lookup_url_kwarg]}))
+    except (TypeError, ValueError, DjangoValidationError):
+        raise Http404
+    if not rows:
+        raise Http404
+    return rows[0]
+
 
 # Delete participant endpoint (auth required)
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
 def delete_participant(request, pk):
-    """Delete a participant by primary key. Requires authenticated session."""
-    participant = get_object_or_404(Participant, pk=pk)
-    participant.delete()
+    """Delete a participant (with expenses they paid) by primary key in bounded chunks. Requires authenticated session."""
+    participant = get_object_or_404(Participant.objects.select_related('event'), pk=pk, event__deleted_at__isnull=True)
+    snapshots.ensure_open(participant.event)
+    purge_participant(participant.pk)
     return Response(status=204)
 
 # Delete event endpoint (auth required)
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
 def delete_event(request, event_id):
-    """Delete an event by primary key. Requires authenticated session."""
-    event = get_object_or_404(Event, pk=event_id)
-    event.delete()
+    """Delete an event by primary key. Requires authenticated session.
+
+    The event is hidden immediately and its data removed in bounded chunks; with ``?async=1`` the removal
+    runs as a background job and the response is 202 with the job handle.
+    """
+    event = get_object_or_404(Event, pk=event_id, deleted_at__isnull=True)
+    snapshots.ensure_open(event, restore=False)
+    Event.objects.filter(pk=event.pk).update(deleted_at=timezone.now())
+    tokens.invalidate(event_ids=[event.pk])
+    if _wants_async(request):
+        return _job_accepted(request, jobs.enqueue('event.purge', {'event_id': event.pk}))
+    purge_event(event.pk)
     return Response(status=204)
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """CRUD API for expenses. Public can list/retrieve; authenticated can write."""
-    queryset = Expense.objects.all()
+    queryset = Expense.objects.filter(event__deleted_at__isnull=True)
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """Create an expense (honours the Idempotency-Key header).
+
+        For an archived event the expense is validated against the archived participants first and the event is
+        restored only when it is valid, so that its participants validate as payer and split.
+        """
+        archived = Event.objects.filter(
+            pk=_int_or_none(request.data.get('event')),
+            deleted_at__isnull=True, closed_at__isnull=True, archived_at__isnull=False,
+        ).first()
+        if archived is not None:
+            _validate_for_archived(request.data, archived)
+            snapshots.restore_archived(archived)
+        return super().create(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """List expenses via the read-only fast serialization path."""
+        return Response(expense_rows(self.filter_queryset(self.get_queryset())))
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve one expense via the read-only fast serialization path."""
+        return Response(_fast_detail(self, expense_rows))
+
     def perform_create(self, serializer):
         """Resolve foreign keys and M2M fields from IDs, validate existence, and save the expense."""
         # Get event, category, split_between from request data
@@ -98,7 +442,7 @@ class ExpenseViewSet(viewsets.ModelViewSet):
 
         if event_id:
             try:
-                event = Event.objects.get(pk=event_id)
+                event = Event.objects.get(pk=event_id, deleted_at__isnull=True)
             except Event.DoesNotExist:
                 raise ValidationError({'event': 'Event with this ID does not exist.'})
 
@@ -116,18 +460,196 @@ class ExpenseViewSet(viewsets.ModelViewSet):
             if split_between.count() != len(split_between_ids):
                 raise ValidationError({'split_between': 'One or more participants do not exist.'})
 
-        expense = serializer.save(event=event, category=category)
-        if split_between is not None:
-            expense.split_between.set(split_between)
+        snapshots.ensure_open(event)
+        with transaction.atomic():
+            expense = _save_new_expense(serializer, event, category=category)
+            if split_between is not None:
+                ledger.set_split(expense, split_between)
+
+    def perform_update(self, serializer):
+        """Save an edit unless the expense changed since the version the client saw (409); reject closed events."""
+        expense = serializer.instance
+        snapshots.ensure_open(expense.event)
+        snapshots.ensure_open(serializer.validated_data.get('event'))
+        with transaction.atomic():
+            ledger.claim(expense, _expected_version(self.request, expense))
+            old_split = ledger.split_ids(expense.pk)
+            new_split = [participant.pk for participant in serializer.validated_data.get('split_between', [])]
+            if 'split_between' not in serializer.validated_data:
+                new_split = old_split
+            payer = serializer.validated_data.get('payer')
+            ledger.lock_for(
+                expense.event_id, {expense.payer_id, payer.pk if payer else expense.payer_id}, [old_split, new_split]
+            )
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        """Delete unless the expense changed since the version the client saw (409); reject closed events."""
+        snapshots.ensure_open(instance.event)
+        with transaction.atomic():
+            ledger.claim(instance, _expected_version(self.request, instance))
+            ledger.lock_for(instance.event_id, [instance.payer_id], [ledger.split_ids(instance.pk)])
+            instance.delete()
+
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """Apply one set of changes (category, payer, split) to many expenses selected by ``ids`` or ``filter``.
+
+        One transaction with a constant number of queries; balances are rebuilt once per event (expenses.bulk).
+        """
+        serializer = ExpenseBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        queryset = self.get_queryset()
+        if 'ids' in data:
+            queryset = queryset.filter(pk__in=data['ids'])
+        else:
+            where = data['filter']
+            event = get_object_or_404(Event, pk=where['event'], deleted_at__isnull=True)
+            snapshots.ensure_open(event)
+            queryset = queryset.filter(event=event)
+            if 'category' in where:
+                queryset = queryset.filter(category_id=where['category'])
+            if 'payer' in where:
+                queryset = queryset.filter(payer_id=where['payer'])
+            if where.get('description'):
+                queryset = queryset.filter(description__icontains=where['description'])
+        ids, event_ids = bulk.update_expenses(queryset, data['changes'], data.get('versions'))
+        return Response({'updated': len(ids), 'ids': ids, 'events': event_ids})
+
+
+def _validate_for_archived(data, event):
+    """Validate a new expense for an archived event against its archived participants, without restoring it."""
+    # Vztahy na účastníky se ověří proti archivu, zbytek serializerem bez nich
+    ExpenseSerializer(
+        data={key: value for key, value in data.items() if key not in ('payer', 'split_between_ids')}, partial=True
+    ).is_valid(raise_exception=True)
+    members = {row[0] for row in archived_participants([event.pk])}
+    if _int_or_none(data.get('payer')) not in members:
+        raise ValidationError({'payer': 'Payer must be a participant of this event.'})
+    split = data.get('split_between_ids') or []
+    if isinstance(split, str):
+        split = [s for s in split.split(',') if s]
+    if not {_int_or_none(participant_id) for participant_id in split} <= members:
+        raise ValidationError({'split_between_ids': 'All selected participants must belong to this event.'})
+
+
+def _save_new_expense(serializer, event, **kwargs):
+    """Save a validated new expense after locking the participant balances it changes."""
+    split = [participant.pk for participant in serializer.validated_data.get('split_between', [])]
+    with transaction.atomic():
+        ledger.lock_for(event.pk, [serializer.validated_data['payer'].pk], [split])
+        return serializer.save(event=event, **kwargs)
+
+
+def _expected_version(request, expense):
+    """Return the expense version the client based its change on: If-Match, or "version" in the body or query.
+
+    Without one the version loaded by this request is used, which still rejects concurrent edits in between.
+    """
+    value = request.headers.get('If-Match') or request.data.get('version') or request.query_params.get('version')
+    if value in (None, ''):
+        return expense.version
+    try:
+        return int(str(value).strip('W/"'))
+    except ValueError:
+        raise ValidationError({'version': 'Expected an integer expense version.'})
 
 
 # CategoryViewSet for registration in urls.py
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """CRUD API for categories (mainly for admin use). Public can read; authenticated can write."""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """Create a category (honours the Idempotency-Key header)."""
+        return super().create(request, *args, **kwargs)
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def api_search(request):
+    """Full-text search over events, participants and expenses: ?q=...&event=<id>&type=expense&limit=20."""
+    query = request.query_params.get("q", "")
+    try:
+        event_id = int(request.query_params["event"]) if request.query_params.get("event") else None
+        limit = max(1, min(int(request.query_params.get("limit", 20)), 100))
+    except ValueError:
+        raise ValidationError({"detail": "event a limit musí být celá čísla"})
+    kinds = request.query_params.getlist("type") or None
+    return Response(search.search(query, event_id=event_id, kinds=kinds, limit=limit))
+
+# Sdílené odkazy účastníků: bez session a CSRF, oprávnění nese token (expenses.tokens)
+def _token_access(token):
+    """Return (TokenAccess, snapshot or None) for a share-link token, or raise 404.
+
+    Costs one query for a live event; closed and archived events add the snapshot fetch.
+    """
+    access = tokens.resolve(token)
+    state = access and (
+        Event.objects.filter(pk=access.event_id, deleted_at__isnull=True)
+        .values_list('closed_at', 'archived_at')
+        .first()
+    )
+    if not state:
+        raise Http404
+    snapshot = snapshots.load(access.event_id) if any(state) else None
+    return access, snapshot
+
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_event(request, token):
+    """Read-only view of the token holder's event."""
+    access, snapshot = _token_access(token)
+    row = snapshot["event"] if snapshot is not None else event_rows(Event.objects.filter(pk=access.event_id))[0]
+    return Response({
+        "participant": {"id": access.participant_id, "name": access.name},
+        "can_add_expenses": access.can_add_expenses,
+        "event": row,
+    })
+
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_balance(request, token):
+    """Per-participant balances of the token holder's event."""
+    access, snapshot = _token_access(token)
+    if snapshot is not None:
+        return Response(snapshot["balance"])
+    return Response(balance_vector(access.event_id)["balances"])
+
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_settlement(request, token):
+    """Settlement plan of the token holder's event."""
+    access, snapshot = _token_access(token)
+    if snapshot is not None:
+        return Response(snapshot["settlement"])
+    vector = balance_vector(access.event_id)
+    return Response(settle(vector["balances"], vector["names"]))
+
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+@idempotent
+def token_add_expense(request, token):
+    """Add an expense paid by the token holder to their event when the link allows it (403 for another payer)."""
+    access, _ = _token_access(token)
+    if not access.can_add_expenses:
+        raise PermissionDenied("This link is read-only.")
+    if _int_or_none(request.data.get("payer", access.participant_id)) != access.participant_id:
+        raise PermissionDenied("A share link can only add expenses paid by its holder.")
+    event = get_object_or_404(Event, pk=access.event_id, deleted_at__isnull=True)
+    snapshots.ensure_open(event)
+    serializer = ExpenseSerializer(data={**request.data, "payer": access.participant_id, "event": event.pk})
+    serializer.is_valid(raise_exception=True)
+    _save_new_expense(serializer, event)
+    return Response(serializer.data, status=201)
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 @ensure_csrf_cookie
@@ -135,9 +657,18 @@ def api_csrf(request):
     """Issue a CSRF cookie for the client. Call once from frontend before POSTs."""
     return Response({"detail": "CSRF cookie set"}, status=200)
 
+def metrics_view(request):
+    """Expose operational metrics in the Prometheus text format (Bearer METRICS_TOKEN when configured)."""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 # API endpoints for user registration and authentication
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([AuthIPThrottle])
+@idempotent
 def api_signup(request):
     """Register a new user via JSON body {"username":..., "password":...}."""
     username = request.data.get("username")
@@ -146,11 +677,13 @@ def api_signup(request):
         return Response({"detail": "username a password jsou povinné"}, status=400)
     if User.objects.filter(username=username).exists():
         return Response({"detail": "Uživatel už existuje"}, status=400)
-    User.objects.create_user(username=username, password=password)
+    # Hashování hesla běží v omezeném poolu (expenses.hashing), ne ve vlákně požadavku
+    User.objects.create(username=User.normalize_username(username), password=hash_password(password))
     return Response({"detail": "OK"}, status=201)
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([AuthIPThrottle, AuthUsernameThrottle])
 def api_login(request):
     """Authenticate user and create session cookie. Expects JSON {"username":..., "password":...}."""
     username = request.data.get("username")
@@ -186,6 +719,7 @@ def api_me(request):
 # Signup view for user registration
 def signup_view(request):
     """Render and process a classic Django sign-up form (HTML)."""
+    from django.contrib.auth.forms import UserCreationForm  # jen pro HTML stránku, API workery ji nenačítají
     if request.method == 'POST':
         form = UserCreationForm(request.POST)
         if form.is_valid():